@@ -0,0 +1,554 @@
+"""Hot/cold tiering of expenses and conversations.
+
+The expenses and conversations tables only ever grew, so every full read
+(the Analysis tab, paging through old chats) and the tables' indexes paid
+for the whole history. Archive.run() moves rows older than a horizon
+(HORIZON_DAYS, rounded down to a month boundary) out of SQLite into one
+columnar file per user, table and month:
+
+    archive/expenses/user_7/2024-03.2.col
+
+A file is a small JSON header followed by one segment per column. Integer
+and float columns are stored raw, little-endian and 8-byte aligned, and
+are read straight from a read-only mmap with np.frombuffer; text and blob
+columns are zlib-compressed, with a raw int32 length per row (-1 for
+NULL). Files are immutable: rows archived into a month that already has a
+file (e.g. an old bank statement imported later) produce a new generation
+of it.
+
+The archive_partitions table in the hot database is the manifest: which
+generation is current for each (user, table, month), with its row count,
+ts/id ranges and amount total. It is updated in the same transaction that
+deletes the archived rows, so a crash leaves either the rows in SQLite or
+the manifest pointing at their file, never both or neither. Deleting the
+rows bypasses the aggregate trigger (see db._archive_migration): the
+spend_daily/monthly/category/totals rollups keep covering archived rows
+and the user's data version doesn't change, since nothing the user sees
+changed.
+
+Reads of both tiers go through SpendingRepository (and analytics,
+conversation_index, conversation_log, importer given an archive), which
+query the hot table and the archive in one ConnectionPool.snapshot() so
+they agree on where the boundary is. Queries whose range starts after the
+newest archived row only cost one manifest lookup. Superseded files are
+deleted at the start of the next run, after any reader of the old
+manifest has finished with them.
+
+    python archive.py --db spending_tracker.db --horizon-days 180
+"""
+import argparse
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from conversation_log import encode_context
+from db import ConnectionPool, init_schema, now_ts
+
+ARCHIVE_DIR = "archive"
+HORIZON_DAYS = 180
+ARCHIVE_INTERVAL = 6 * 60 * 60
+MAX_OPEN_FILES = 64
+ZLIB_LEVEL = 6
+# Unreferenced files younger than this may belong to another process's
+# archiving transaction that hasn't committed yet
+SWEEP_GRACE = 60 * 60
+
+MAGIC = b"SSCOL\x00\x01\n"
+NUMERIC = {"i8": "<i8", "f8": "<f8"}
+# Archived columns per table, in file order; id and ts come first in each
+TABLES = {
+    "expenses": (
+        ("id", "i8"), ("ts", "i8"), ("amount", "f8"), ("description", "text"), ("category", "text"),
+    ),
+    "conversations": (
+        ("id", "i8"), ("ts", "i8"), ("session_id", "text"), ("user_message", "text"),
+        ("bot_response", "text"), ("context", "blob"), ("ttft_ms", "f8"), ("latency_ms", "f8"),
+    ),
+}
+MIN_TS, MAX_TS = -(2 ** 62), 2 ** 62
+
+SQL_GET_USER_IDS = "SELECT id FROM users ORDER BY id"
+SQL_OLDEST_HOT = {table: f"SELECT MIN(ts) FROM {table} WHERE user_id = ? AND ts < ?" for table in TABLES}
+SQL_SELECT_HOT = {
+    table: f"SELECT {', '.join(name for name, _ in columns)} FROM {table} "
+           f"WHERE user_id = ? AND ts >= ? AND ts < ? ORDER BY ts, id"
+    for table, columns in TABLES.items()
+}
+SQL_DELETE_HOT = {table: f"DELETE FROM {table} WHERE user_id = ? AND ts >= ? AND ts < ?" for table in TABLES}
+SQL_LOCK_USER = "INSERT INTO archive_lock (user_id) VALUES (?)"
+SQL_UNLOCK_USER = "DELETE FROM archive_lock WHERE user_id = ?"
+SQL_GET_PARTITION = """
+    SELECT generation FROM archive_partitions WHERE user_id = ? AND source = ? AND month = ?
+"""
+SQL_PUT_PARTITION = """
+    INSERT OR REPLACE INTO archive_partitions
+    (user_id, source, month, generation, rows, min_ts, max_ts, min_id, max_id,
+     amount_total, bytes, archived_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_GET_PARTITIONS = """
+    SELECT month, generation FROM archive_partitions
+    WHERE user_id = ? AND source = ? AND max_ts >= ? AND min_ts < ? AND max_id > ?
+    ORDER BY month
+"""
+SQL_GET_PARTITIONS_BY_ID = """
+    SELECT month, generation FROM archive_partitions
+    WHERE user_id = ? AND source = ? AND min_id <= ? AND max_id >= ?
+    ORDER BY month
+"""
+SQL_NEWEST_TS = "SELECT MAX(max_ts) FROM archive_partitions WHERE user_id = ? AND source = ?"
+SQL_ALL_PARTITIONS = "SELECT user_id, source, month, generation FROM archive_partitions"
+SQL_STATS = """
+    SELECT source, COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(bytes), 0)
+    FROM archive_partitions GROUP BY source
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _month_start(ts):
+    day = datetime.fromtimestamp(ts).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return int(day.timestamp())
+
+
+def _next_month_start(ts):
+    day = datetime.fromtimestamp(ts)
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return int(datetime(year, month, 1).timestamp())
+
+
+def _encode_column(kind, values):
+    """Segments for one column: [data] for numeric, [lengths, zlib data] otherwise."""
+    if kind in NUMERIC:
+        if kind == "f8":
+            values = [math.nan if value is None else value for value in values]
+        return [np.asarray(values, dtype=NUMERIC[kind]).tobytes()]
+    if kind == "text":
+        values = [None if value is None else value.encode() for value in values]
+    lengths = np.array([-1 if value is None else len(value) for value in values], dtype="<i4")
+    data = zlib.compress(b"".join(value for value in values if value is not None), ZLIB_LEVEL)
+    return [lengths.tobytes(), data]
+
+
+def write_columns(path, columns, rows):
+    """Write rows (tuples in the order of columns, [(name, kind)]) to path.
+
+    The file is written under a temporary name, fsynced and renamed, so
+    path is either absent or complete.
+    """
+    header = {"rows": len(rows), "columns": {}}
+    segments = []
+    offset = 0
+    by_column = list(zip(*rows)) if rows else [()] * len(columns)
+    for (name, kind), values in zip(columns, by_column):
+        parts = _encode_column(kind, values)
+        spans = []
+        for part in parts:
+            spans.append([offset, len(part)])
+            segments.append((offset, part))
+            offset = _align(offset + len(part))
+        header["columns"][name] = {"kind": kind, "segments": spans}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    base = _align(len(MAGIC) + 8 + len(header_bytes))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for segment_offset, part in segments:
+            f.seek(base + segment_offset)
+            f.write(part)
+        f.truncate(base + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ColumnFile:
+    """Read-only view of one partition file.
+
+    Numeric columns are arrays over the mmap (no copy); text and blob
+    columns are decompressed on first use and kept as lists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an archive partition")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(self._mmap[start:start + header_length])
+        self._base = _align(start + header_length)
+        self._columns = header["columns"]
+        self.rows = header["rows"]
+        self._decoded = {}
+        self._lock = threading.Lock()
+
+    def column(self, name):
+        spec = self._columns[name]
+        kind, segments = spec["kind"], spec["segments"]
+        if kind in NUMERIC:
+            return np.frombuffer(self._mmap, NUMERIC[kind], self.rows, self._base + segments[0][0])
+        values = self._decoded.get(name)
+        if values is None:
+            lengths = np.frombuffer(self._mmap, "<i4", self.rows, self._base + segments[0][0])
+            offset, size = segments[1]
+            data = zlib.decompress(self._mmap[self._base + offset:self._base + offset + size])
+            values = []
+            position = 0
+            for length in lengths.tolist():
+                if length < 0:
+                    values.append(None)
+                    continue
+                chunk = data[position:position + length]
+                position += length
+                values.append(chunk.decode() if kind == "text" else chunk)
+            with self._lock:
+                self._decoded[name] = values
+        return values
+
+    def rows_between(self, start_ts=None, end_ts=None):
+        """Row range (lo, hi) with start_ts <= ts < end_ts; files are sorted by (ts, id)."""
+        ts = self.column("ts")
+        lo = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, "left"))
+        hi = self.rows if end_ts is None else int(np.searchsorted(ts, end_ts, "left"))
+        return lo, max(lo, hi)
+
+
+def _python_values(kind, values):
+    """Column slice as Python values, NULL floats (stored as NaN) as None."""
+    if kind == "i8":
+        return values.tolist()
+    if kind == "f8":
+        return [None if value != value else value for value in values.tolist()]
+    return list(values)
+
+
+class Archive:
+    """Columnar cold tier for one database, under directory.
+
+    Read methods take a connection (normally from pool.snapshot(), shared
+    with the hot-table queries) for the manifest lookups.
+    """
+
+    def __init__(self, pool, directory=ARCHIVE_DIR, max_open=MAX_OPEN_FILES):
+        self.pool = pool
+        self.directory = directory
+        self.max_open = max_open
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for table in TABLES:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+
+    # Files
+
+    def _path(self, table, user_id, month, generation):
+        return os.path.join(self.directory, table, f"user_{user_id}", f"{month}.{generation}.col")
+
+    def _open(self, path):
+        with self._lock:
+            column_file = self._files.get(path)
+            if column_file is not None:
+                self._files.move_to_end(path)
+                return column_file
+        column_file = ColumnFile(path)
+        with self._lock:
+            self._files[path] = column_file
+            # Evicted files are unmapped once no reader holds their arrays
+            while len(self._files) > self.max_open:
+                self._files.popitem(last=False)
+        return column_file
+
+    def _partition_files(self, conn, table, user_id, start_ts=None, end_ts=None, after_id=0):
+        rows = conn.execute(SQL_GET_PARTITIONS, (
+            user_id, table, MIN_TS if start_ts is None else start_ts,
+            MAX_TS if end_ts is None else end_ts, after_id,
+        )).fetchall()
+        return [self._open(self._path(table, user_id, month, generation)) for month, generation in rows]
+
+    # Archiving
+
+    def _archive_month(self, table, user_id, start, end):
+        """Move user_id's rows with start <= ts < end into that month's file.
+
+        Returns the number of rows moved.
+        """
+        columns = TABLES[table]
+        month = datetime.fromtimestamp(start).strftime("%Y-%m")
+        with self.pool.transaction() as conn:
+            rows = conn.execute(SQL_SELECT_HOT[table], (user_id, start, end)).fetchall()
+            if not rows:
+                return 0
+            moved = len(rows)
+            if table == "conversations":
+                # Contexts saved before conversation_log encoded them are plain text
+                rows = [
+                    row[:5] + (encode_context(row[5]) if isinstance(row[5], str) else row[5],) + row[6:]
+                    for row in rows
+                ]
+            current = conn.execute(SQL_GET_PARTITION, (user_id, table, month)).fetchone()
+            generation = 1
+            if current is not None:
+                generation = current[0] + 1
+                existing = self._open(self._path(table, user_id, month, current[0]))
+                stored = list(zip(*(
+                    _python_values(kind, existing.column(name)[:]) for name, kind in columns
+                )))
+                rows = list(heapq.merge(stored, rows, key=lambda row: (row[1], row[0])))
+            path = self._path(table, user_id, month, generation)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_columns(path, columns, rows)
+            amount_total = None
+            if table == "expenses":
+                amount_total = sum(row[2] for row in rows if row[2] is not None)
+            conn.execute(SQL_LOCK_USER, (user_id,))
+            conn.execute(SQL_DELETE_HOT[table], (user_id, start, end))
+            conn.execute(SQL_UNLOCK_USER, (user_id,))
+            conn.execute(SQL_PUT_PARTITION, (
+                user_id, table, month, generation, len(rows),
+                min(row[1] for row in rows), max(row[1] for row in rows),
+                min(row[0] for row in rows), max(row[0] for row in rows),
+                amount_total, os.path.getsize(path), now_ts(),
+            ))
+        return moved
+
+    def archive_before(self, cutoff_ts, user_ids=None):
+        """Archive every row with ts < cutoff_ts, one transaction per user, table and month.
+
+        Returns {"expenses": rows, "conversations": rows, "partitions": n, "seconds": s}.
+        """
+        started = time.perf_counter()
+        report = {table: 0 for table in TABLES}
+        report["partitions"] = 0
+        with self._run_lock:
+            if user_ids is None:
+                with self.pool.connection() as conn:
+                    user_ids = [row[0] for row in conn.execute(SQL_GET_USER_IDS)]
+            for user_id in user_ids:
+                for table in TABLES:
+                    while True:
+                        with self.pool.connection() as conn:
+                            oldest = conn.execute(SQL_OLDEST_HOT[table], (user_id, cutoff_ts)).fetchone()[0]
+                        if oldest is None:
+                            break
+                        start = _month_start(oldest)
+                        moved = self._archive_month(
+                            table, user_id, start, min(_next_month_start(start), cutoff_ts)
+                        )
+                        report[table] += moved
+                        report["partitions"] += 1 if moved else 0
+        report["seconds"] = time.perf_counter() - started
+        return report
+
+    def run(self, horizon_days=HORIZON_DAYS, now=None):
+        """Remove superseded files, then archive whole months older than horizon_days."""
+        self.sweep()
+        now = now or time.time()
+        return self.archive_before(_month_start(int(now - horizon_days * 24 * 60 * 60)))
+
+    def sweep(self, grace=SWEEP_GRACE):
+        """Delete partition files the manifest no longer references. Returns the count."""
+        with self.pool.connection() as conn:
+            current = {
+                os.path.normpath(self._path(source, user_id, month, generation))
+                for user_id, source, month, generation in conn.execute(SQL_ALL_PARTITIONS)
+            }
+        removed = 0
+        cutoff = time.time() - grace
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.normpath(os.path.join(root, name))
+                if path in current or not name.endswith((".col", ".tmp")):
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    with self._lock:
+                        self._files.pop(path, None)
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    # Still mapped by a reader (Windows); retried next sweep
+                    pass
+        return removed
+
+    def start(self, horizon_days=HORIZON_DAYS, interval=ARCHIVE_INTERVAL):
+        """Run archiving now and then every interval seconds on a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    report = self.run(horizon_days)
+                    if report["partitions"]:
+                        logger.info("Archived %s", report)
+                except Exception:
+                    logger.exception("Archiving failed")
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=loop, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Reads
+
+    def newest_ts(self, conn, table, user_id):
+        """ts of user_id's newest archived row in table, or None if nothing is archived."""
+        return conn.execute(SQL_NEWEST_TS, (user_id, table)).fetchone()[0]
+
+    def read(self, conn, table, user_id, columns, start_ts=None, end_ts=None, after_id=0):
+        """Archived rows with start_ts <= ts < end_ts (and id > after_id), oldest first.
+
+        Returns {column: values}: NumPy arrays for numeric columns (NaN for
+        NULL floats), lists otherwise.
+        """
+        kinds = dict(TABLES[table])
+        parts = {name: [] for name in columns}
+        for column_file in self._partition_files(conn, table, user_id, start_ts, end_ts, after_id):
+            lo, hi = column_file.rows_between(start_ts, end_ts)
+            keep = slice(lo, hi)
+            if after_id:
+                ids = column_file.column("id")[lo:hi]
+                keep = lo + np.flatnonzero(ids > after_id)
+            for name in columns:
+                values = column_file.column(name)
+                if kinds[name] in NUMERIC:
+                    parts[name].append(values[keep])
+                elif isinstance(keep, slice):
+                    parts[name].append(values[keep])
+                else:
+                    parts[name].append([values[i] for i in keep.tolist()])
+        result = {}
+        for name in columns:
+            if kinds[name] in NUMERIC:
+                chunks = parts[name] or [np.empty(0, NUMERIC[kinds[name]])]
+                result[name] = np.concatenate(chunks)
+            else:
+                result[name] = [value for chunk in parts[name] for value in chunk]
+        return result
+
+    def rows(self, conn, table, user_id, columns, start_ts=None, end_ts=None, after_id=0):
+        """read() as a list of tuples with Python values (None for NULL), oldest first."""
+        kinds = dict(TABLES[table])
+        data = self.read(conn, table, user_id, columns, start_ts, end_ts, after_id)
+        return list(zip(*(_python_values(kinds[name], data[name]) for name in columns)))
+
+    def latest(self, conn, table, user_id, columns, limit, before=None):
+        """Up to limit archived rows before (ts, id) (or the newest), newest first."""
+        kinds = dict(TABLES[table])
+        end_ts = None if before is None else before[0] + 1
+        result = []
+        for column_file in reversed(self._partition_files(conn, table, user_id, end_ts=end_ts)):
+            _, hi = column_file.rows_between(None, end_ts)
+            if before is not None:
+                ts, ids = column_file.column("ts"), column_file.column("id")
+                while hi and (ts[hi - 1], ids[hi - 1]) >= before:
+                    hi -= 1
+            lo = max(0, hi - (limit - len(result)))
+            chunk = list(zip(*(
+                _python_values(kinds[name], column_file.column(name)[lo:hi]) for name in columns
+            )))
+            result += reversed(chunk)
+            if len(result) >= limit:
+                break
+        return result
+
+    def lookup(self, conn, table, user_id, ids, columns):
+        """{id: row tuple} for the archived rows among ids."""
+        ids = sorted(set(ids))
+        if not ids:
+            return {}
+        kinds = dict(TABLES[table])
+        wanted = np.array(ids, dtype=np.int64)
+        found = {}
+        rows = conn.execute(SQL_GET_PARTITIONS_BY_ID, (user_id, table, ids[-1], ids[0])).fetchall()
+        for month, generation in rows:
+            column_file = self._open(self._path(table, user_id, month, generation))
+            positions = np.flatnonzero(np.isin(column_file.column("id"), wanted)).tolist()
+            for position in positions:
+                row_id = int(column_file.column("id")[position])
+                found[row_id] = tuple(
+                    _python_values(kinds[name], column_file.column(name)[position:position + 1])[0]
+                    for name in columns
+                )
+        return found
+
+    def spending_between(self, conn, user_id, start_ts, end_ts, category=None):
+        """(total, count) of archived expenses in [start_ts, end_ts), as the SQL query counts them."""
+        columns = ("amount",) if category is None else ("amount", "description", "category")
+        data = self.read(conn, "expenses", user_id, columns, start_ts, end_ts)
+        amounts = data["amount"]
+        if category is not None:
+            needle = category.lower()
+            matches = np.fromiter((
+                (description is not None and needle in description.lower())
+                or (value is not None and needle in value.lower())
+                for description, value in zip(data["description"], data["category"])
+            ), bool, len(amounts))
+            amounts = amounts[matches]
+        return float(np.nansum(amounts)), len(amounts)
+
+    def stats(self):
+        """{table: {"partitions", "rows", "bytes"}} over every user."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_STATS).fetchall()
+        result = {table: {"partitions": 0, "rows": 0, "bytes": 0} for table in TABLES}
+        for source, partitions, row_count, size in rows:
+            result[source] = {"partitions": partitions, "rows": row_count, "bytes": size}
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old expenses and conversations to the archive.")
+    parser.add_argument("--db", default="spending_tracker.db", help="SQLite database file")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="Archive directory")
+    parser.add_argument("--horizon-days", type=int, default=HORIZON_DAYS,
+                        help="Archive whole months older than this")
+    parser.add_argument("--stats", action="store_true", help="Only print archive statistics")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    init_schema(pool)
+    try:
+        archive = Archive(pool, args.dir)
+        if not args.stats:
+            report = archive.run(args.horizon_days)
+            print(
+                f"archived {report['expenses']} expenses and {report['conversations']} conversations "
+                f"into {report['partitions']} partitions in {report['seconds']:.2f}s"
+            )
+        for table, stats in archive.stats().items():
+            print(f"{table}: {stats['rows']} rows in {stats['partitions']} files, {stats['bytes']:,} bytes")
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""Offline benchmarks for SmartSpend AI. Run from the repo root, e.g.
+
+    python -m benchmarks.bench_context
+"""
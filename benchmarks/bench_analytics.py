@@ -0,0 +1,49 @@
+"""Analysis tab statistics as the expenses table grows.
+
+Times the columnar load from SQLite and the vectorized computation
+separately at 10 to 1M rows (the app caches the combined result per data
+version, so each is paid once per change).
+
+    python -m benchmarks.bench_analytics [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from analytics import compute_analytics, load_columns
+from db import ConnectionPool, SpendingRepository, init_schema
+
+from benchmarks.bench_context import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'load ms':>9} {'compute ms':>11} {'days':>6} {'anomalies':>10}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "analytics.db"))
+            init_schema(pool)
+            repo = SpendingRepository(pool)
+            user_id = seed(repo, rows)
+            balance = repo.get_total_money(user_id)
+
+            started = time.perf_counter()
+            columns = load_columns(pool, user_id)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            for _ in range(args.repeats):
+                result = compute_analytics(columns, balance)
+            compute_ms = (time.perf_counter() - started) * 1000 / args.repeats
+            pool.close()
+        anomalies = len(result["spike_days"]) + len(result["outliers"])
+        print(f"{rows:>9,} {load_ms:>9.1f} {compute_ms:>11.1f} {len(result['daily']):>6} {anomalies:>10}")
+
+
+if __name__ == "__main__":
+    main()
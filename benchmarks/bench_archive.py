@@ -0,0 +1,133 @@
+"""Hot/cold tiering: reads before and after archiving, and what it costs.
+
+Seeds one user with --expenses expenses spread over two years (plus chat
+turns), measures the reads that span history with everything in SQLite,
+archives rows older than --horizon days (archive.py), and measures the
+same reads again through the unified API:
+
+- last_10 / recent_month    sidebar and chat queries (hot tier only)
+- all_time                  get_spending_between over the whole history
+- get_expenses              full history, merged from both tiers
+- load_columns              the Analysis tab's column load
+- conversation_page         paging from the newest turn into the archive
+
+Also reports the archiving run itself, hot row counts and the database
+size (after VACUUM) against the archive files.
+
+    python -m benchmarks.bench_archive [--expenses 200000] [--horizon 90]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from analytics import load_columns
+from archive import Archive
+from conversation_log import SQL_INSERT as SQL_INSERT_CONVERSATION
+from db import ConnectionPool, SpendingRepository, init_schema
+from importer import import_expenses
+
+HISTORY_DAYS = 730
+DESCRIPTIONS = ["chai", "mess food", "auto", "metro card", "books", "movie", "groceries", "phone recharge"]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentile(samples, 0.5), percentile(samples, 0.95)
+
+
+def seed(pool, repo, expenses, turns, now):
+    rng = random.Random(7)
+    user_id = repo.create_user("bench", "!")
+    span = HISTORY_DAYS * 24 * 60 * 60
+    rows = (
+        (rng.choice(DESCRIPTIONS), round(rng.uniform(10, 800), 2), now - span + i * span // expenses)
+        for i in range(expenses)
+    )
+    import_expenses(pool, user_id, rows)
+    with pool.transaction() as conn:
+        conn.executemany(SQL_INSERT_CONVERSATION, [
+            (None, user_id, f"s{i // 20}", now - span + i * span // turns, f"question {i} about food",
+             "You could cook more often and cap eating out at ₹2,000 a month.", None, None, None)
+            for i in range(turns)
+        ])
+    return user_id
+
+
+def measure(repo, pool, archive, user_id, now, repeat):
+    day = 24 * 60 * 60
+    return {
+        "last_10": timed(lambda: repo.get_last_10_expenses(user_id), repeat * 10),
+        "recent_month": timed(lambda: repo.get_spending_between(user_id, now - 30 * day, now), repeat * 10),
+        "all_time": timed(lambda: repo.get_spending_between(user_id, 0, now + day), repeat),
+        "get_expenses": timed(lambda: repo.get_expenses(user_id), max(repeat // 5, 3)),
+        "load_columns": timed(lambda: load_columns(pool, user_id, archive), max(repeat // 5, 3)),
+        "conversation_page": timed(lambda: repo.get_conversation_page(user_id, None, 200), repeat),
+    }
+
+
+def database_bytes(pool, path):
+    with pool.connection() as conn:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+def hot_rows(pool, user_id):
+    with pool.connection() as conn:
+        return tuple(
+            conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (user_id,)).fetchone()[0]
+            for table in ("expenses", "conversations")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=200000)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--horizon", type=int, default=90, help="archive rows older than this many days")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.db")
+        pool = ConnectionPool(path)
+        init_schema(pool)
+        user_id = seed(pool, SpendingRepository(pool), args.expenses, args.turns, now)
+        before = measure(SpendingRepository(pool), pool, None, user_id, now, args.repeat)
+        before_rows, before_bytes = hot_rows(pool, user_id), database_bytes(pool, path)
+
+        archive = Archive(pool, os.path.join(tmp, "archive"))
+        report = archive.run(args.horizon, now=now)
+        repo = SpendingRepository(pool, archive=archive)
+        after = measure(repo, pool, archive, user_id, now, args.repeat)
+        after_rows, after_bytes = hot_rows(pool, user_id), database_bytes(pool, path)
+        stats = archive.stats()
+        pool.close()
+
+    print(f"archived {report['expenses']:,} expenses and {report['conversations']:,} turns into "
+          f"{report['partitions']} partitions in {report['seconds']:.2f} s "
+          f"({(report['expenses'] + report['conversations']) / report['seconds']:,.0f} rows/s)")
+    print(f"hot rows (expenses, conversations): {before_rows} -> {after_rows}")
+    archive_bytes = sum(table["bytes"] for table in stats.values())
+    print(f"database: {before_bytes / 1e6:.1f} MB -> {after_bytes / 1e6:.1f} MB, "
+          f"archive files: {archive_bytes / 1e6:.1f} MB")
+    print(f"\n{'read':<18} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10}")
+    for name in before:
+        (p50_before, p95_before), (p50_after, p95_after) = before[name], after[name]
+        print(f"{name:<18} {p50_before:>10.3f}ms {p50_after:>8.3f}ms {p95_before:>10.3f}ms {p95_after:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
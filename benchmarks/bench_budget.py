@@ -0,0 +1,98 @@
+"""Latency of answering budget-planner requests with the local planner.
+
+Runs a corpus of planner requests (known cities, aliases, misspellings,
+unknown towns, no city, with and without an income) through
+answer_budget_request and reports p50/p99 per stage: recognizing the
+request and city, building the plan, and formatting the table. "cold" is
+the first pass (scaled templates not yet cached), "warm" the repeats.
+Also checks that non-budget chat messages are rejected quickly, since the
+chat flow asks the planner before every LLM call.
+
+    python -m benchmarks.bench_budget [--repeat 200]
+"""
+import argparse
+import time
+
+from budget_planner import _scaled_lines, format_plan, parse_budget_request, plan_budget
+
+REQUESTS = [
+    "Make me a budget for Pune",
+    "Create a budget plan for Bangalore, my income is 40k",
+    "create a monthly budget for bombay with stipend of 25000",
+    "can you make a budget for Mumbia",
+    "budget planner for Bhopal",
+    "give me a budget for gurgaon, I earn 1.2 lakh",
+    "suggest a budget in vizag for a student",
+    "create a budget for me",
+    "monthly budget for jaipur, my allowance is 15,000",
+    "prepare a budget for living in Hyderbad with salary 60000",
+]
+OTHER_MESSAGES = [
+    "How can I save more on food?",
+    "What is my budget looking like this month?",
+    "hello!",
+    "Explain the 50/30/20 rule",
+    "Should I invest in a SIP or an FD?",
+    "I need help sticking to my budget",
+    "I want to stay within budget this month, any tips?",
+    "I want to cut my budget on eating out",
+    "plan a budget for my trip to goa",
+    "make a budget for my trip to goa",
+    "budget?",
+    "budget, how do I stick to it",
+]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(texts, repeat):
+    stages = {"parse": [], "plan": [], "format": [], "total": []}
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            request = parse_budget_request(text)
+            parsed = time.perf_counter()
+            plan = plan_budget(request["city"], request["income"], balance=42000)
+            planned = time.perf_counter()
+            format_plan(plan)
+            done = time.perf_counter()
+            stages["parse"].append((parsed - started) * 1000)
+            stages["plan"].append((planned - parsed) * 1000)
+            stages["format"].append((done - planned) * 1000)
+            stages["total"].append((done - started) * 1000)
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    _scaled_lines.cache_clear()
+    print(f"{'pass':<6} {'stage':<8} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, repeat in (("cold", 1), ("warm", args.repeat)):
+        for stage, samples in run(REQUESTS, repeat).items():
+            print(f"{label:<6} {stage:<8} {percentile(samples, 0.5):>9.4f} {percentile(samples, 0.99):>9.4f}")
+
+    samples = []
+    for _ in range(args.repeat):
+        for text in OTHER_MESSAGES:
+            started = time.perf_counter()
+            assert parse_budget_request(text) is None, text
+            samples.append((time.perf_counter() - started) * 1000)
+    print(f"\nnon-budget message rejected: p50 {percentile(samples, 0.5):.4f} ms, "
+          f"p99 {percentile(samples, 0.99):.4f} ms")
+
+    print("\nrequest -> city (tier, match), income")
+    for text in REQUESTS:
+        request = parse_budget_request(text)
+        city = request["city"]
+        where = f"{city[0]} (tier {city[1]}, {city[2]})" if city else "none (tier 2 default)"
+        print(f"  {text!r:<62} -> {where}, {request['income']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Prompt context size and build time as the expenses table grows.
+
+Compares the bounded context_builder output with the legacy "every expense
+on its own line" context at 10 to 1M rows.
+
+    python -m benchmarks.bench_context [--sizes 10 1000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from context_builder import build_context, estimate_tokens
+from db import ConnectionPool, SpendingRepository, init_schema
+
+DESCRIPTIONS = ["food", "rent", "travel", "books", "movies", "groceries", "coffee", "fees"]
+
+
+def seed(repo, rows, seed_value=42):
+    rng = random.Random(seed_value)
+    user_id = repo.create_user("bench", "x")
+    repo.update_total_money(user_id, 100000)
+    now = int(time.time())
+    sql = "INSERT INTO expenses (user_id, description, amount, ts) VALUES (?, ?, ?, ?)"
+    batch = []
+    with repo.pool.transaction() as conn:
+        for i in range(rows):
+            ts = now - rng.randrange(365 * 24 * 60 * 60)
+            batch.append((user_id, rng.choice(DESCRIPTIONS), rng.randint(10, 2000), ts))
+            if len(batch) == 50000:
+                conn.executemany(sql, batch)
+                batch.clear()
+        conn.executemany(sql, batch)
+    return user_id
+
+
+def legacy_context(repo, user_id):
+    expenses = repo.get_expenses(user_id)
+    total_spent = sum(expense[1] for expense in expenses)
+    balance = repo.get_total_money(user_id)
+    return f"""
+    Initial money: ₹{balance + total_spent}
+    Total spent: ₹{total_spent}
+    Current balance: ₹{balance}
+
+    Expense breakdown:
+    {chr(10).join(f'- {desc}: ₹{amt}' for desc, amt, _ in expenses)}
+    """
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>9} | {'ctx tokens':>10} {'ctx ms':>8} | {'legacy tokens':>13} {'legacy ms':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "bench.db"))
+            init_schema(pool)
+            repo = SpendingRepository(pool)
+            user_id = seed(repo, size)
+            context, ctx_ms = timed(lambda: build_context(repo, user_id), args.repeat)
+            legacy, legacy_ms = timed(lambda: legacy_context(repo, user_id), 1)
+            print(
+                f"{size:>9} | {estimate_tokens(context):>10} {ctx_ms:>8.2f} | "
+                f"{estimate_tokens(legacy):>13} {legacy_ms:>9.1f}"
+            )
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
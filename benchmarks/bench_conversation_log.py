@@ -0,0 +1,74 @@
+"""Request-path cost of saving a chat turn, synchronous INSERT vs ConversationWriter.
+
+Saves N turns with a growing prompt context per session and reports the
+per-turn latency the chat handler sees (p50/p99), the total time until
+everything is on disk, and the bytes stored for the context column (plain
+JSON text before, keyframes plus diffs now).
+
+    python -m benchmarks.bench_conversation_log [--turns 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from conversation_log import ConversationWriter
+from db import ConnectionPool, SpendingRepository, init_schema
+
+TURNS_PER_SESSION = 20
+
+
+def make_context(turn):
+    lines = [f"Current balance: ₹{50000 - turn * 37:,.2f}", "Spending by category:"]
+    lines += [f"- category {i}: ₹{1000 + i * 13 + (turn if i == 3 else 0):,.2f}" for i in range(25)]
+    lines += [f"User: earlier question {i}" for i in range(turn % TURNS_PER_SESSION)]
+    return "\n".join(lines)
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else samples[0]
+
+
+def run(turns, use_writer):
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "log.db"))
+        init_schema(pool)
+        repo = SpendingRepository(pool)
+        user_id = repo.create_user("bench", "x")
+        writer = ConversationWriter(pool) if use_writer else None
+        samples = []
+        started = time.perf_counter()
+        for turn in range(turns):
+            session_id = f"s{turn // TURNS_PER_SESSION}"
+            context = make_context(turn)
+            t0 = time.perf_counter()
+            if writer:
+                writer.submit(user_id, session_id, f"question {turn}", "answer " * 40, context)
+            else:
+                repo.save_conversation(user_id, session_id, f"question {turn}", "answer " * 40,
+                                       json.dumps(context))
+            samples.append((time.perf_counter() - t0) * 1000)
+        if writer:
+            writer.close()
+        total_ms = (time.perf_counter() - started) * 1000
+        with pool.connection() as conn:
+            stored = conn.execute("SELECT SUM(LENGTH(context)) FROM conversations").fetchone()[0]
+        pool.close()
+    return percentile(samples, 50), percentile(samples, 99), total_ms, stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'p50 ms':>8} {'p99 ms':>8} {'total ms':>9} {'context KB':>11}")
+    for name, use_writer in (("sync", False), ("writer", True)):
+        p50, p99, total_ms, stored = run(args.turns, use_writer)
+        print(f"{name:>8} {p50:>8.3f} {p99:>8.3f} {total_ms:>9.0f} {stored / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
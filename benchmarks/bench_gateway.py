@@ -0,0 +1,88 @@
+"""Offline load test of llm_gateway.LLMGateway against FakeChatModel.
+
+Fires --requests chat calls from --clients concurrent callers, a share of
+them duplicates of each other, at a fake model with injected latency and
+quota errors, and reports throughput, latency percentiles and gateway stats.
+
+    python -m benchmarks.bench_gateway --requests 200 --clients 50 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from fake_llm import FakeChatModel
+from llm_gateway import LLMGateway
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args):
+    model = FakeChatModel(latency=args.latency, jitter=0.2, failure_rate=args.failure_rate, seed=1)
+    gateway = LLMGateway(
+        model, max_concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+        base_delay=0.05, max_delay=1.0, timeout=args.latency * 4,
+    )
+    rng = random.Random(7)
+    questions = [f"question {i}" for i in range(args.requests)]
+    # A share of callers ask something already asked (e.g. the fixed
+    # Analysis prompt clicked in several sessions at once)
+    for i in range(args.requests):
+        if rng.random() < args.duplicates:
+            questions[i] = questions[rng.randrange(max(i, 1))]
+
+    pending = asyncio.Queue()
+    for question in questions:
+        pending.put_nowait(question)
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        while not pending.empty():
+            question = pending.get_nowait()
+            started = time.perf_counter()
+            try:
+                await gateway.ainvoke({"context": "ctx", "question": question})
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "errors": errors,
+        "model_calls": model.calls,
+        **gateway.stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
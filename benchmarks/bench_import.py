@@ -0,0 +1,88 @@
+"""Bulk import throughput, checked against the 100k rows/s target.
+
+Writes a --rows line bank-statement CSV and imports it with
+importer.import_file into a fresh database, then imports it again (every
+row a duplicate). Parsing, dedupe, the inserts and the spend_* aggregate
+updates are all included in the timing. This is repeated --repeat times
+with a new database each time and the best run is reported, which keeps
+noise from other processes out of the check. Exits with status 1 if the
+first import is slower than --target rows/s.
+
+    python -m benchmarks.bench_import [--rows 200000] [--chunk-size 50000] [--target 100000]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from db import ConnectionPool, SpendingRepository, init_schema
+from importer import CHUNK_SIZE, import_file
+
+DESCRIPTIONS = ["chai", "mess food", "auto", "metro card", "books", "movie", "groceries", "phone recharge"]
+
+
+def write_statement(path, rows):
+    rng = random.Random(5)
+    start = datetime(2023, 1, 1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Narration", "Withdrawal Amt."])
+        for i in range(rows):
+            # Statements list dates without a time, a few hundred rows a day
+            when = start + timedelta(days=i // 300)
+            writer.writerow([when.strftime("%d/%m/%Y"), rng.choice(DESCRIPTIONS), f"{rng.uniform(10, 800):.2f}"])
+
+
+def run(tmp, statement, chunk_size):
+    """Import statement twice into a new database; returns the two reports."""
+    path = os.path.join(tmp, "import.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    pool = ConnectionPool(path)
+    init_schema(pool)
+    repo = SpendingRepository(pool)
+    user_id = repo.create_user("bench", "!")
+    reports = []
+    for _ in range(2):
+        with open(statement, encoding="utf-8", newline="") as f:
+            reports.append(import_file(pool, user_id, f, "csv", chunk_size))
+    # The aggregates must account for every row, with one version bump per chunk
+    assert repo.get_spending_totals(user_id)[1] == reports[0]["inserted"]
+    reports.append(repo.get_data_version(user_id))
+    pool.close()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--target", type=float, default=100000, help="minimum rows/s of the first import")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        statement = os.path.join(tmp, "statement.csv")
+        write_statement(statement, args.rows)
+        runs = [run(tmp, statement, args.chunk_size) for _ in range(args.repeat)]
+
+    print(f"{args.rows:,} rows, chunks of {args.chunk_size:,}, best of {args.repeat}")
+    print(f"\n{'import':<10} {'inserted':>10} {'seconds':>8} {'rows/s':>10}")
+    for name, index in (("first", 0), ("again", 1)):
+        best = max((reports[index] for reports in runs), key=lambda report: report["rows_per_sec"])
+        print(f"{name:<10} {best['inserted']:>10,} {best['seconds']:>8.2f} {best['rows_per_sec']:>10,.0f}")
+    print(f"\ndata version after both imports: {runs[0][2]}")
+    first = max(reports[0]["rows_per_sec"] for reports in runs)
+    if first < args.target:
+        print(f"FAIL: first import {first:,.0f} rows/s is below the {args.target:,.0f} rows/s target")
+        return 1
+    print(f"OK: first import {first:,.0f} rows/s (target {args.target:,.0f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
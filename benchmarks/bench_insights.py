@@ -0,0 +1,136 @@
+"""Analysis/Savings tab latency: synchronous LLM calls vs the insight worker.
+
+Seeds one user with --expenses expenses and compares:
+
+- sync       what a tab click used to cost: analytics for the new data
+             version plus the blocking LLM call (fake_llm.FakeChatModel with
+             --llm-latency seconds per call)
+- worker     what the tab costs with insights.py: reading the stored insight
+             and job status, plus the analytics the worker already computed
+
+Then adds a burst of --burst expenses (one every --gap seconds, like an
+import or a quick series of chat commands) with the worker running, and
+reports how many jobs and LLM calls the debounce collapsed them into and
+how long after the last write the fresh insights were ready.
+
+    python -m benchmarks.bench_insights [--expenses 20000] [--llm-latency 1.0]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from analytics import analyze
+from db import ConnectionPool, SpendingRepository, init_schema
+from fake_llm import FakeChatModel
+from importer import import_expenses
+from insights import ANALYSIS, QUESTIONS, SAVINGS, InsightWorker, analysis_context
+from llm_cache import ResponseCache
+from llm_gateway import LLMGateway
+
+DESCRIPTIONS = ["chai", "mess food", "auto", "metro card", "books", "movie", "groceries", "phone recharge"]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def seed(repo, pool, expenses, now):
+    rng = random.Random(3)
+    user_id = repo.create_user("bench", "!")
+    repo.update_total_money(user_id, 10_000_000)
+    span = 365 * 24 * 60 * 60
+    import_expenses(pool, user_id, (
+        (rng.choice(DESCRIPTIONS), round(rng.uniform(10, 800), 2), now - span + i * span // expenses)
+        for i in range(expenses)
+    ))
+    return user_id
+
+
+def sync_click(repo, pool, gateway, user_id):
+    """The old Analyze Spending click: fresh analytics, then a blocking LLM call."""
+    analytics = analyze(pool, user_id, repo.get_total_money(user_id))
+    return gateway.invoke({
+        "context": analysis_context(repo, user_id, analytics), "question": QUESTIONS[ANALYSIS],
+    })
+
+
+def worker_render(repo, worker, user_id):
+    """What render_analysis_tab reads from the worker."""
+    data_version = repo.get_data_version(user_id)
+    worker.analytics(user_id, data_version)
+    worker.status(user_id)
+    return worker.latest(user_id)[ANALYSIS]["content"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=20000)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake LLM call")
+    parser.add_argument("--burst", type=int, default=50, help="writes in the burst")
+    parser.add_argument("--gap", type=float, default=0.02, help="seconds between burst writes")
+    parser.add_argument("--debounce", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "insights.db"))
+        init_schema(pool)
+        repo = SpendingRepository(pool)
+        user_id = seed(repo, pool, args.expenses, now)
+        model = FakeChatModel(latency=args.llm_latency, ttft=args.llm_latency / 3)
+        gateway = LLMGateway(model, rate=100.0, burst=100)
+
+        sync = []
+        for _ in range(args.repeat):
+            # Every click after a write paid for both steps again
+            repo.add_expense_atomic(user_id, "chai", 10)
+            started = time.perf_counter()
+            sync_click(repo, pool, gateway, user_id)
+            sync.append((time.perf_counter() - started) * 1000)
+
+        worker = InsightWorker(
+            repo, lambda inputs, kind: gateway.invoke(inputs), cache=ResponseCache(pool),
+            debounce=args.debounce, poll_interval=min(args.debounce, 1.0) / 5,
+        )
+        worker.run_pending(now=time.time() + args.debounce)
+        jobs_before, calls_before = worker.stats["jobs"], model.calls
+        worker.start()
+
+        for _ in range(args.burst):
+            repo.add_expense_atomic(user_id, random.choice(DESCRIPTIONS), 25)
+            time.sleep(args.gap)
+        last_write = time.perf_counter()
+        data_version = repo.get_data_version(user_id)
+        while True:
+            latest = worker.latest(user_id)
+            versions = [latest.get(kind, {}).get("data_version") for kind in (ANALYSIS, SAVINGS)]
+            if versions == [data_version, data_version]:
+                break
+            time.sleep(0.01)
+        ready_after = time.perf_counter() - last_write
+        jobs, llm_calls = worker.stats["jobs"] - jobs_before, model.calls - calls_before
+        worker.close()
+
+        reads = []
+        for _ in range(args.repeat * 40):
+            started = time.perf_counter()
+            worker_render(repo, worker, user_id)
+            reads.append((time.perf_counter() - started) * 1000)
+        gateway.close()
+        pool.close()
+
+    print(f"{args.expenses:,} expenses, fake LLM {args.llm_latency:.1f} s/call")
+    print(f"\n{'tab render':<10} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, samples in (("sync", sync), ("worker", reads)):
+        print(f"{name:<10} {percentile(samples, 0.5):>10.2f} {percentile(samples, 0.95):>10.2f}")
+    print(f"\nburst of {args.burst} writes over {args.burst * args.gap:.1f} s -> {jobs} job(s), "
+          f"{llm_calls} LLM call(s); insights ready {ready_after:.2f} s after the last write "
+          f"(debounce {args.debounce:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Login latency and throughput per password-hashing cost setting.
+
+For each configuration, registers --users accounts in a temporary database,
+then measures Credentials.authenticate: sequential latency (p50/p95) and
+logins/s with 1 to --threads concurrent callers (hashlib releases the GIL
+while hashing, as Streamlit's session threads would). Also reports the
+one-off cost of a legacy SHA-256 login that gets rehashed, and session
+token verification (first check vs cached) for the reruns after login.
+
+    python -m benchmarks.bench_login [--logins 40] [--threads 1 4 8]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from credentials import Credentials, PBKDF2Hasher, ScryptHasher, SessionTokens
+from db import ConnectionPool, SpendingRepository, init_schema
+
+CONFIGS = [
+    ("scrypt n=2^13 r=8", ScryptHasher(n=2 ** 13)),
+    ("scrypt n=2^14 r=8 (default)", ScryptHasher()),
+    ("scrypt n=2^15 r=8", ScryptHasher(n=2 ** 15)),
+    ("pbkdf2 200k", PBKDF2Hasher(200000)),
+    ("pbkdf2 600k", PBKDF2Hasher()),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def throughput(credentials, repo, users, logins, threads):
+    per_thread = max(logins // threads, 1)
+
+    def worker(offset):
+        for i in range(per_thread):
+            name = f"user{(offset + i) % users}"
+            assert credentials.authenticate(repo, name, f"password-{name}") is not None
+
+    workers = [threading.Thread(target=worker, args=(i * per_thread,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    header = " ".join(f"{f'{n} thr/s':>9}" for n in args.threads)
+    print(f"{'hasher':<28} {'p50 ms':>8} {'p95 ms':>8} {header} {'legacy ms':>10}")
+    for label, hasher in CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "login.db"))
+            init_schema(pool)
+            repo = SpendingRepository(pool)
+            credentials = Credentials(hasher)
+            for i in range(args.users):
+                repo.create_user(f"user{i}", credentials.hash(f"password-user{i}"))
+            repo.create_user("legacy", hashlib.sha256(b"password-legacy").hexdigest())
+
+            samples = []
+            for i in range(args.logins):
+                name = f"user{i % args.users}"
+                started = time.perf_counter()
+                credentials.authenticate(repo, name, f"password-{name}")
+                samples.append((time.perf_counter() - started) * 1000)
+            rates = [throughput(credentials, repo, args.users, args.logins, n) for n in args.threads]
+
+            # First login of a legacy row: SHA-256 check plus rehash and UPDATE
+            started = time.perf_counter()
+            credentials.authenticate(repo, "legacy", "password-legacy")
+            legacy_ms = (time.perf_counter() - started) * 1000
+            pool.close()
+        rate_text = " ".join(f"{rate:>9.1f}" for rate in rates)
+        print(f"{label:<28} {percentile(samples, 50):>8.1f} {percentile(samples, 95):>8.1f} "
+              f"{rate_text} {legacy_ms:>10.1f}")
+
+    tokens = SessionTokens()
+    token = tokens.issue(1, "user0")
+    started = time.perf_counter()
+    tokens.verify(token)
+    first_us = (time.perf_counter() - started) * 1e6
+    started = time.perf_counter()
+    for _ in range(10000):
+        tokens.verify(token)
+    cached_us = (time.perf_counter() - started) * 1e6 / 10000
+    print(f"\nsession token check per rerun: first {first_us:.1f} us, cached {cached_us:.2f} us "
+          f"(no users-table query)")
+
+
+if __name__ == "__main__":
+    main()
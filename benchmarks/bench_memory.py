@@ -0,0 +1,49 @@
+"""Per-rerun chat cost as a conversation grows, unbounded list vs ChatMemory.
+
+For chats of 10 to 10k turns, reports how many messages a rerun renders and
+how large the session state and the history handed to the prompt are. The
+legacy session kept (and re-rendered) every message; ChatMemory keeps a
+fixed window plus a bounded summary.
+
+    python -m benchmarks.bench_memory [--turns 10 100 1000 10000]
+"""
+import argparse
+import pickle
+import time
+
+from chat_memory import ChatMemory
+from context_builder import estimate_tokens
+
+ANSWER = (
+    "## Savings tips\n\nCook at home a few days a week. Track every expense. "
+    "Use student discounts where you can, and set a weekly budget for eating out. "
+) * 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'turns':>7} | {'legacy msgs':>11} {'state KB':>9} | "
+          f"{'memory msgs':>11} {'state KB':>9} {'prompt tok':>10} {'prompt us':>10}")
+    for turns in args.turns:
+        history = []
+        memory = ChatMemory()
+        for i in range(turns):
+            question = f"How can I save more on item {i} this month?"
+            history += [{"user": question}, {"assistant": ANSWER}]
+            memory.add_turn({"id": i, "user": question, "assistant": ANSWER})
+
+        started = time.perf_counter()
+        for _ in range(100):
+            lines = memory.prompt_lines()
+        prompt_us = (time.perf_counter() - started) / 100 * 1e6
+        prompt_tokens = sum(estimate_tokens(line) + 1 for line in lines)
+        print(f"{turns:>7,} | {len(history):>11,} {len(pickle.dumps(history)) / 1024:>9.1f} | "
+              f"{2 * len(memory.turns):>11} {len(pickle.dumps(memory)) / 1024:>9.1f} "
+              f"{prompt_tokens:>10} {prompt_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
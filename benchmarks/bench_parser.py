@@ -0,0 +1,149 @@
+"""Chat command parser throughput and the share of LLM calls it avoids.
+
+Runs nlp_parser.parse_command (and the legacy single-regex parser for
+comparison) over a corpus of chat utterances, then times answering the
+locally-resolvable ones from a seeded SQLite database.
+
+    python -m benchmarks.bench_parser [--iterations 2000]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db import ConnectionPool, SpendingRepository, init_schema
+from nlp_parser import parse_command
+
+from benchmarks.bench_context import seed
+
+CORPUS = [
+    # expenses
+    "spent 500 on food today",
+    "I spent ₹1,250.50 on groceries yesterday",
+    "spent rs. 200 on bus 3 days ago",
+    "paid 300 for books on 12/03/2025",
+    "spent 99 on coffee on 3 march",
+    "spent 450 on movie",
+    "bought 2,000 rs for shoes",
+    "spent on snacks 120 today",
+    # income
+    "received 5000 salary",
+    "add rs 2000 to balance",
+    "got 1,00,000 from dad",
+    "credited ₹15000 stipend",
+    # queries
+    "show my food spending last week",
+    "how much did I spend on travel this month?",
+    "spending between 2025-01-01 and 2025-01-31",
+    "what did i spend last 30 days",
+    "total spent yesterday",
+    "how much did i spend in february",
+    "show me my spending this year",
+    # balance / undo
+    "what's my balance?",
+    "balance",
+    "check my balance",
+    "undo last",
+    "delete last expense",
+    "restore",
+    # ordinary chat (must go to the LLM)
+    "hey how are you",
+    "how can I save money on rent?",
+    "give me a budget for pune",
+    "is it a good idea to buy a bike on EMI?",
+    "what are some cheap hobbies for students",
+    "explain the 50/30/20 rule",
+    # look like commands but must go to the LLM too
+    "I got 2 questions about saving money",
+    "should I add 5000 to my emergency fund",
+    "got 3 months of rent left, how to plan?",
+    "spending tips for students",
+    "how can I reduce my spending on food?",
+    "can you show my budget for pune",
+    "what is the total spending in 2024",
+    "I spent 500 on food and 200 on travel today",
+    "spent 0 on nothing",
+]
+
+
+def legacy_parse(user_input):
+    user_input = user_input.lower()
+    today = datetime.now()
+    parsed_data = {"action": None, "description": None, "amount": None, "start_date": None, "end_date": None}
+    expense_match = re.search(r"spent\s+(\d+)\s+on\s+(.*?)\s+(today|yesterday|(\d+)\s+days ago)", user_input)
+    if expense_match:
+        parsed_data["action"] = "add_expense"
+        parsed_data["amount"] = float(expense_match.group(1))
+        parsed_data["description"] = expense_match.group(2)
+        if expense_match.group(3) == "today":
+            parsed_data["start_date"] = parsed_data["end_date"] = today
+        elif expense_match.group(3) == "yesterday":
+            parsed_data["start_date"] = parsed_data["end_date"] = today - timedelta(days=1)
+        elif expense_match.group(4):
+            parsed_data["start_date"] = parsed_data["end_date"] = today - timedelta(days=int(expense_match.group(4)))
+    return parsed_data
+
+
+def throughput(parse, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for utterance in CORPUS:
+            parse(utterance)
+    elapsed = time.perf_counter() - started
+    return iterations * len(CORPUS) / elapsed
+
+
+def answer_locally(repo, user_id, parsed):
+    action = parsed["action"]
+    if action == "show_balance":
+        return repo.get_total_money(user_id)
+    if action == "query_spending":
+        return repo.get_spending_between(
+            user_id, int(parsed["start_date"].timestamp()), int(parsed["end_date"].timestamp()),
+            parsed["category"],
+        )
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    parsed = [parse_command(utterance) for utterance in CORPUS]
+    local = sum(1 for result in parsed if result["action"])
+    legacy_local = sum(1 for utterance in CORPUS if legacy_parse(utterance)["action"])
+
+    print(f"corpus: {len(CORPUS)} utterances")
+    for utterance, result in zip(CORPUS, parsed):
+        print(f"  {result['action'] or 'llm':<15} {utterance}")
+    print()
+    print(f"{'parser':<8} {'utterances/s':>14} {'us/utterance':>13} {'LLM calls avoided':>18}")
+    for name, parse, handled in (("legacy", legacy_parse, legacy_local), ("new", parse_command, local)):
+        rate = throughput(parse, args.iterations)
+        print(f"{name:<8} {rate:>14,.0f} {1e6 / rate:>13.1f} "
+              f"{handled:>6}/{len(CORPUS)} ({handled / len(CORPUS):.0%})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(os.path.join(tmp, "parser.db"))
+        init_schema(pool)
+        repo = SpendingRepository(pool)
+        user_id = seed(repo, args.rows)
+        queries = [result for result in parsed if result["action"] in ("show_balance", "query_spending")]
+        repeats = 50
+        started = time.perf_counter()
+        for _ in range(repeats):
+            for result in queries:
+                answer_locally(repo, user_id, result)
+        elapsed = time.perf_counter() - started
+        pool.close()
+    print()
+    print(f"local answers over {args.rows:,} expenses: "
+          f"{elapsed / (repeats * len(queries)) * 1e6:.0f} us per balance/spending query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Chat chain startup cost and prompt size, legacy wiring vs chain.py.
+
+Measures:
+- import time of the chain module vs the legacy top-level imports,
+- per-rerun cost of constructing the model and templates (what every
+  Streamlit rerun used to pay) vs reusing the cached chain,
+- characters actually sent to the model for one question, legacy
+  double-formatted prompt vs the single-rendered one.
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    PromptTemplate,
+    SystemMessagePromptTemplate,
+)
+
+from chain import SYSTEM_MESSAGE, build_chat_chain, build_prompt_template
+
+LEGACY_IMPORTS = """
+from langchain.schema import SystemMessage, HumanMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.memory import ConversationBufferMemory
+from langchain.prompts import PromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate, ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain.schema.runnable import RunnablePassthrough
+from rich.console import Console
+from rich.markdown import Markdown
+"""
+NEW_IMPORTS = "import chain"
+
+SAMPLE_CONTEXT = "Summary:\nInitial money: ₹10,000.00\nTotal spent: ₹2,500.00 across 12 expenses"
+SAMPLE_QUESTION = "How can I cut my food spending this month?"
+
+
+def import_time(code, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c",
+             f"import time; t = time.perf_counter()\n{code}\nprint(time.perf_counter() - t)"],
+            capture_output=True, text=True, check=True,
+        )
+        best = min(best, float(out.stdout.strip().splitlines()[-1]))
+    return best * 1000
+
+
+def legacy_prompt_template():
+    system = SYSTEM_MESSAGE.replace(
+        "**context**:{context}\n", "**context**:{context}\n       **question**:{question}\n"
+    )
+    return ChatPromptTemplate(
+        input_variables=["context", "question"],
+        messages=[
+            SystemMessagePromptTemplate(prompt=PromptTemplate(input_variables=["context"], template=system)),
+            HumanMessagePromptTemplate(prompt=PromptTemplate(input_variables=["question"], template="{question}")),
+        ],
+    )
+
+
+def sent_prompt_sizes():
+    sent = []
+    capture = RunnableLambda(lambda prompt: sent.append(prompt.to_string()) or "ok")
+
+    legacy_template = legacy_prompt_template()
+    legacy_chain = (
+        {"context": RunnablePassthrough(), "question": RunnablePassthrough()}
+        | legacy_template
+        | capture
+    )
+    legacy_chain.invoke(legacy_template.format(context=SAMPLE_CONTEXT, question=SAMPLE_QUESTION))
+
+    (build_prompt_template() | capture).invoke({"context": SAMPLE_CONTEXT, "question": SAMPLE_QUESTION})
+    return len(sent[0]), len(sent[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    legacy_ms = import_time(LEGACY_IMPORTS, args.repeat)
+    new_ms = import_time(NEW_IMPORTS, args.repeat)
+    print(f"import:        legacy {legacy_ms:8.1f} ms   chain.py {new_ms:8.1f} ms")
+
+    started = time.perf_counter()
+    for _ in range(args.reruns):
+        build_chat_chain("dummy-key")
+    rebuild_ms = (time.perf_counter() - started) * 1000 / args.reruns
+    cache = {}
+    started = time.perf_counter()
+    for _ in range(args.reruns):
+        if "chain" not in cache:
+            cache["chain"] = build_chat_chain("dummy-key")
+    cached_ms = (time.perf_counter() - started) * 1000 / args.reruns
+    print(f"per rerun:     rebuild {rebuild_ms:7.2f} ms   cached {cached_ms:10.4f} ms")
+
+    legacy_chars, new_chars = sent_prompt_sizes()
+    print(f"prompt chars:  legacy {legacy_chars:8d}      single {new_chars:8d} "
+          f"({legacy_chars / new_chars:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
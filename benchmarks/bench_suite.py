@@ -0,0 +1,504 @@
+"""Reproducible benchmark and load test of the app's hot paths, offline.
+
+For each size, seeds a database with the app's schema (init_schema, so
+every migration, trigger and aggregate is real) holding that many expenses
+for the measured user plus a few background users and a chat history, then
+measures, per call:
+
+- login                   Credentials.authenticate, as in login_user
+- add_expense             add_expense_atomic
+- get_last_10_expenses
+- context_build           build_chat_inputs: spending context, retrieval
+                          over past turns and session memory
+- chat_local              process_chat_message for a command answered from
+                          SQLite ("spent 120 on chai")
+- chat_llm                process_chat_message through the LLM gateway,
+                          the write-behind log and the session memory
+
+The Gemini chain is replaced by fake_llm.FakeChatModel (deterministic,
+--llm-latency seconds per call) behind the real LLMGateway. A load phase
+then runs --sessions concurrent sessions (threads, as Streamlit serves
+sessions) issuing a weighted mix of those operations for --duration
+seconds.
+
+Results are written as JSON (--out) together with the git commit, Python
+and SQLite versions, so two runs can be compared:
+
+    python -m benchmarks.bench_suite --sizes 1000 100000 10000000 --out after.json
+    python -m benchmarks.bench_suite --compare before.json after.json
+
+Seeded databases are deterministic (--seed) and can be kept in --cache-dir
+so the 10M-row database is built once; each run works on a copy. With
+--archive-horizon DAYS, rows older than that are moved to the archive
+(archive.py) before measuring, as the app's archiver would have done.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from archive import Archive
+from categorizer import Categorizer
+from chat_memory import ChatMemory
+from context_builder import build_context
+from credentials import Credentials
+from conversation_index import ConversationIndex, retrieve_turns
+from conversation_log import SQL_INSERT as SQL_INSERT_CONVERSATION, ConversationWriter
+from db import ConnectionPool, SpendingRepository, init_schema
+from fake_llm import FakeChatModel
+from importer import import_expenses
+from llm_gateway import LLMGateway
+from nlp_parser import parse_command
+
+DEFAULT_SIZES = [1000, 100000, 10000000]
+# Mirrors top1.py
+CONTEXT_TOKEN_BUDGET = 600
+HISTORY_TOKEN_BUDGET = 300
+MEMORY_TOKEN_BUDGET = 400
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench-password"
+BACKGROUND_USERS = 9
+BACKGROUND_EXPENSES = 1000
+SEED_TURNS = 500
+HISTORY_DAYS = 730
+
+# (description, typical amount) pairs the seeded expenses are drawn from
+EXPENSES = [
+    ("zomato dinner", 350), ("swiggy lunch", 220), ("chai", 20), ("groceries dmart", 900),
+    ("hostel rent", 6000), ("electricity bill", 700), ("mobile recharge", 299),
+    ("uber to college", 180), ("metro card", 200), ("books for semester", 1200),
+    ("exam fees", 2500), ("netflix", 199), ("movie tickets", 400), ("gym membership", 1000),
+    ("amazon order", 1500), ("medicine", 250), ("coffee", 120), ("haircut", 150),
+]
+QUESTIONS = [
+    "How can I save more on food this month?",
+    "Am I spending too much on rent?",
+    "What should my budget for travel be?",
+    "Give me tips to cut down on subscriptions",
+    "How much should I keep aside for exam fees?",
+]
+LOCAL_COMMANDS = ["spent 120 on chai", "how much did I spend on food this month", "what's my balance"]
+
+# Operation mix of the load phase: (name, weight)
+LOAD_MIX = [
+    ("get_last_10_expenses", 35), ("add_expense", 20), ("chat_local", 15),
+    ("chat_llm", 20), ("context_build", 5), ("login", 5),
+]
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples_ms, elapsed=None):
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+    stats = {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered),
+        "p50_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "p99_ms": percentile(ordered, 99),
+        "max_ms": ordered[-1],
+    }
+    if elapsed:
+        stats["ops_per_sec"] = len(ordered) / elapsed
+    return stats
+
+
+# Seeding
+
+def _expense_rows(rng, count, now):
+    """count (description, amount, ts) rows spread over HISTORY_DAYS, oldest first."""
+    span = HISTORY_DAYS * 24 * 60 * 60
+    start = now - span
+    for i in range(count):
+        description, typical = rng.choice(EXPENSES)
+        amount = round(typical * rng.uniform(0.5, 1.5), 2)
+        yield description, amount, start + i * span // count + rng.randrange(60)
+
+
+def seed_database(path, expenses, seed=42, now=None):
+    """Build a seeded database at path; returns its metadata dict."""
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    # Midnight, so databases seeded on the same day are identical
+    now = now or int(time.time()) // 86400 * 86400
+    pool = ConnectionPool(path)
+    init_schema(pool)
+    repo = SpendingRepository(pool)
+    categorizer = Categorizer.load()
+    credentials = Credentials()
+
+    user_id = repo.create_user(BENCH_USER, credentials.hash(BENCH_PASSWORD))
+    repo.update_total_money(user_id, 10 ** 12)
+    report = import_expenses(pool, user_id, _expense_rows(rng, expenses, now), categorizer=categorizer)
+    for i in range(BACKGROUND_USERS):
+        other_id = repo.create_user(f"user{i}", credentials.hash(f"password{i}"))
+        repo.update_total_money(other_id, 50000)
+        import_expenses(pool, other_id, _expense_rows(rng, BACKGROUND_EXPENSES, now),
+                        categorizer=categorizer)
+
+    turns = []
+    for i in range(SEED_TURNS):
+        question = rng.choice(QUESTIONS)
+        description, _ = rng.choice(EXPENSES)
+        turns.append((
+            None, user_id, f"seed-{i // 20}", now - (SEED_TURNS - i) * 3600, question,
+            f"You spent most on {description} recently. Try setting a weekly limit for it.",
+            None, None, None,
+        ))
+    with pool.transaction() as conn:
+        conn.executemany(SQL_INSERT_CONVERSATION, turns)
+    pool.close()
+    return {
+        "expenses": report["inserted"], "background_users": BACKGROUND_USERS,
+        "conversations": SEED_TURNS, "seed": seed, "anchor_ts": now,
+        "seed_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def prepare_database(size, workdir, cache_dir=None, seed=42):
+    """Seeded database for size in workdir (copied from cache_dir when cached)."""
+    path = os.path.join(workdir, "spending_tracker.db")
+    if cache_dir is None:
+        return path, seed_database(path, size, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f"seed-{size}-{seed}.db")
+    meta_path = cached + ".json"
+    if os.path.exists(cached) and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = dict(json.load(f), cached=True)
+    else:
+        meta = seed_database(cached, size, seed)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    shutil.copyfile(cached, path)
+    return path, meta
+
+
+# The app, minus Streamlit
+
+class BenchApp:
+    """Process-wide resources, as top1.py's st.cache_resource factories build them."""
+
+    def __init__(self, db_path, workdir, llm_latency, llm_rate):
+        self.pool = ConnectionPool(db_path)
+        init_schema(self.pool)
+        self.archive = Archive(self.pool, os.path.join(workdir, "archive"))
+        self.repo = SpendingRepository(self.pool, Categorizer.load(), self.archive)
+        self.credentials = Credentials()
+        self.index = ConversationIndex(os.path.join(workdir, "conversation_index"), archive=self.archive)
+        self.writer = ConversationWriter(
+            self.pool, on_flush=lambda records: self.index.add_saved(self.pool, records)
+        )
+        self.model = FakeChatModel(latency=llm_latency, ttft=llm_latency / 3, jitter=0.1, seed=1)
+        self.gateway = LLMGateway(self.model, rate=llm_rate, burst=max(int(llm_rate), 1))
+
+    def close(self):
+        self.writer.close()
+        self.gateway.close()
+        self.pool.close()
+
+
+class BenchSession:
+    """One logged-in browser session: the parts of top1.py a chat turn runs."""
+
+    def __init__(self, app, username=BENCH_USER, password=BENCH_PASSWORD, seed=0):
+        self.app = app
+        self.rng = random.Random(seed)
+        self.memory = ChatMemory()
+        self.session_id = uuid.uuid4().hex
+        self.user_id = self.login(username, password)
+
+    def login(self, username, password):
+        user_id = self.app.credentials.authenticate(self.app.repo, username, password)
+        if user_id is None:
+            raise RuntimeError(f"login failed for {username}")
+        return user_id
+
+    def add_expense(self):
+        description, typical = self.rng.choice(EXPENSES)
+        return self.app.repo.add_expense_atomic(self.user_id, description, typical)
+
+    def get_last_10_expenses(self):
+        return self.app.repo.get_last_10_expenses(self.user_id)
+
+    def build_chat_inputs(self, user_input):
+        repo, index = self.app.repo, self.app.index
+        context = build_context(repo, self.user_id, token_budget=CONTEXT_TOKEN_BUDGET)
+        index.sync(repo.pool, self.user_id)
+        history = retrieve_turns(
+            repo.pool, index, self.user_id, user_input,
+            token_budget=HISTORY_TOKEN_BUDGET, exclude=self.memory.ids(),
+        )
+        if history:
+            context += "\n\nRelevant earlier conversation:\n" + "\n".join(history)
+        recent = self.memory.prompt_lines(MEMORY_TOKEN_BUDGET)
+        if recent:
+            context += "\n\nThis conversation:\n" + "\n".join(recent)
+        return {"context": context, "question": user_input}
+
+    def run_local_command(self, parsed):
+        repo, action = self.app.repo, parsed["action"]
+        if action == "add_expense":
+            return repo.add_expense_atomic(self.user_id, parsed["description"], parsed["amount"])
+        if action == "add_income":
+            return repo.add_to_balance(self.user_id, parsed["amount"])
+        if action == "show_balance":
+            return repo.get_total_money(self.user_id)
+        if action == "undo_last":
+            return repo.undo_last_expense(self.user_id)
+        if action == "query_spending":
+            return repo.get_spending_between(
+                self.user_id, int(parsed["start_date"].timestamp()),
+                int(parsed["end_date"].timestamp()), parsed["category"],
+            )
+        return None
+
+    def process_chat_message(self, user_input):
+        parsed = parse_command(user_input)
+        if parsed["action"]:
+            return self.run_local_command(parsed)
+        inputs = self.build_chat_inputs(user_input)
+        started = time.perf_counter()
+        response = self.app.gateway.invoke(inputs)
+        latency_ms = (time.perf_counter() - started) * 1000
+        conversation_id = self.app.writer.submit(
+            self.user_id, self.session_id, user_input, response, inputs["context"],
+            latency_ms=latency_ms,
+        )
+        self.memory.add_turn({"id": conversation_id, "user": user_input, "assistant": response,
+                              "latency_ms": latency_ms})
+        return response
+
+    def operation(self, name):
+        """A callable running one instance of the named path."""
+        if name == "login":
+            return lambda: self.login(BENCH_USER, BENCH_PASSWORD)
+        if name == "add_expense":
+            return self.add_expense
+        if name == "get_last_10_expenses":
+            return self.get_last_10_expenses
+        if name == "context_build":
+            return lambda: self.build_chat_inputs(self.rng.choice(QUESTIONS))
+        if name == "chat_local":
+            return lambda: self.process_chat_message(self.rng.choice(LOCAL_COMMANDS))
+        if name == "chat_llm":
+            return lambda: self.process_chat_message(self.rng.choice(QUESTIONS))
+        raise ValueError(name)
+
+
+# Measurements
+
+PATHS = ["login", "add_expense", "get_last_10_expenses", "context_build", "chat_local", "chat_llm"]
+
+
+def measure_paths(session, iterations, llm_iterations, warmup=3):
+    results = {}
+    for name in PATHS:
+        run = session.operation(name)
+        for _ in range(warmup):
+            run()
+        samples = []
+        for _ in range(llm_iterations if name == "chat_llm" else iterations):
+            started = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = summarize(samples)
+    return results
+
+
+def run_load(app, sessions, duration, seed=0):
+    """Concurrent sessions issuing LOAD_MIX operations for duration seconds."""
+    names = [name for name, _ in LOAD_MIX]
+    weights = [weight for _, weight in LOAD_MIX]
+    samples = {name: [] for name in names}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    ready = threading.Barrier(sessions + 1)
+
+    def worker(index):
+        session = BenchSession(app, seed=seed + index)
+        rng = random.Random(seed + index)
+        local = {name: [] for name in names}
+        ready.wait()
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                session.operation(name)()
+            except Exception as error:
+                with lock:
+                    key = f"{name}: {type(error).__name__}"
+                    errors[key] = errors.get(key, 0) + 1
+                continue
+            local[name].append((time.perf_counter() - started) * 1000)
+        with lock:
+            for name, values in local.items():
+                samples[name].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    app.writer.flush()
+    total = sum(len(values) for values in samples.values())
+    return {
+        "sessions": sessions, "seconds": elapsed, "operations": total,
+        "ops_per_sec": total / elapsed, "errors": errors,
+        "paths": {name: summarize(values, elapsed) for name, values in samples.items()},
+        "llm_calls": app.model.calls, "gateway": dict(app.gateway.stats),
+        "writer": dict(app.writer.stats),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit, "dirty": dirty, "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+        "cpus": os.cpu_count(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(args):
+    report = {"environment": environment(), "args": vars(args), "sizes": []}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path, seed_meta = prepare_database(size, workdir, args.cache_dir, args.seed)
+            app = BenchApp(db_path, workdir, args.llm_latency, args.llm_rate)
+            try:
+                entry = {"size": size, "seed": seed_meta}
+                if args.archive_horizon is not None:
+                    entry["archive"] = app.archive.run(args.archive_horizon, now=seed_meta["anchor_ts"])
+                session = BenchSession(app, seed=args.seed)
+                entry["paths"] = measure_paths(session, args.iterations, args.llm_iterations)
+                if args.sessions:
+                    entry["load"] = run_load(app, args.sessions, args.duration, args.seed)
+            finally:
+                app.close()
+        report["sizes"].append(entry)
+        print_entry(entry)
+    return report
+
+
+# Output
+
+def print_entry(entry):
+    print(f"\n== {entry['size']:,} expenses (seeded in {entry['seed']['seed_seconds']} s"
+          f"{', cached' if entry['seed'].get('cached') else ''})")
+    archived = entry.get("archive")
+    if archived:
+        print(f"-- archived {archived['expenses']:,} expenses and {archived['conversations']:,} "
+              f"conversations in {archived['seconds']:.1f} s")
+    print(f"{'path':<22} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in entry["paths"].items():
+        print(f"{name:<22} {stats['count']:>6} {stats['p50_ms']:>9.3f} "
+              f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+    load = entry.get("load")
+    if load:
+        print(f"-- load: {load['sessions']} sessions, {load['ops_per_sec']:,.0f} ops/s, "
+              f"errors: {load['errors'] or 'none'}")
+        for name, stats in load["paths"].items():
+            if stats["count"]:
+                print(f"{name:<22} {stats['count']:>6} {stats['p50_ms']:>9.3f} "
+                      f"{stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+
+def compare(before_path, after_path, threshold):
+    """Print p50/p95 changes between two result files; returns 1 on a regression."""
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"before: {before['environment']['commit']}  after: {after['environment']['commit']}")
+    ignored = {"out", "compare", "cache_dir", "threshold", "sizes"}
+    differing = sorted(
+        key for key in set(before["args"]) | set(after["args"])
+        if key not in ignored and before["args"].get(key) != after["args"].get(key)
+    )
+    if differing:
+        print(f"warning: runs used different settings ({', '.join(differing)})")
+    print(f"{'size':>10} {'path':<28} {'p50 before':>10} {'p50 after':>10} {'p95 before':>10} "
+          f"{'p95 after':>10} {'change':>8}")
+    regressed = False
+    old_sizes = {entry["size"]: entry for entry in before["sizes"]}
+    for entry in after["sizes"]:
+        old = old_sizes.get(entry["size"])
+        if old is None:
+            continue
+        rows = [(name, stats, old["paths"].get(name)) for name, stats in entry["paths"].items()]
+        if "load" in entry and "load" in old:
+            rows += [(f"load/{name}", stats, old["load"]["paths"].get(name))
+                     for name, stats in entry["load"]["paths"].items()]
+        for name, new_stats, old_stats in rows:
+            if not old_stats or not old_stats.get("count") or not new_stats.get("count"):
+                continue
+            change = new_stats["p50_ms"] / old_stats["p50_ms"] - 1 if old_stats["p50_ms"] else 0.0
+            flag = ""
+            if change > threshold:
+                flag, regressed = " !", True
+            print(f"{entry['size']:>10,} {name:<28} {old_stats['p50_ms']:>10.3f} {new_stats['p50_ms']:>10.3f} "
+                  f"{old_stats['p95_ms']:>10.3f} {new_stats['p95_ms']:>10.3f} {change:>+8.0%}{flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="expenses seeded for the measured user")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per path")
+    parser.add_argument("--llm-iterations", type=int, default=20, help="calls of the LLM chat path")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake model seconds per call")
+    parser.add_argument("--llm-rate", type=float, default=1000.0,
+                        help="gateway requests/s (the app uses llm_gateway.RATE_PER_SECOND)")
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent sessions (0: skip load)")
+    parser.add_argument("--duration", type=float, default=10.0, help="load phase seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", help="keep seeded databases here between runs")
+    parser.add_argument("--archive-horizon", type=int, metavar="DAYS",
+                        help="archive rows older than DAYS before measuring")
+    parser.add_argument("--out", help="write JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="p50 slowdown reported as a regression by --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold)
+    report = run_suite(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
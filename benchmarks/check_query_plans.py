@@ -0,0 +1,71 @@
+"""Assert that the hot per-user queries are index-only range scans.
+
+Seeds a scratch database, runs EXPLAIN QUERY PLAN for every entry in
+db.HOT_QUERIES and fails if a query scans a table, sorts in a temp b-tree or
+doesn't use the expected index. tests/test_query_plans.py runs the same
+checks under pytest.
+
+    python -m benchmarks.check_query_plans
+"""
+import os
+import sys
+import tempfile
+
+from db import HOT_QUERIES, ConnectionPool, SpendingRepository, explain_query_plan, init_schema
+
+
+def query_params(sql, user_id):
+    """Placeholder values for a HOT_QUERIES statement."""
+    if "day >=" in sql:
+        return (user_id, "2024-01-01")
+    if "ts >=" in sql:
+        return (user_id, 0, 2 ** 31)
+    if "LIMIT ?" in sql:
+        return (user_id, 10)
+    return (user_id,)
+
+
+def plan_ok(plan, index):
+    """True if plan only searches, never sorts, and uses index (covering unless the PK)."""
+    return (
+        all(line.startswith("SEARCH") for line in plan)
+        and not any("TEMP B-TREE" in line for line in plan)
+        and any(index in line for line in plan)
+        and (index == "PRIMARY KEY" or all("COVERING INDEX" in line for line in plan))
+    )
+
+
+def seeded_database(path):
+    """A pool on a scratch database with one user and one expense, analyzed."""
+    pool = ConnectionPool(path)
+    init_schema(pool)
+    repo = SpendingRepository(pool)
+    user_id = repo.create_user("bench", "x")
+    repo.add_to_balance(user_id, 1000)
+    repo.add_expense_atomic(user_id, "food", 10)
+    with pool.connection() as conn:
+        conn.execute("ANALYZE")
+    return pool, user_id
+
+
+def check(conn, user_id):
+    failures = []
+    for name, (sql, index) in HOT_QUERIES.items():
+        plan = explain_query_plan(conn, sql, query_params(sql, user_id))
+        ok = plan_ok(plan, index)
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<18} {' | '.join(plan)}")
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        pool, user_id = seeded_database(os.path.join(tmp, "plans.db"))
+        with pool.connection() as conn:
+            failures = check(conn, user_id)
+        pool.close()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
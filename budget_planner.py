@@ -0,0 +1,258 @@
+"""Local city-tier budget planner.
+
+The system prompt used to carry the tier 1 / tier 2 city lists as text, and
+every "make me a budget for Pune" request had Gemini look the city up and
+invent the numbers. The planner answers those requests locally:
+
+- CITY_INDEX maps every known city name and alias (Bombay, Bangalore,
+  Gurgaon, Vizag, ...) to its canonical name and tier; misspellings are
+  matched with difflib, and unknown places fall back to tier 3.
+- TEMPLATES holds, per tier, each budget line's share of monthly income
+  under the 50/30/20 rule, precomputed at import. A plan is the template
+  scaled by the user's stated income (or the tier's typical student
+  budget), rounded to ₹50; the user's balance adds how many months it
+  covers at that spending.
+- parse_budget_request() recognizes the request, city and income, so the
+  chat flow can answer in well under a millisecond (see
+  benchmarks/bench_budget.py). The LLM is at most asked to phrase the
+  finished table.
+"""
+import difflib
+import re
+from functools import lru_cache
+
+TIER1_CITIES = [
+    "Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata",
+    "Hyderabad", "Pune", "Ahmedabad", "Gurugram", "Noida",
+]
+TIER2_CITIES = [
+    "Jaipur", "Lucknow", "Chandigarh", "Indore", "Kochi",
+    "Nagpur", "Coimbatore", "Bhubaneswar", "Vadodara", "Visakhapatnam",
+]
+CITY_ALIASES = {
+    "bombay": "Mumbai", "navi mumbai": "Mumbai", "thane": "Mumbai",
+    "new delhi": "Delhi", "ncr": "Delhi", "delhi ncr": "Delhi",
+    "bangalore": "Bengaluru", "blr": "Bengaluru", "madras": "Chennai",
+    "calcutta": "Kolkata", "hyd": "Hyderabad", "secunderabad": "Hyderabad",
+    "poona": "Pune", "amdavad": "Ahmedabad", "gurgaon": "Gurugram",
+    "greater noida": "Noida", "cochin": "Kochi", "ernakulam": "Kochi",
+    "kovai": "Coimbatore", "baroda": "Vadodara", "vizag": "Visakhapatnam",
+    "vishakhapatnam": "Visakhapatnam",
+}
+FUZZY_CUTOFF = 0.8
+
+# Share of income per part of the 50/30/20 rule, and each line's share of its part
+RULE = {"needs": 0.50, "wants": 0.30, "savings": 0.20}
+LINES = {
+    1: {
+        "needs": [("Rent / PG", 0.50), ("Food & groceries", 0.28), ("Local transport", 0.10),
+                  ("Utilities & phone", 0.07), ("Books & study material", 0.05)],
+        "wants": [("Eating out", 0.35), ("Entertainment & subscriptions", 0.25),
+                  ("Shopping", 0.25), ("Outings & travel", 0.15)],
+    },
+    2: {
+        "needs": [("Rent / PG", 0.42), ("Food & groceries", 0.32), ("Local transport", 0.10),
+                  ("Utilities & phone", 0.08), ("Books & study material", 0.08)],
+        "wants": [("Eating out", 0.30), ("Entertainment & subscriptions", 0.25),
+                  ("Shopping", 0.30), ("Outings & travel", 0.15)],
+    },
+    3: {
+        "needs": [("Rent / PG", 0.35), ("Food & groceries", 0.35), ("Local transport", 0.10),
+                  ("Utilities & phone", 0.10), ("Books & study material", 0.10)],
+        "wants": [("Eating out", 0.25), ("Entertainment & subscriptions", 0.25),
+                  ("Shopping", 0.30), ("Outings & travel", 0.20)],
+    },
+}
+SAVINGS_LINES = [("Emergency fund", 0.50), ("SIP / recurring deposit", 0.30), ("Goals", 0.20)]
+# Typical monthly student budget when the user doesn't state an income
+DEFAULT_MONTHLY_BUDGET = {1: 25000, 2: 18000, 3: 12000}
+DEFAULT_TIER = 2
+ROUND_TO = 50
+
+# Explicit plan requests only: a planning verb ("make me a budget for Pune",
+# "create a monthly budget with stipend of 25000") or a plan noun phrase
+# ("budget planner for Bhopal", "monthly budget for Delhi"). A bare "budget"
+# ("budget?", "budget, how do I stick to it") or anything else that mentions
+# a budget ("I need help sticking to my budget") is a question for the LLM.
+BUDGET_REQUEST_RE = re.compile(
+    r"^(?:(?:can|could|would|will)\s+you\s+|please\s+|pls\s+)?"
+    r"(?:"
+    r"(?:make|create|give|prepare|build|draft|suggest|generate)\s+(?:me\s+|us\s+)?"
+    r"(?:a\s+|my\s+|the\s+)?(?:monthly\s+|student\s+)?"
+    r"(?:budget(?:\s+(?:plan|planner))?|(?:spending|expense)\s+plan)"
+    r"|(?:a\s+|my\s+)?(?:(?:monthly|student)\s+budget(?:\s+(?:plan|planner))?"
+    r"|budget\s+(?:plan|planner)|(?:spending|expense)\s+plan)"
+    r")"
+    r"(?=\s+(?:for|in|with)\b|\s*,|\s*[.!?]?\s*$)"
+)
+# Budgets for something other than monthly living costs
+NON_PLAN_RE = re.compile(
+    r"\b(?:trip|travel|tour|vacation|holiday|wedding|party|event|festival|gift|birthday)\b"
+)
+INCOME_RE = re.compile(
+    r"\b(?:income|earn(?:ing)?s?|salary|stipend|allowance|pocket\s+money|get|make|budget\s+of|with)"
+    r"\s+(?:is\s+|of\s+|about\s+|around\s+)?(?:₹|rs\.?|inr)?\s*"
+    r"(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<unit>k|thousand|lakhs?|lacs?|l)?\b"
+)
+UNITS = {"k": 1000, "thousand": 1000, "lakh": 100000, "lakhs": 100000, "lac": 100000,
+         "lacs": 100000, "l": 100000}
+# The place is a lookahead so "for living in X" can still match at "in X"
+PLACE_RE = re.compile(r"\b(?:for|in|at|from|near)\s+(?=(?P<place>[a-z]+(?: [a-z]+)?))")
+WORD_RE = re.compile(r"[a-z]+")
+# Words after "for"/"in" that aren't places
+NON_PLACE_WORDS = frozenset(
+    "a an the me my this next every each one per month monthly week weekly year college "
+    "student students hostel rent food budget plan planner income salary living staying "
+    "life city with and someone us two three".split()
+)
+
+
+def _build_city_index():
+    index = {}
+    for tier, cities in ((1, TIER1_CITIES), (2, TIER2_CITIES)):
+        for city in cities:
+            index[city.lower()] = (city, tier)
+    for alias, city in CITY_ALIASES.items():
+        index[alias] = index[city.lower()]
+    return index
+
+
+def _build_templates():
+    templates = {}
+    for tier, parts in LINES.items():
+        lines = []
+        for part, items in (*parts.items(), ("savings", SAVINGS_LINES)):
+            lines += [(item, part, RULE[part] * share) for item, share in items]
+        templates[tier] = tuple(lines)
+    return templates
+
+
+CITY_INDEX = _build_city_index()
+TEMPLATES = _build_templates()
+_MAX_CITY_WORDS = max(len(name.split()) for name in CITY_INDEX)
+
+
+def lookup_city(name):
+    """(canonical city, tier, how) for a place name; how is exact, alias or fuzzy.
+
+    Unknown places are tier 3 (how "unknown"); None for an empty name.
+    """
+    key = " ".join(WORD_RE.findall((name or "").lower()))
+    if not key:
+        return None
+    if key in CITY_INDEX:
+        city, tier = CITY_INDEX[key]
+        return city, tier, "exact" if city.lower() == key else "alias"
+    close = difflib.get_close_matches(key, CITY_INDEX, n=1, cutoff=FUZZY_CUTOFF)
+    if close:
+        city, tier = CITY_INDEX[close[0]]
+        return city, tier, "fuzzy"
+    return key.title(), 3, "unknown"
+
+
+def find_city(text):
+    """The city mentioned in text, as lookup_city() returns it, or None."""
+    words = WORD_RE.findall(text.lower())
+    # Known names anywhere in the text, longest first ("navi mumbai" before "mumbai")
+    for size in range(_MAX_CITY_WORDS, 0, -1):
+        for i in range(len(words) - size + 1):
+            key = " ".join(words[i:i + size])
+            if key in CITY_INDEX:
+                return lookup_city(key)
+    # Otherwise the place after "for"/"in"/...: misspelt or not in the lists
+    for match in PLACE_RE.finditer(text.lower()):
+        place = []
+        for word in match.group("place").split():
+            if word in NON_PLACE_WORDS:
+                break
+            place.append(word)
+        if place:
+            return lookup_city(" ".join(place))
+    return None
+
+
+def parse_income(text):
+    match = INCOME_RE.search(text.lower())
+    if not match:
+        return None
+    amount = float(match.group("amount").replace(",", ""))
+    return amount * UNITS.get(match.group("unit") or "", 1)
+
+
+def parse_budget_request(text):
+    """{"city": lookup_city() result or None, "income": amount or None}, or None."""
+    lowered = text.lower().strip()
+    if "budget" not in lowered and "plan" not in lowered:
+        return None
+    if not BUDGET_REQUEST_RE.match(lowered) or NON_PLAN_RE.search(lowered):
+        return None
+    return {"city": find_city(text), "income": parse_income(text)}
+
+
+@lru_cache(maxsize=1024)
+def _scaled_lines(tier, budget):
+    """Template lines for tier scaled to budget, rounded, summing to budget."""
+    amounts = [round(budget * share / ROUND_TO) * ROUND_TO for _, _, share in TEMPLATES[tier]]
+    # Put the rounding remainder on the largest line
+    largest = max(range(len(amounts)), key=amounts.__getitem__)
+    amounts[largest] += round(budget) - sum(amounts)
+    return tuple((item, part, amount) for (item, part, _), amount in zip(TEMPLATES[tier], amounts))
+
+
+def plan_budget(city=None, income=None, balance=None):
+    """Monthly plan for city (a lookup_city() result) at income, or the tier default.
+
+    Returns {city, tier, how, income, budget, lines [(item, part, amount)],
+    parts {part: amount}, runway_months}.
+    """
+    name, tier, how = city if city else (None, DEFAULT_TIER, None)
+    budget = float(income) if income else float(DEFAULT_MONTHLY_BUDGET[tier])
+    lines = _scaled_lines(tier, round(budget))
+    parts = {part: 0.0 for part in RULE}
+    for _, part, amount in lines:
+        parts[part] += amount
+    spending = parts["needs"] + parts["wants"]
+    runway = balance / spending if balance and balance > 0 and spending else None
+    return {
+        "city": name, "tier": tier, "how": how, "income": income, "budget": budget,
+        "lines": lines, "parts": parts, "runway_months": runway,
+    }
+
+
+def format_plan(plan):
+    """Markdown answer for a plan."""
+    where = f"{plan['city']} (Tier {plan['tier']} city)" if plan["city"] else f"a Tier {plan['tier']} city"
+    out = [f"### 📋 Monthly budget for {where}"]
+    if plan["how"] == "fuzzy":
+        out.append(f"_Matched your city to {plan['city']}._")
+    elif plan["how"] == "unknown":
+        out.append(f"_{plan['city']} isn't in our Tier 1/2 lists, so this uses Tier 3 costs._")
+    if plan["income"]:
+        out.append(f"Based on your monthly income of ₹{plan['budget']:,.0f}, using the 50/30/20 rule.")
+    else:
+        out.append(
+            f"Based on a typical student budget of ₹{plan['budget']:,.0f}/month here, using the "
+            f"50/30/20 rule. Tell me your monthly income for a plan scaled to it."
+        )
+    out += ["", "| Category | Part | Amount (₹) |", "|---|---|---:|"]
+    out += [f"| {item} | {part.capitalize()} | {amount:,.0f} |" for item, part, amount in plan["lines"]]
+    for part, share in RULE.items():
+        out.append(f"| **{part.capitalize()} total** | {share:.0%} | **{plan['parts'][part]:,.0f}** |")
+    if plan["runway_months"] is not None:
+        out.append("")
+        out.append(
+            f"Your current balance covers about {plan['runway_months']:.1f} months of needs and "
+            f"wants at this plan."
+        )
+    if not plan["city"]:
+        out.append("")
+        out.append("If you need a planner according to your location, please specify the city.")
+    return "\n".join(out)
+
+
+def answer_budget_request(text, balance=None):
+    """Formatted plan for a budget request, or None if text isn't one."""
+    request = parse_budget_request(text)
+    if request is None:
+        return None
+    return format_plan(plan_budget(request["city"], request["income"], balance))
@@ -0,0 +1,367 @@
+"""Local expense categorization and the 50/30/20 breakdown.
+
+Every expense gets a category when it is inserted (see
+SpendingRepository.add_expense) so the Analysis and Savings prompts can be
+given precomputed category totals instead of asking Gemini to re-derive
+categories from raw descriptions on every request.
+
+Categorization is tried in order:
+
+1. a keyword trie over description words (multi-word phrases such as
+   "electricity bill" and plurals included),
+2. an optional multinomial Naive Bayes model trained offline from already
+   categorized rows (python categorizer.py --train), used when it is
+   confident enough,
+3. "other".
+
+Each category belongs to one of the buckets the system prompt uses
+(Essential, Educational, Discretionary, Savings), which map onto the
+50/30/20 rule as needs (Essential + Educational), wants and savings.
+
+Usage:
+    python categorizer.py --backfill [--db spending_tracker.db]
+    python categorizer.py --train [--model categorizer_model.json]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+OTHER = "other"
+DEFAULT_MODEL_FILE = "categorizer_model.json"
+MIN_CONFIDENCE = 0.6
+BACKFILL_BATCH_SIZE = 5000
+
+ESSENTIAL = "Essential"
+EDUCATIONAL = "Educational"
+DISCRETIONARY = "Discretionary"
+SAVINGS = "Savings"
+
+# 50/30/20 rule: which share of money each bucket counts towards
+RULE_TARGETS = {"needs": 0.5, "wants": 0.3, "savings": 0.2}
+BUCKET_RULE = {ESSENTIAL: "needs", EDUCATIONAL: "needs", DISCRETIONARY: "wants", SAVINGS: "savings"}
+
+CATEGORY_BUCKETS = {
+    "rent": ESSENTIAL,
+    "utilities": ESSENTIAL,
+    "groceries": ESSENTIAL,
+    "transport": ESSENTIAL,
+    "health": ESSENTIAL,
+    "phone & internet": ESSENTIAL,
+    "tuition": EDUCATIONAL,
+    "books & supplies": EDUCATIONAL,
+    "dining": DISCRETIONARY,
+    "entertainment": DISCRETIONARY,
+    "shopping": DISCRETIONARY,
+    "travel": DISCRETIONARY,
+    "subscriptions": DISCRETIONARY,
+    "personal care": DISCRETIONARY,
+    "gifts": DISCRETIONARY,
+    "savings & investments": SAVINGS,
+    OTHER: DISCRETIONARY,
+}
+
+KEYWORDS = {
+    "rent": ["rent", "hostel", "pg", "room rent", "house rent", "accommodation", "deposit", "maintenance"],
+    "utilities": ["electricity", "electricity bill", "water bill", "gas", "gas cylinder", "lpg",
+                  "bescom", "msedcl", "tata power", "laundry", "dhobi"],
+    "groceries": ["grocery", "groceries", "vegetables", "veggies", "fruits", "milk", "bread", "eggs",
+                  "rice", "atta", "dal", "kirana", "supermarket", "bigbasket", "blinkit", "zepto",
+                  "dmart", "instamart", "provisions"],
+    "transport": ["bus", "metro", "auto", "rickshaw", "cab", "taxi", "uber", "ola", "rapido",
+                  "petrol", "diesel", "fuel", "parking", "toll", "bus pass", "local train"],
+    "health": ["medicine", "medicines", "pharmacy", "doctor", "hospital", "clinic", "medical",
+               "chemist", "apollo", "pharmeasy", "1mg", "dentist", "gym", "insurance"],
+    "phone & internet": ["recharge", "mobile recharge", "phone bill", "internet", "wifi", "broadband",
+                         "jio", "airtel", "vi", "bsnl", "data pack"],
+    "tuition": ["tuition", "fees", "fee", "college fees", "exam fee", "semester", "coaching",
+                "course", "udemy", "coursera", "admission", "hostel fees", "library fine"],
+    "books & supplies": ["book", "books", "textbook", "notebook", "stationery", "pen", "pens",
+                         "xerox", "photocopy", "printout", "print", "calculator", "lab coat",
+                         "supplies", "assignment"],
+    "dining": ["food", "lunch", "dinner", "breakfast", "snacks", "coffee", "tea", "chai", "cafe",
+               "restaurant", "canteen", "mess", "pizza", "burger", "biryani", "swiggy", "zomato",
+               "dominos", "mcdonalds", "kfc", "starbucks", "juice", "ice cream", "dosa", "momos",
+               "eating out", "treat"],
+    "entertainment": ["movie", "movies", "cinema", "pvr", "inox", "bookmyshow", "concert", "game",
+                      "games", "gaming", "party", "club", "bowling", "outing", "fest"],
+    "shopping": ["shopping", "clothes", "cloth", "cloths", "shirt", "tshirt", "jeans", "shoes", "dress", "amazon",
+                 "flipkart", "myntra", "ajio", "meesho", "watch", "bag", "headphones", "earphones",
+                 "gadget", "electronics", "accessories"],
+    "travel": ["trip", "travel", "flight", "train", "train ticket", "irctc", "hotel", "holiday",
+               "vacation", "makemytrip", "goibibo", "redbus", "tour"],
+    "subscriptions": ["netflix", "spotify", "prime", "hotstar", "subscription", "youtube premium",
+                      "icloud", "google one", "membership"],
+    "personal care": ["salon", "spa", "massage", "haircut", "hair cut", "cutting", "barber", "cosmetics", "skincare", "grooming", "parlour",
+                      "toiletries", "shampoo", "soap"],
+    "gifts": ["gift", "gifts", "birthday", "donation", "charity", "present"],
+    "savings & investments": ["savings", "sip", "mutual fund", "fd", "fixed deposit", "rd",
+                              "recurring deposit", "stocks", "shares", "zerodha", "groww", "ppf",
+                              "investment", "gold"],
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9&]+")
+
+SQL_GET_UNCATEGORIZED = """
+    SELECT id, description FROM expenses WHERE category IS NULL LIMIT ?
+"""
+SQL_GET_USER_UNCATEGORIZED = """
+    SELECT id, description FROM expenses
+    WHERE category IS NULL AND user_id = ? LIMIT ?
+"""
+SQL_SET_CATEGORY = "UPDATE expenses SET category = ? WHERE id = ?"
+SQL_GET_TRAINING_ROWS = """
+    SELECT description, category FROM expenses
+    WHERE category IS NOT NULL AND category != ? AND description IS NOT NULL
+"""
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def _singular(token):
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+class KeywordTrie:
+    """Word-level trie mapping keyword phrases to categories.
+
+    match() scans a token list and returns the category of the longest
+    phrase found; ties go to the earliest match.
+    """
+
+    def __init__(self, keywords=None):
+        self.root = {}
+        for category, phrases in (keywords or {}).items():
+            for phrase in phrases:
+                self.insert(phrase, category)
+
+    def insert(self, phrase, category):
+        node = self.root
+        for token in tokenize(phrase):
+            node = node.setdefault(_singular(token), {})
+        node[None] = category
+
+    def match(self, tokens):
+        tokens = [_singular(token) for token in tokens]
+        best, best_length = None, 0
+        for start in range(len(tokens)):
+            node = self.root
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if None in node and end - start + 1 > best_length:
+                    best, best_length = node[None], end - start + 1
+        return best
+
+
+class NaiveBayesClassifier:
+    """Multinomial Naive Bayes over description tokens, pure Python.
+
+    Small enough to train on every categorized expense in seconds and to
+    store as JSON next to the database.
+    """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.class_counts = Counter()
+        self.token_counts = defaultdict(Counter)
+        self.vocabulary = set()
+
+    def fit(self, descriptions, labels):
+        for description, label in zip(descriptions, labels):
+            self.class_counts[label] += 1
+            tokens = [_singular(token) for token in tokenize(description)]
+            self.token_counts[label].update(tokens)
+            self.vocabulary.update(tokens)
+        self._totals = {label: sum(counts.values()) for label, counts in self.token_counts.items()}
+        return self
+
+    def predict(self, description):
+        """Return (label, probability), or (None, 0.0) if nothing is known."""
+        tokens = [_singular(token) for token in tokenize(description)]
+        tokens = [token for token in tokens if token in self.vocabulary]
+        if not tokens or not self.class_counts:
+            return None, 0.0
+        documents = sum(self.class_counts.values())
+        vocabulary = len(self.vocabulary)
+        scores = {}
+        for label, count in self.class_counts.items():
+            counts = self.token_counts[label]
+            denominator = self._totals[label] + self.alpha * vocabulary
+            scores[label] = math.log(count / documents) + sum(
+                math.log((counts[token] + self.alpha) / denominator) for token in tokens
+            )
+        best = max(scores, key=scores.get)
+        # Softmax over log scores for a confidence value
+        peak = scores[best]
+        total = sum(math.exp(score - peak) for score in scores.values())
+        return best, 1.0 / total
+
+    def to_dict(self):
+        return {
+            "alpha": self.alpha,
+            "class_counts": dict(self.class_counts),
+            "token_counts": {label: dict(counts) for label, counts in self.token_counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["alpha"])
+        model.class_counts = Counter(data["class_counts"])
+        for label, counts in data["token_counts"].items():
+            model.token_counts[label] = Counter(counts)
+            model.vocabulary.update(counts)
+        model._totals = {label: sum(counts.values()) for label, counts in model.token_counts.items()}
+        return model
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+class Categorizer:
+    """Keyword trie first, then the optional classifier, then "other"."""
+
+    def __init__(self, keywords=KEYWORDS, classifier=None, min_confidence=MIN_CONFIDENCE,
+                 cache_size=8192):
+        self.trie = KeywordTrie(keywords)
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self._cache = {}
+
+    @classmethod
+    def load(cls, model_file=DEFAULT_MODEL_FILE, **kwargs):
+        """Categorizer using the trained model in model_file if it exists."""
+        classifier = NaiveBayesClassifier.load(model_file) if os.path.exists(model_file) else None
+        return cls(classifier=classifier, **kwargs)
+
+    def categorize(self, description):
+        key = (description or "").strip().lower()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        category = self.trie.match(tokenize(key))
+        if category is None and self.classifier is not None:
+            label, confidence = self.classifier.predict(key)
+            if confidence >= self.min_confidence:
+                category = label
+        category = category or OTHER
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = category
+        return category
+
+    def bucket(self, category):
+        """Essential/Educational/Discretionary/Savings for a category.
+
+        Anything that isn't a known category (e.g. an aggregate keyed by a
+        raw description before backfill) is categorized first.
+        """
+        if category not in CATEGORY_BUCKETS:
+            category = self.categorize(category)
+        return CATEGORY_BUCKETS.get(category, DISCRETIONARY)
+
+
+def backfill(pool, categorizer, user_id=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Categorize expenses that have no category yet, one batch per transaction.
+
+    Returns the number of rows updated. The aggregate triggers move each
+    row's amount from its description key to its category in
+    spend_category.
+    """
+    updated = 0
+    while True:
+        with pool.transaction() as conn:
+            if user_id is None:
+                rows = conn.execute(SQL_GET_UNCATEGORIZED, (batch_size,)).fetchall()
+            else:
+                rows = conn.execute(SQL_GET_USER_UNCATEGORIZED, (user_id, batch_size)).fetchall()
+            if not rows:
+                return updated
+            conn.executemany(
+                SQL_SET_CATEGORY,
+                [(categorizer.categorize(description), expense_id) for expense_id, description in rows],
+            )
+        updated += len(rows)
+
+
+def train(pool, alpha=1.0):
+    """Fit a classifier on every expense with a category other than "other"."""
+    with pool.connection() as conn:
+        rows = conn.execute(SQL_GET_TRAINING_ROWS, (OTHER,)).fetchall()
+    descriptions = [description for description, _ in rows]
+    labels = [category for _, category in rows]
+    return NaiveBayesClassifier(alpha).fit(descriptions, labels)
+
+
+def budget_breakdown(category_totals, balance, categorizer):
+    """Deterministic 50/30/20 breakdown.
+
+    category_totals is [(category, total)] (e.g. from
+    SpendingRepository.get_category_totals) and balance the money left.
+    Total money is what was spent plus the balance; unspent balance counts
+    as savings. Returns {"buckets": {bucket: total}, "rule": {needs|wants|
+    savings: {"amount", "share", "target"}}, "total": total money}.
+    """
+    buckets = {ESSENTIAL: 0.0, EDUCATIONAL: 0.0, DISCRETIONARY: 0.0, SAVINGS: 0.0}
+    for category, total in category_totals:
+        buckets[categorizer.bucket(category)] += total
+    rule_amounts = {"needs": 0.0, "wants": 0.0, "savings": max(balance, 0.0)}
+    for bucket, total in buckets.items():
+        rule_amounts[BUCKET_RULE[bucket]] += total
+    money = sum(rule_amounts.values())
+    rule = {
+        name: {
+            "amount": amount,
+            "share": amount / money if money else 0.0,
+            "target": RULE_TARGETS[name],
+        }
+        for name, amount in rule_amounts.items()
+    }
+    return {"buckets": buckets, "rule": rule, "total": money}
+
+
+def main(argv=None):
+    from db import ConnectionPool, init_schema
+
+    parser = argparse.ArgumentParser(description="Categorize SmartSpend AI expenses.")
+    parser.add_argument("--db", default="spending_tracker.db", help="SQLite database file")
+    parser.add_argument("--model", default=DEFAULT_MODEL_FILE, help="Classifier model file")
+    parser.add_argument("--train", action="store_true", help="Train the classifier on categorized rows")
+    parser.add_argument("--backfill", action="store_true", help="Categorize rows without a category")
+    args = parser.parse_args(argv)
+    if not (args.train or args.backfill):
+        parser.error("nothing to do: pass --train and/or --backfill")
+
+    pool = ConnectionPool(args.db)
+    init_schema(pool)
+    try:
+        if args.backfill:
+            updated = backfill(pool, Categorizer.load(args.model))
+            print(f"categorized {updated} expenses")
+        if args.train:
+            model = train(pool)
+            model.save(args.model)
+            print(f"trained on {sum(model.class_counts.values())} expenses, "
+                  f"{len(model.vocabulary)} words -> {args.model}")
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Prompt templates and the Gemini chat chain for SmartSpend AI.
+
+Building ChatGoogleGenerativeAI and the templates is comparatively slow, so
+the app constructs the chain once per process (see get_chat_chain in
+top1.py) instead of on every Streamlit rerun. The chain takes structured
+{"context", "question"} input and renders the prompt exactly once.
+"""
+import hashlib
+
+from langchain.prompts import (
+    PromptTemplate,
+    SystemMessagePromptTemplate,
+    HumanMessagePromptTemplate,
+    ChatPromptTemplate,
+)
+from langchain_core.output_parsers import StrOutputParser
+
+MODEL_NAME = "gemini-1.5-flash"
+TEMPERATURE = 0.6
+
+# System message; the question itself is sent as the human message
+SYSTEM_MESSAGE = """You are SmartSpend AI, a friendly and helpful chatbot designed to assist users with a variety of queries, 
+    while specializing in financial analysis for students. You are conversational, approachable, 
+    and can respond to both general and finance-related topics.
+
+    When engaging with users, keep the following in mind:
+    
+    Do not provide any information other than financial analysis and general finance realted questions of students.
+    
+    You can also do general chatting related to finance
+    
+    If you are asked any questions other than your field just say - "I don't Know" politely.
+    
+    Do not give any placeholders for links and other thing
+    
+    Do not give a budget in the chat answer until it is not asked specifically. 
+
+    1. **General Queries:**
+       - Respond warmly to greetings like "Hey" or "Hello"
+       - Provide thoughtful, positive, and conversational responses
+       - If unsure about intent, politely ask for clarification
+
+    2. **Financial Analysis:**
+       - Spending in the context is already categorized and tagged as Essential,
+         Educational, Discretionary or Savings, with a computed 50/30/20 breakdown.
+         Use those figures as given; do not re-categorize individual expenses
+       - Provide actionable insights and budgeting advice
+       - Use the 50/30/20 Rule framework
+
+    3. **Response Format:**
+       - Use friendly, conversational tone
+       - Structure with markdown headings
+       - Include bullet points for clarity
+       - Add tables for data analysis when relevant
+
+    4. **Conversation Flow:**
+       - Maintain context from previous messages
+       - Reference past information when relevant
+       - Ask follow-up questions when needed
+       **context**:{context}
+       
+       Budget plans are computed by the app from the user's city tier and income.
+       If a budget plan is given in the context, use its numbers as given.
+
+       Provide the proper fromatted and user friendly answers
+       """
+
+
+# Cached responses are only valid for the prompt that produced them
+PROMPT_VERSION = hashlib.sha256(SYSTEM_MESSAGE.encode()).hexdigest()[:12]
+
+
+def build_prompt_template():
+    system_prompt = SystemMessagePromptTemplate(
+        prompt=PromptTemplate(
+            input_variables=["context"],
+            template=SYSTEM_MESSAGE,
+        )
+    )
+
+    human_prompt = HumanMessagePromptTemplate(
+        prompt=PromptTemplate(
+            input_variables=["question"],
+            template="{question}",
+        )
+    )
+
+    messages = [system_prompt, human_prompt]
+
+    prompt_template = ChatPromptTemplate(
+        input_variables=["context", "question"],
+        messages=messages,
+    )
+    return prompt_template
+
+
+def build_chat_chain(api_key, chat_model=None):
+    """Return prompt | model | parser, invoked with {"context", "question"}.
+
+    Pass chat_model to use a different (e.g. fake, offline) model.
+    """
+    if chat_model is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        chat_model = ChatGoogleGenerativeAI(
+            api_key=api_key, model=MODEL_NAME, temperature=TEMPERATURE
+        )
+    return build_prompt_template() | chat_model | StrOutputParser()
@@ -0,0 +1,117 @@
+"""Bounded chat memory for a Streamlit session.
+
+The session used to keep every message in st.session_state and re-render
+all of them on every rerun. ChatMemory keeps only the last `window` turns
+verbatim; older turns are folded into a running summary (one short line
+per turn, oldest lines dropped once the summary exceeds its token budget).
+Everything is still in the conversations table, from which older turns
+are paged back in on demand (see SpendingRepository.get_conversation_page),
+so render cost depends on the window and the pages the user asked for,
+not on the length of the chat.
+
+The summary and window are also what the chain gets as conversation
+history (prompt_lines), which it never received before.
+"""
+import re
+from collections import deque
+
+from context_builder import estimate_tokens
+
+WINDOW_TURNS = 10
+SUMMARY_TOKEN_BUDGET = 200
+MEMORY_TOKEN_BUDGET = 400
+QUESTION_CHARS = 100
+ANSWER_CHARS = 140
+# Long markdown answers are clipped in the prompt so one can't use up the budget
+RECENT_ANSWER_CHARS = 600
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_MARKDOWN = re.compile(r"[#*_`>|]+")
+
+
+def _clip(text, limit):
+    text = " ".join(_MARKDOWN.sub(" ", text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def summarize_turn(user_message, bot_response):
+    """One summary line: the question and the first sentence of the answer."""
+    first_sentence = _SENTENCE_END.split(" ".join((bot_response or "").split()), 1)[0]
+    return f"- Asked: {_clip(user_message, QUESTION_CHARS)} → {_clip(first_sentence, ANSWER_CHARS)}"
+
+
+class ChatMemory:
+    """Last `window` turns verbatim plus a bounded summary of older ones.
+
+    A turn is a dict with "user" and "assistant" text and optionally "id"
+    (the conversations row), "ttft_ms" and "latency_ms".
+    """
+
+    def __init__(self, window=WINDOW_TURNS, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 count_tokens=estimate_tokens, summarize=summarize_turn):
+        self.turns = deque(maxlen=window)
+        self.summary_lines = deque()
+        self.summary_budget = summary_budget
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.summarized = 0
+        self.dropped = 0
+        self._summary_tokens = 0
+
+    def add_turn(self, turn):
+        """Append turn; returns the turn it pushed out of the window, or None."""
+        oldest = None
+        if len(self.turns) == self.turns.maxlen:
+            oldest = self.turns[0]
+            self._add_summary(self.summarize(oldest["user"], oldest["assistant"]))
+        self.turns.append(turn)
+        return oldest
+
+    def _add_summary(self, line):
+        self.summary_lines.append(line)
+        self.summarized += 1
+        self._summary_tokens += self.count_tokens(line) + 1
+        while self._summary_tokens > self.summary_budget and len(self.summary_lines) > 1:
+            dropped = self.summary_lines.popleft()
+            self._summary_tokens -= self.count_tokens(dropped) + 1
+            self.dropped += 1
+
+    def ids(self):
+        return [turn["id"] for turn in self.turns if turn.get("id") is not None]
+
+    def oldest(self):
+        return self.turns[0] if self.turns else None
+
+    def clear(self):
+        self.turns.clear()
+        self.summary_lines.clear()
+        self.summarized = self.dropped = self._summary_tokens = 0
+
+    def prompt_lines(self, token_budget=MEMORY_TOKEN_BUDGET):
+        """Summary then recent turns within token_budget.
+
+        Up to half the budget is kept for the summary; recent turns fill the
+        rest, newest first.
+        """
+        lines = []
+        # Header lines and the "omitted" note cost a few tokens on top
+        reserve = min(self._summary_tokens + 8, token_budget // 2) if self.summary_lines else 0
+        used = reserve
+        recent = []
+        for turn in reversed(self.turns):
+            pair = [f"User: {turn['user']}",
+                    f"Assistant: {_clip(turn['assistant'], RECENT_ANSWER_CHARS)}"]
+            cost = sum(self.count_tokens(line) + 1 for line in pair)
+            if used + cost > token_budget:
+                break
+            recent[:0] = pair
+            used += cost
+        if self.summary_lines and used - reserve + self._summary_tokens + 8 <= token_budget:
+            lines.append("Summary of earlier turns:")
+            if self.dropped:
+                lines.append(f"({self.dropped} older turns omitted)")
+            lines.extend(self.summary_lines)
+        if recent:
+            lines.append("Recent turns:")
+            lines.extend(recent)
+        return lines
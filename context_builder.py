@@ -0,0 +1,155 @@
+"""Bounded spending context for the chat prompt.
+
+The prompt used to list every expense ever recorded, so its size (and Gemini
+latency and cost) grew with history. The context is now assembled from the
+materialized aggregates in sections of decreasing priority and cut off once
+a token budget is reached, so it stays the same size whether the user has
+ten expenses or a million.
+"""
+from datetime import datetime, timedelta
+
+from categorizer import budget_breakdown
+from db import format_ts
+
+DEFAULT_TOKEN_BUDGET = 600
+RECENT_ROWS = 10
+TOP_CATEGORIES = 8
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text).
+
+    Any callable taking a string and returning an int can be passed to
+    build_context instead, e.g. a real tokenizer's length function.
+    """
+    return (len(text) + 3) // 4
+
+
+def _money(amount):
+    return f"₹{amount:,.2f}"
+
+
+def _change(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def summary_section(repo, user_id):
+    total_spent, count = repo.get_spending_totals(user_id)
+    balance = repo.get_total_money(user_id)
+    return "Summary", [
+        f"Initial money: {_money(balance + total_spent)}",
+        f"Total spent: {_money(total_spent)} across {count} expenses",
+        f"Current balance: {_money(balance)}",
+    ]
+
+
+def budget_section(repo, user_id):
+    """Deterministic 50/30/20 split from the category totals (needs a categorizer)."""
+    if repo.categorizer is None:
+        return "50/30/20 breakdown", []
+    # limit -1: every category, the rule needs all of them
+    breakdown = budget_breakdown(
+        repo.get_category_totals(user_id, -1), repo.get_total_money(user_id), repo.categorizer
+    )
+    if not breakdown["total"]:
+        return "50/30/20 breakdown", []
+    labels = {
+        "needs": "Needs (Essential + Educational)",
+        "wants": "Wants (Discretionary)",
+        "savings": "Savings (incl. unspent balance)",
+    }
+    return "50/30/20 breakdown", [
+        f"- {labels[name]}: {_money(part['amount'])} "
+        f"({part['share']:.0%} of money, target {part['target']:.0%})"
+        for name, part in breakdown["rule"].items()
+    ]
+
+
+def trends_section(repo, user_id, today=None):
+    today = today or datetime.now()
+    start = (today - timedelta(days=13)).strftime("%Y-%m-%d")
+    cutoff = (today - timedelta(days=6)).strftime("%Y-%m-%d")
+    last_week = previous_week = 0.0
+    for day, total in repo.get_daily_totals(user_id, start):
+        if day >= cutoff:
+            last_week += total
+        else:
+            previous_week += total
+
+    lines = [
+        f"Last 7 days: {_money(last_week)} "
+        f"(previous 7 days: {_money(previous_week)}, change {_change(last_week, previous_week)})"
+    ]
+    months = repo.get_monthly_totals(user_id, 2)
+    if months:
+        month, total = months[0]
+        line = f"{month}: {_money(total)}"
+        if len(months) > 1:
+            prev_month, prev_total = months[1]
+            line += f" (vs {prev_month}: {_money(prev_total)}, change {_change(total, prev_total)})"
+        lines.append(line)
+    return "Trends", lines
+
+
+def categories_section(repo, user_id, limit=TOP_CATEGORIES):
+    totals = repo.get_category_totals(user_id, limit)
+    if repo.categorizer is None:
+        return "Top categories", [f"- {category}: {_money(total)}" for category, total in totals]
+    return "Top categories", [
+        f"- {category} ({repo.categorizer.bucket(category)}): {_money(total)}"
+        for category, total in totals
+    ]
+
+
+def recent_section(repo, user_id, limit=RECENT_ROWS):
+    return "Recent expenses", [
+        f"- {format_ts(ts)[:10]} {desc}: {_money(amt)}"
+        for desc, amt, ts in repo.get_last_10_expenses(user_id)[:limit]
+    ]
+
+
+def build_context(
+    repo,
+    user_id,
+    token_budget=DEFAULT_TOKEN_BUDGET,
+    count_tokens=estimate_tokens,
+    recent_rows=RECENT_ROWS,
+    top_categories=TOP_CATEGORIES,
+    today=None,
+):
+    """Render user_id's spending context for the prompt within token_budget.
+
+    Sections are added in priority order (summary, 50/30/20 breakdown,
+    trends, top categories, recent expenses); once the budget is used up the remaining lines are
+    dropped. Every section reads from aggregates or an indexed LIMIT query,
+    so the cost doesn't depend on the number of stored expenses.
+    """
+    sections = [
+        summary_section(repo, user_id),
+        budget_section(repo, user_id),
+        trends_section(repo, user_id, today),
+        categories_section(repo, user_id, top_categories),
+        recent_section(repo, user_id, recent_rows),
+    ]
+
+    parts = []
+    used = 0
+    for title, lines in sections:
+        if not lines:
+            continue
+        # +1 per line for the newline joining it to the rest
+        header = f"{title}:"
+        if used + count_tokens(header) + count_tokens(lines[0]) + 2 > token_budget:
+            break
+        parts.append(header)
+        used += count_tokens(header) + 1
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if used + cost > token_budget:
+                return "\n".join(parts)
+            parts.append(line)
+            used += cost
+        parts.append("")
+    return "\n".join(parts).strip()
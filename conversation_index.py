@@ -0,0 +1,339 @@
+"""Semantic retrieval over past conversation turns.
+
+Every saved turn (user message + bot response) is embedded on the CPU and
+appended to a per-user flat index on disk: a float32 matrix file read back
+through np.memmap, plus a parallel file of conversation ids. Search is one
+matrix-vector product over the memory-mapped rows followed by a top-k
+argpartition, which stays in the low milliseconds for the tens of thousands
+of turns a user realistically accumulates, without an ANN library.
+
+At prompt time only the top-k turns relevant to the question are added to
+the context, cut to a token budget, so "maintain context from previous
+messages" no longer depends on the in-memory session history the chain
+never sees.
+
+The default HashingEmbedder needs nothing beyond NumPy (feature hashing of
+word unigrams and bigrams). SentenceTransformerEmbedder uses a local
+sentence-transformers model if that package is installed. Changing the
+embedder (or its dimension) rebuilds the index from the conversations
+table on the next sync().
+
+Given an archive (see archive.Archive), sync() and retrieve_turns() also
+read turns that have been moved out of the conversations table.
+"""
+import json
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from context_builder import estimate_tokens
+
+DEFAULT_DIM = 512
+DEFAULT_TOP_K = 3
+MIN_SCORE = 0.15
+HISTORY_TOKEN_BUDGET = 300
+# A truncated answer shorter than this is left out altogether
+MIN_ANSWER_TOKENS = 8
+# Only the start of long bot responses is embedded
+EMBED_RESPONSE_CHARS = 500
+SYNC_BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r"[a-z0-9₹]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can could do does for from have how i if in is it me my "
+    "of on or should so that the this to was what when which will with would you your".split()
+)
+# Bigrams and the bot's response count for less than the user's own words
+BIGRAM_WEIGHT = 0.5
+RESPONSE_WEIGHT = 0.5
+
+SQL_GET_CONVERSATIONS_AFTER = """
+    SELECT id, user_message, bot_response FROM conversations
+    WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?
+"""
+SQL_GET_TURNS = "SELECT id, ts, user_message, bot_response FROM conversations WHERE id IN ({})"
+
+
+class HashingEmbedder:
+    """Feature-hashed bag of unigrams and bigrams, L2-normalized.
+
+    Deterministic, dependency-free and fast; good enough to match turns
+    that share vocabulary ("rent", "hostel fees", "save on food"). Text
+    after the first newline (the bot response, see turn_text) is weighted
+    down by RESPONSE_WEIGHT.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        tokens = [
+            token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+            for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS
+        ]
+        features = [(token, 1.0) for token in tokens]
+        features += [(f"{a} {b}", BIGRAM_WEIGHT) for a, b in zip(tokens, tokens[1:])]
+        return features
+
+    def _hash(self, features):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in features:
+            digest = zlib.crc32(feature.encode())
+            vector[digest % self.dim] += weight if digest & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            # Message and response are normalized separately so a long
+            # response can't drown out the question
+            message, _, response = text.partition("\n")
+            vectors[row] = self._hash(self._features(message))
+            if response:
+                vectors[row] += RESPONSE_WEIGHT * self._hash(self._features(response))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model (optional dependency, CPU)."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts):
+        return self.model.encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def turn_text(user_message, bot_response):
+    return f"{user_message or ''}\n{(bot_response or '')[:EMBED_RESPONSE_CHARS]}"
+
+
+class ConversationIndex:
+    """Per-user append-only flat vector index stored under directory."""
+
+    def __init__(self, directory, embedder=None, archive=None):
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder()
+        self.archive = archive
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced = set()
+        os.makedirs(directory, exist_ok=True)
+        self._check_meta()
+
+    # Files
+
+    def _path(self, user_id, suffix):
+        return os.path.join(self.directory, f"user_{user_id}.{suffix}")
+
+    def _check_meta(self):
+        """Drop the stored vectors if they came from a different embedder."""
+        meta_path = os.path.join(self.directory, "meta.json")
+        meta = {"embedder": self.embedder.name, "dim": self.embedder.dim}
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f) == meta:
+                    return
+            for name in os.listdir(self.directory):
+                if name.startswith("user_"):
+                    os.remove(os.path.join(self.directory, name))
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _ids(self, user_id):
+        path = self._path(user_id, "ids")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.int64)
+        return np.fromfile(path, dtype=np.int64)
+
+    def _vectors(self, user_id, rows):
+        if not rows:
+            return np.empty((0, self.embedder.dim), dtype=np.float32)
+        return np.memmap(self._path(user_id, "f32"), dtype=np.float32, mode="r",
+                         shape=(rows, self.embedder.dim))
+
+    def _repair(self, user_id):
+        """Cut user_id's ids and vector files back to the rows both hold in full.
+
+        Row i of the vector file belongs to ids[i], so a crash between (or
+        during) the two appends in add_many would otherwise shift the
+        pairing for every turn added after it.
+        """
+        row_bytes = self.embedder.dim * np.dtype(np.float32).itemsize
+        paths = {self._path(user_id, "ids"): 8, self._path(user_id, "f32"): row_bytes}
+        sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in paths}
+        rows = min(sizes[path] // width for path, width in paths.items())
+        for path, width in paths.items():
+            if sizes[path] > rows * width:
+                os.truncate(path, rows * width)
+
+    def __len__(self):
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name)) // 8
+            for name in os.listdir(self.directory) if name.endswith(".ids")
+        )
+
+    # Updates
+
+    def add_many(self, user_id, turns):
+        """Append [(conversation_id, user_message, bot_response)] to user_id's index."""
+        if not turns:
+            return
+        vectors = self.embedder.embed([turn_text(message, response) for _, message, response in turns])
+        ids = np.array([conversation_id for conversation_id, _, _ in turns], dtype=np.int64)
+        with self._lock:
+            # Vectors first, so an id is only ever written once its vector
+            # is; a crash in between leaves surplus vector rows, which
+            # _repair drops before anything else is appended
+            self._repair(user_id)
+            with open(self._path(user_id, "f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self._path(user_id, "ids"), "ab") as f:
+                f.write(ids.tobytes())
+
+    def add(self, user_id, conversation_id, user_message, bot_response):
+        self.add_many(user_id, [(conversation_id, user_message, bot_response)])
+
+    def sync(self, pool, user_id):
+        """Index any of user_id's conversations not yet in the index.
+
+        Runs once per user per process; afterwards add() keeps it current.
+        Returns the number of turns added.
+        """
+        if user_id in self._synced:
+            return 0
+        with self._sync_lock:
+            if user_id in self._synced:
+                return 0
+            with self._lock:
+                self._repair(user_id)
+            ids = self._ids(user_id)
+            last_id = int(ids[-1]) if len(ids) else 0
+            added = 0
+            if self.archive is not None:
+                # Archived turns predate the hot ones (e.g. after a rebuild)
+                with pool.snapshot() as conn:
+                    rows = self.archive.rows(
+                        conn, "conversations", user_id, ("id", "user_message", "bot_response"),
+                        after_id=last_id,
+                    )
+                rows.sort()
+                for start in range(0, len(rows), SYNC_BATCH_SIZE):
+                    self.add_many(user_id, rows[start:start + SYNC_BATCH_SIZE])
+                if rows:
+                    added += len(rows)
+                    last_id = rows[-1][0]
+            while True:
+                with pool.connection() as conn:
+                    rows = conn.execute(
+                        SQL_GET_CONVERSATIONS_AFTER, (user_id, last_id, SYNC_BATCH_SIZE)
+                    ).fetchall()
+                if not rows:
+                    break
+                self.add_many(user_id, rows)
+                added += len(rows)
+                last_id = rows[-1][0]
+            self._synced.add(user_id)
+        return added
+
+    def add_saved(self, pool, records):
+        """on_flush hook for conversation_log.ConversationWriter.
+
+        records are conversations rows as written (id, user_id, session_id,
+        ts, user_message, bot_response, ...). Users not synced yet are
+        synced instead, which picks the new rows up from the table.
+        """
+        by_user = defaultdict(list)
+        for conversation_id, user_id, _, _, user_message, bot_response, *_ in records:
+            by_user[user_id].append((conversation_id, user_message, bot_response))
+        for user_id, turns in by_user.items():
+            if user_id not in self._synced:
+                self.sync(pool, user_id)
+                continue
+            # A sync that ran after the write may have indexed these already
+            ids = self._ids(user_id)
+            last_id = int(ids[-1]) if len(ids) else 0
+            self.add_many(user_id, [turn for turn in turns if turn[0] > last_id])
+
+    # Search
+
+    def search(self, user_id, query, k=DEFAULT_TOP_K, min_score=MIN_SCORE):
+        """Return [(conversation_id, score)] for the k best matches, best first."""
+        with self._lock:
+            ids = self._ids(user_id)
+            # Rows written after the ids file was read are ignored
+            vectors = self._vectors(user_id, len(ids))
+        if not len(ids):
+            return []
+        scores = vectors @ self.embedder.embed([query])[0]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+def retrieve_turns(pool, index, user_id, question, k=DEFAULT_TOP_K,
+                   token_budget=HISTORY_TOKEN_BUDGET, count_tokens=estimate_tokens, exclude=()):
+    """Relevant earlier turns for question, formatted within token_budget.
+
+    Turns whose id is in exclude (e.g. already in the prompt's recent
+    history) are skipped. Returns a list of lines ("User: ...",
+    "Assistant: ...") in chronological order; empty if nothing relevant
+    was found.
+    """
+    exclude = set(exclude)
+    matches = index.search(user_id, question, k + len(exclude))
+    ids = [conversation_id for conversation_id, _ in matches if conversation_id not in exclude][:k]
+    if not ids:
+        return []
+    with pool.snapshot() as conn:
+        rows = conn.execute(SQL_GET_TURNS.format(",".join("?" * len(ids))), ids).fetchall()
+        turns = {row[0]: row for row in rows}
+        missing = [conversation_id for conversation_id in ids if conversation_id not in turns]
+        if missing and index.archive is not None:
+            for conversation_id, row in index.archive.lookup(
+                conn, "conversations", user_id, missing, ("id", "ts", "user_message", "bot_response")
+            ).items():
+                turns[conversation_id] = row
+
+    # Spend the budget on the best matches first, then show them in order
+    chosen = []
+    used = 0
+    for conversation_id in ids:
+        if conversation_id not in turns:
+            continue
+        _, ts, user_message, bot_response = turns[conversation_id]
+        question_line = f"User: {user_message}"
+        cost = count_tokens(question_line) + 1
+        if used + cost > token_budget:
+            break
+        answer_budget = token_budget - used - cost
+        answer = f"Assistant: {bot_response}"
+        truncated = count_tokens(answer) + 1 > answer_budget
+        if truncated:
+            # ~4 characters per token, as in estimate_tokens
+            answer = answer[:(answer_budget - 2) * 4].rstrip() + "…"
+            if answer_budget < MIN_ANSWER_TOKENS:
+                answer = None
+        used += cost + (count_tokens(answer) + 1 if answer else 0)
+        chosen.append((ts, question_line, answer))
+        if truncated:
+            break
+    lines = []
+    for _, question_line, answer in sorted(chosen):
+        lines += [question_line, answer] if answer else [question_line]
+    return lines
@@ -0,0 +1,287 @@
+"""Write-behind logging of chat turns to the conversations table.
+
+save_conversation used to INSERT and commit on the request path after every
+LLM response. ConversationWriter instead queues the record and returns at
+once; a background thread writes queued records in one transaction per
+batch, when batch_size records are waiting or flush_interval seconds have
+passed. Call flush() to wait for everything queued so far (e.g. before
+reading conversations back); close() flushes and stops the thread, and is
+registered with atexit so queued turns are written on shutdown.
+
+Conversation ids are allocated when a record is submitted, so callers can use
+the id immediately. They come from blocks of ID_BLOCK ids reserved by moving
+the table's AUTOINCREMENT sequence past them, so no other insert (another
+writer or process, or an insert without an id) can take one; an id handed
+out is the id the row is written under.
+
+The context column holds the prompt context actually sent to the model,
+encoded per session: the first turn of a session (and any turn where a diff
+wouldn't be smaller) is stored as a zlib-compressed keyframe, later turns as
+a compressed line diff against the previous context written for the
+session; a dropped record never becomes the base of a diff. Rows written
+before this change hold plain JSON text and decode to themselves.
+"""
+import atexit
+import difflib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from collections import ChainMap
+
+from db import now_ts
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 1.0
+MAX_QUEUE = 10000
+MAX_RETRIES = 5
+RETRY_DELAY = 0.5
+ID_BLOCK = 100
+
+KEYFRAME = b"F"
+DIFF = b"D"
+
+# Archived rows no longer count in MAX(id); AUTOINCREMENT's sequence still does
+SQL_MAX_ID = """
+    SELECT MAX(
+        COALESCE((SELECT MAX(id) FROM conversations), 0),
+        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'conversations'), 0)
+    )
+"""
+SQL_RESERVE_IDS = "UPDATE sqlite_sequence SET seq = ? WHERE name = 'conversations'"
+SQL_START_SEQUENCE = "INSERT INTO sqlite_sequence (name, seq) VALUES ('conversations', ?)"
+SQL_INSERT = """
+    INSERT INTO conversations
+    (id, user_id, session_id, ts, user_message, bot_response, context, ttft_ms, latency_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_GET_SESSION_CONTEXTS = "SELECT id, context FROM conversations WHERE session_id = ? ORDER BY id"
+
+logger = logging.getLogger(__name__)
+
+
+def encode_context(context, previous=None):
+    """Encode context as a keyframe, or as a diff against previous if smaller."""
+    keyframe = KEYFRAME + zlib.compress(context.encode())
+    if previous is None:
+        return keyframe
+    old, new = previous.splitlines(keepends=True), context.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        else:
+            ops.append("".join(new[j1:j2]))
+    diff = DIFF + zlib.compress(json.dumps(ops, separators=(",", ":")).encode())
+    return diff if len(diff) < len(keyframe) else keyframe
+
+
+def decode_context(blob, previous=None):
+    """Inverse of encode_context; previous is the session's preceding context."""
+    if blob is None or isinstance(blob, str):
+        return blob
+    kind, payload = blob[:1], zlib.decompress(blob[1:]).decode()
+    if kind == KEYFRAME:
+        return payload
+    old = (previous or "").splitlines(keepends=True)
+    return "".join(
+        "".join(old[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(payload)
+    )
+
+
+def load_session_contexts(pool, session_id, archive=None, user_id=None):
+    """Return [(conversation_id, context)] for a session, decoding the diff chain.
+
+    With an archive and the session's user_id, archived turns are included.
+    """
+    with pool.snapshot() as conn:
+        rows = conn.execute(SQL_GET_SESSION_CONTEXTS, (session_id,)).fetchall()
+        if archive is not None and user_id is not None:
+            cold = archive.rows(conn, "conversations", user_id, ("id", "session_id", "context"))
+            rows = sorted(
+                [(row_id, context) for row_id, row_session, context in cold if row_session == session_id]
+                + rows
+            )
+    contexts = []
+    previous = None
+    for conversation_id, blob in rows:
+        previous = decode_context(blob, previous)
+        contexts.append((conversation_id, previous))
+    return contexts
+
+
+class ConversationWriter:
+    """Queue conversation records and write them in batches on a background thread.
+
+    on_flush, if given, is called from the writer thread with the list of
+    records after each successful batch (e.g. to update the vector index).
+    """
+
+    def __init__(self, pool, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_queue=MAX_QUEUE, on_flush=None, id_block=ID_BLOCK):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "max_batch": 0,
+                      "retries": 0, "errors": 0}
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._last_context = {}
+        self.id_block = id_block
+        self._next_id, self._last_id = self._reserve_ids()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, session_id, user_message, bot_response, context=None,
+               ttft_ms=None, latency_ms=None):
+        """Queue one chat turn; returns its conversation id."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ConversationWriter is closed")
+            if self._next_id > self._last_id:
+                self._next_id, self._last_id = self._reserve_ids()
+            conversation_id = self._next_id
+            self._next_id += 1
+            self.stats["submitted"] += 1
+            # Blocks only if the writer has fallen MAX_QUEUE records behind.
+            # The context is encoded on the writer thread, in submit order.
+            self._queue.put((conversation_id, user_id, session_id, now_ts(), user_message,
+                             bot_response, context, ttft_ms, latency_ms))
+        return conversation_id
+
+    def _reserve_ids(self):
+        """Claim the next id_block conversation ids; returns (first, last)."""
+        with self.pool.transaction() as conn:
+            first = conn.execute(SQL_MAX_ID).fetchone()[0] + 1
+            last = first + self.id_block - 1
+            if not conn.execute(SQL_RESERVE_IDS, (last,)).rowcount:
+                conn.execute(SQL_START_SEQUENCE, (last,))
+        return first, last
+
+    def end_session(self, session_id):
+        """Forget a session's last context (e.g. on logout)."""
+        self._queue.put(("end_session", session_id))
+
+    def flush(self, timeout=None):
+        """Block until every record submitted so far has been written."""
+        if not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """Flush queued records and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # Writer thread
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item[0] == "end_session":
+                    # Records queued before it still diff against the context
+                    if batch:
+                        self._write(batch)
+                        batch = []
+                    self._last_context.pop(item[1], None)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    @staticmethod
+    def _encode(record, contexts):
+        """record with its context encoded against contexts[session_id], which moves on to it."""
+        session_id, context = record[2], record[6]
+        if context is None:
+            return record
+        blob = encode_context(context, contexts.get(session_id))
+        contexts[session_id] = context
+        return record[:6] + (blob,) + record[7:]
+
+    def _write(self, batch):
+        # Contexts advance in a layer over _last_context that is merged only
+        # once the rows are committed, so a dropped record can't become the
+        # base of a later diff
+        contexts = ChainMap({}, self._last_context)
+        encoded = [self._encode(record, contexts) for record in batch]
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with self.pool.transaction() as conn:
+                    conn.executemany(SQL_INSERT, encoded)
+                break
+            except sqlite3.IntegrityError:
+                # Ids are reserved, so this is a bad record (e.g. a deleted
+                # user): write the others one by one
+                encoded, contexts = self._write_one_by_one(batch)
+                break
+            except sqlite3.OperationalError:
+                if attempt == MAX_RETRIES:
+                    self.stats["errors"] += len(batch)
+                    logger.exception("Dropping %d conversation records", len(batch))
+                    return
+                self.stats["retries"] += 1
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+        self._last_context.update(contexts.maps[0])
+        self.stats["written"] += len(encoded)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(encoded))
+        if self.on_flush is not None:
+            try:
+                self.on_flush(encoded)
+            except Exception:
+                logger.exception("Conversation on_flush callback failed")
+
+    def _write_one_by_one(self, batch):
+        """Insert records separately, dropping the ones that fail.
+
+        Each record is encoded against the last one written in its session.
+        Returns (written records, staged contexts).
+        """
+        written = []
+        contexts = ChainMap({}, self._last_context)
+        with self.pool.transaction() as conn:
+            for record in batch:
+                attempt = contexts.new_child()
+                encoded = self._encode(record, attempt)
+                try:
+                    conn.execute(SQL_INSERT, encoded)
+                except sqlite3.IntegrityError:
+                    self.stats["errors"] += 1
+                    logger.exception("Dropping conversation record %s", record[0])
+                    continue
+                contexts.update(attempt.maps[0])
+                written.append(encoded)
+        return written, contexts
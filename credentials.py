@@ -0,0 +1,215 @@
+"""Password hashing, verification and signed session tokens.
+
+Passwords used to be stored as one unsalted SHA-256, so equal passwords had
+equal hashes and a leaked table could be brute-forced on a GPU at billions
+of guesses per second. Credentials hashes new passwords with a salted,
+memory-hard KDF from hashlib (scrypt by default, PBKDF2-SHA256 as the
+alternative) and stores the algorithm and its cost parameters with the
+hash:
+
+    scrypt$16384$8$1$<salt>$<key>
+    pbkdf2_sha256$600000$<salt>$<key>
+
+so the cost can be tuned (see benchmarks/bench_login.py) without
+invalidating existing hashes. A login whose stored hash is a legacy SHA-256
+hex digest, or uses other parameters than the configured hasher, is
+rehashed with the current one right after it verifies.
+
+SessionTokens issues short-lived HMAC-signed tokens on login. Reruns of an
+authenticated session verify the token (one HMAC, cached per token until
+it expires) instead of querying the users table again.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+# scrypt cost: 16 MiB of memory and ~50-70 ms per hash on one core
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+SESSION_TTL = 12 * 60 * 60
+MAX_CACHED_TOKENS = 10000
+
+LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+        self.n, self.r, self.p = n, r, p
+
+    def _derive(self, password, salt):
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=self.n, r=self.r, p=self.p,
+            maxmem=128 * self.r * (self.n + self.p) + 2 ** 20, dklen=KEY_BYTES,
+        )
+
+    def hash(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        key = self._derive(password, salt)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        """(hasher with the encoded parameters, salt, key)."""
+        _, n, r, p, salt, key = encoded.split("$")
+        return cls(int(n), int(r), int(p)), _b64decode(salt), _b64decode(key)
+
+    def params(self):
+        return (self.n, self.r, self.p)
+
+
+class PBKDF2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=PBKDF2_ITERATIONS):
+        self.iterations = iterations
+
+    def _derive(self, password, salt):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations, KEY_BYTES)
+
+    def hash(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        key = self._derive(password, salt)
+        return f"{self.algorithm}${self.iterations}${_b64encode(salt)}${_b64encode(key)}"
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        _, iterations, salt, key = encoded.split("$")
+        return cls(int(iterations)), _b64decode(salt), _b64decode(key)
+
+    def params(self):
+        return (self.iterations,)
+
+
+HASHERS = {hasher.algorithm: hasher for hasher in (ScryptHasher, PBKDF2Hasher)}
+
+
+class Credentials:
+    """Hash, verify and transparently upgrade stored passwords."""
+
+    def __init__(self, hasher=None):
+        self.hasher = hasher or ScryptHasher()
+        # Verified against when the username doesn't exist, so that case
+        # takes as long as a wrong password
+        self._dummy_hash = self.hasher.hash(secrets.token_hex(8))
+
+    def hash(self, password):
+        return self.hasher.hash(password)
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash) for password against a stored hash."""
+        if not stored:
+            return False, False
+        if LEGACY_SHA256.match(stored):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(digest, stored), True
+        hasher_class = HASHERS.get(stored.split("$", 1)[0])
+        if hasher_class is None:
+            return False, False
+        try:
+            hasher, salt, key = hasher_class.from_encoded(stored)
+        except ValueError:
+            return False, False
+        matches = hmac.compare_digest(hasher._derive(password, salt), key)
+        outdated = (
+            hasher_class is not type(self.hasher)
+            or hasher.params() != self.hasher.params()
+            or len(key) != KEY_BYTES
+        )
+        return matches, matches and outdated
+
+    def authenticate(self, repo, username, password):
+        """Return the user id if the password matches, else None.
+
+        A match against a legacy or outdated hash stores a fresh hash.
+        """
+        user = repo.get_user(username)
+        if user is None:
+            self.verify(password, self._dummy_hash)
+            return None
+        user_id, stored = user
+        matches, needs_rehash = self.verify(password, stored)
+        if not matches:
+            return None
+        if needs_rehash:
+            repo.update_password(user_id, self.hash(password))
+        return user_id
+
+
+class SessionTokens:
+    """Short-lived HMAC-signed session tokens with a verification cache.
+
+    A token carries the user id, username and expiry. The secret defaults
+    to a random per-process key, so tokens don't outlive the server
+    process; pass a fixed secret to keep them valid across restarts.
+    """
+
+    def __init__(self, secret=None, ttl=SESSION_TTL, max_cached=MAX_CACHED_TOKENS):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.secret = secret or secrets.token_bytes(32)
+        self.ttl = ttl
+        self.max_cached = max_cached
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id, username):
+        claims = {"uid": user_id, "name": username, "exp": int(time.time()) + self.ttl}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token):
+        """Claims ({"uid", "name", "exp"}) if token is genuine and unexpired, else None."""
+        if not token:
+            return None
+        now = time.time()
+        claims = self._cache.get(token)
+        if claims is None:
+            payload, _, signature = token.partition(".")
+            if not hmac.compare_digest(self._sign(payload).encode(), signature.encode()):
+                return None
+            try:
+                claims = json.loads(_b64decode(payload))
+            except ValueError:
+                return None
+            with self._lock:
+                if len(self._cache) >= self.max_cached:
+                    self._evict(now)
+                self._cache[token] = claims
+        if claims["exp"] <= now:
+            with self._lock:
+                self._cache.pop(token, None)
+            return None
+        return claims
+
+    def _evict(self, now):
+        expired = [token for token, claims in self._cache.items() if claims["exp"] <= now]
+        for token in expired or list(self._cache)[: self.max_cached // 2]:
+            del self._cache[token]
+
+
+def load_session_secret(env_var="SMARTSPEND_SESSION_SECRET"):
+    """Session secret from the environment, or None for a per-process one."""
+    return os.environ.get(env_var) or None
@@ -0,0 +1,962 @@
+"""SQLite data-access layer for SmartSpend AI.
+
+A small thread-safe connection pool plus a repository that owns every SQL
+statement the app runs. Connections are long-lived, opened once with the
+pragmas profile below and reused across Streamlit sessions, so a page render
+no longer pays for connect/close and lock setup on every helper call.
+"""
+import heapq
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Pragmas applied to every pooled connection
+PRAGMAS = {
+    "journal_mode": "WAL",      # readers don't block the writer
+    "synchronous": "NORMAL",    # safe with WAL, one fsync per checkpoint
+    "busy_timeout": 5000,       # wait for the write lock instead of failing
+    "cache_size": -16000,       # ~16 MB page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": 64 * 1024 * 1024,
+    "foreign_keys": "ON",
+}
+
+POOL_SIZE = 5
+# Size of sqlite3's per-connection prepared statement cache. All SQL below is
+# kept in module constants so the same text hits the cache on every call.
+STATEMENT_CACHE_SIZE = 128
+
+
+class ConnectionPool:
+    """Fixed-size pool of sqlite3 connections shared between threads."""
+
+    def __init__(self, db_file, size=POOL_SIZE, pragmas=None, timeout=10.0):
+        self.db_file = db_file
+        self.size = size
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        # isolation_level=None puts sqlite3 in autocommit mode; writes that
+        # need atomicity go through transaction() which issues BEGIN itself.
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a database connection")
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for autocommit reads or single statements."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside BEGIN IMMEDIATE ... COMMIT.
+
+        The write lock is taken up front so concurrent writers queue on
+        busy_timeout instead of failing mid-transaction on lock upgrade.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @contextmanager
+    def snapshot(self):
+        """Borrow a connection inside a read transaction.
+
+        Every query made with it sees the same WAL snapshot, e.g. hot rows
+        and the archive manifest (see archive.py) from one point in time.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            yield conn
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Materialized spending aggregates as created by migration 3 (shared, text
+# timestamps): bucket table -> (key column, key expression over an expenses
+# row). Until expenses are categorized the description is the de-facto
+# category ("spent 500 on food"), so it is used as the fallback key.
+# Superseded by the per-user USER_AGGREGATE_BUCKETS in migration 6.
+V3_AGGREGATE_BUCKETS = {
+    "spend_daily": ("day", "substr({row}.timestamp, 1, 10)"),
+    "spend_monthly": ("month", "substr({row}.timestamp, 1, 7)"),
+    "spend_category": ("category", "COALESCE({row}.category, {row}.description, '')"),
+}
+
+
+def _v3_aggregate_statements(row, sign):
+    """Statements that add (sign=+1) or remove (sign=-1) one expenses row."""
+    op = "+" if sign > 0 else "-"
+    amount = f"COALESCE({row}.amount, 0)"
+    statements = []
+    for table, (column, key) in V3_AGGREGATE_BUCKETS.items():
+        key = key.format(row=row)
+        statements.append(
+            f"INSERT INTO {table} ({column}, total, count) VALUES ({key}, {'' if sign > 0 else '-'}{amount}, {sign}) "
+            f"ON CONFLICT({column}) DO UPDATE SET "
+            f"total = total + excluded.total, count = count + excluded.count;"
+        )
+        if sign < 0:
+            statements.append(f"DELETE FROM {table} WHERE {column} = {key} AND count <= 0;")
+    statements.append(
+        f"UPDATE spend_totals SET total_spent = total_spent {op} {amount}, "
+        f"count = count {op} 1 WHERE id = 1;"
+    )
+    return "\n        ".join(statements)
+
+
+def _v3_aggregates_migration():
+    tables = "".join(
+        f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        {column} TEXT PRIMARY KEY,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL
+    );
+    INSERT INTO {table} ({column}, total, count)
+    SELECT {key.format(row="e")}, SUM(COALESCE(e.amount, 0)), COUNT(*)
+    FROM expenses e GROUP BY 1;"""
+        for table, (column, key) in V3_AGGREGATE_BUCKETS.items()
+    )
+    return f"""
+    ALTER TABLE expenses ADD COLUMN category TEXT;
+    {tables}
+    CREATE TABLE IF NOT EXISTS spend_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_spent REAL NOT NULL,
+        count INTEGER NOT NULL
+    );
+    INSERT INTO spend_totals (id, total_spent, count)
+    SELECT 1, COALESCE(SUM(amount), 0), COUNT(*) FROM expenses;
+    CREATE TRIGGER IF NOT EXISTS expenses_aggregate_insert AFTER INSERT ON expenses
+    BEGIN
+        {_v3_aggregate_statements("NEW", 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_aggregate_delete AFTER DELETE ON expenses
+    BEGIN
+        {_v3_aggregate_statements("OLD", -1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_aggregate_update
+    AFTER UPDATE OF amount, timestamp, category, description ON expenses
+    BEGIN
+        {_v3_aggregate_statements("OLD", -1)}
+        {_v3_aggregate_statements("NEW", 1)}
+    END;
+    """
+
+
+# Per-user aggregates (migration 6). Timestamps are Unix epoch seconds and
+# bucketed by local calendar day/month.
+USER_AGGREGATE_BUCKETS = {
+    "spend_daily": ("day", "date({row}.ts, 'unixepoch', 'localtime')"),
+    "spend_monthly": ("month", "strftime('%Y-%m', {row}.ts, 'unixepoch', 'localtime')"),
+    "spend_category": ("category", "COALESCE({row}.category, {row}.description, '')"),
+}
+
+
+def _user_aggregate_statements(row, sign):
+    """Statements that add (sign=+1) or remove (sign=-1) one expenses row."""
+    amount = f"{'' if sign > 0 else '-'}COALESCE({row}.amount, 0)"
+    statements = []
+    for table, (column, key) in USER_AGGREGATE_BUCKETS.items():
+        key = key.format(row=row)
+        statements.append(
+            f"INSERT INTO {table} (user_id, {column}, total, count) "
+            f"VALUES ({row}.user_id, {key}, {amount}, {sign}) "
+            f"ON CONFLICT(user_id, {column}) DO UPDATE SET "
+            f"total = total + excluded.total, count = count + excluded.count;"
+        )
+        if sign < 0:
+            statements.append(
+                f"DELETE FROM {table} WHERE user_id = {row}.user_id "
+                f"AND {column} = {key} AND count <= 0;"
+            )
+    statements.append(
+        f"INSERT INTO spend_totals (user_id, total_spent, count) "
+        f"VALUES ({row}.user_id, {amount}, {sign}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET "
+        f"total_spent = total_spent + excluded.total_spent, count = count + excluded.count;"
+    )
+    return "\n        ".join(statements)
+
+
+def _bump_version(row):
+    return (
+        f"INSERT INTO data_version (user_id, version) VALUES ({row}.user_id, 1) "
+        f"ON CONFLICT(user_id) DO UPDATE SET version = version + 1;"
+    )
+
+
+def _per_user_migration():
+    """Partition every table by user_id and store timestamps as integers.
+
+    Data recorded before accounts were separated (the shared user_data row
+    1, all expenses and conversations) is given to the first registered
+    user, or to a placeholder account that can't log in if there is legacy
+    data but nobody has registered yet.
+    """
+    aggregates = "".join(
+        f"""
+    CREATE TABLE {table} (
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        {column} TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, {column})
+    ) WITHOUT ROWID;
+    INSERT INTO {table} (user_id, {column}, total, count)
+    SELECT e.user_id, {key.format(row="e")}, SUM(COALESCE(e.amount, 0)), COUNT(*)
+    FROM expenses e GROUP BY 1, 2;"""
+        for table, (column, key) in USER_AGGREGATE_BUCKETS.items()
+    )
+    # strftime('%s', text, 'utc') reads the legacy local-time text and
+    # returns Unix epoch seconds
+    return f"""
+    CREATE TABLE users_new (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    INSERT INTO users_new (username, password, created_at)
+    SELECT username, password, created_at FROM users ORDER BY created_at, rowid;
+    INSERT INTO users_new (username, password, created_at)
+    SELECT '__legacy__', '!', datetime('now')
+    WHERE NOT EXISTS (SELECT 1 FROM users_new)
+      AND (EXISTS (SELECT 1 FROM expenses) OR EXISTS (SELECT 1 FROM conversations));
+    DROP TABLE users;
+    ALTER TABLE users_new RENAME TO users;
+
+    CREATE TABLE user_data_new (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        total_money REAL NOT NULL DEFAULT 0
+    );
+    INSERT INTO user_data_new (user_id, total_money)
+    SELECT u.id, CASE WHEN u.id = (SELECT MIN(id) FROM users)
+                      THEN COALESCE((SELECT total_money FROM user_data WHERE id = 1), 0)
+                      ELSE 0 END
+    FROM users u;
+    DROP TABLE user_data;
+    ALTER TABLE user_data_new RENAME TO user_data;
+
+    CREATE TABLE expenses_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        description TEXT,
+        amount REAL,
+        ts INTEGER NOT NULL,
+        category TEXT
+    );
+    INSERT INTO expenses_new (id, user_id, description, amount, ts, category)
+    SELECT id, (SELECT MIN(id) FROM users), description, amount,
+           COALESCE(CAST(strftime('%s', timestamp, 'utc') AS INTEGER), 0), category
+    FROM expenses;
+    DROP TABLE expenses;
+    ALTER TABLE expenses_new RENAME TO expenses;
+    CREATE INDEX idx_expenses_user_ts ON expenses (user_id, ts, amount, description);
+    CREATE INDEX idx_expenses_user_category ON expenses (user_id, category, amount);
+
+    CREATE TABLE conversations_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        session_id TEXT,
+        ts INTEGER NOT NULL,
+        user_message TEXT,
+        bot_response TEXT,
+        context TEXT,
+        ttft_ms REAL,
+        latency_ms REAL
+    );
+    INSERT INTO conversations_new
+    (id, user_id, session_id, ts, user_message, bot_response, context, ttft_ms, latency_ms)
+    SELECT id, (SELECT MIN(id) FROM users), session_id,
+           COALESCE(CAST(strftime('%s', timestamp, 'utc') AS INTEGER), 0),
+           user_message, bot_response, context, ttft_ms, latency_ms
+    FROM conversations;
+    DROP TABLE conversations;
+    ALTER TABLE conversations_new RENAME TO conversations;
+    CREATE INDEX idx_conversations_user_ts ON conversations (user_id, ts);
+
+    DROP TABLE spend_daily;
+    DROP TABLE spend_monthly;
+    DROP TABLE spend_category;
+    DROP TABLE spend_totals;
+    {aggregates}
+    CREATE INDEX idx_spend_category_user_total ON spend_category (user_id, total);
+    CREATE TABLE spend_totals (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        total_spent REAL NOT NULL,
+        count INTEGER NOT NULL
+    );
+    INSERT INTO spend_totals (user_id, total_spent, count)
+    SELECT u.id, COALESCE(SUM(e.amount), 0), COUNT(e.id)
+    FROM users u LEFT JOIN expenses e ON e.user_id = u.id GROUP BY u.id;
+
+    DROP TABLE data_version;
+    CREATE TABLE data_version (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        version INTEGER NOT NULL
+    );
+    INSERT INTO data_version (user_id, version) SELECT id, 0 FROM users;
+    DROP TABLE llm_cache;
+    CREATE TABLE llm_cache (
+        key TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        response TEXT NOT NULL,
+        data_version INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX idx_llm_cache_last_used ON llm_cache (last_used);
+    CREATE INDEX idx_llm_cache_user_version ON llm_cache (user_id, data_version);
+
+    CREATE TRIGGER expenses_aggregate_insert AFTER INSERT ON expenses
+    BEGIN
+        {_user_aggregate_statements("NEW", 1)}
+        {_bump_version("NEW")}
+    END;
+    CREATE TRIGGER expenses_aggregate_delete AFTER DELETE ON expenses
+    BEGIN
+        {_user_aggregate_statements("OLD", -1)}
+        {_bump_version("OLD")}
+    END;
+    CREATE TRIGGER expenses_aggregate_update AFTER UPDATE ON expenses
+    BEGIN
+        {_user_aggregate_statements("OLD", -1)}
+        {_user_aggregate_statements("NEW", 1)}
+        {_bump_version("NEW")}
+    END;
+    CREATE TRIGGER user_data_version_update AFTER UPDATE OF total_money ON user_data
+    BEGIN
+        {_bump_version("NEW")}
+    END;
+    """
+
+
+def _archive_migration():
+    """Manifest of archived partitions, and a delete trigger archiving can bypass.
+
+    Rows moved to the archive keep counting in the spend_* aggregates and
+    don't change the data version, so while archive_lock holds the user's
+    id (only inside the archiving transaction) deletes skip the trigger.
+    """
+    return f"""
+    CREATE TABLE archive_partitions (
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        source TEXT NOT NULL,
+        month TEXT NOT NULL,
+        generation INTEGER NOT NULL,
+        rows INTEGER NOT NULL,
+        min_ts INTEGER NOT NULL,
+        max_ts INTEGER NOT NULL,
+        min_id INTEGER NOT NULL,
+        max_id INTEGER NOT NULL,
+        amount_total REAL,
+        bytes INTEGER NOT NULL,
+        archived_at INTEGER NOT NULL,
+        PRIMARY KEY (user_id, source, month)
+    ) WITHOUT ROWID;
+    CREATE TABLE archive_lock (
+        user_id INTEGER PRIMARY KEY
+    );
+    DROP TRIGGER expenses_aggregate_delete;
+    CREATE TRIGGER expenses_aggregate_delete AFTER DELETE ON expenses
+    WHEN NOT EXISTS (SELECT 1 FROM archive_lock WHERE user_id = OLD.user_id)
+    BEGIN
+        {_user_aggregate_statements("OLD", -1)}
+        {_bump_version("OLD")}
+    END;
+    """
+
+
+def _bulk_insert_migration():
+    """A lock under which expense inserts skip the per-row aggregate trigger.
+
+    The importer holds it for the user inside each chunk's transaction and
+    then adds the whole chunk to the aggregates set-based, with one data
+    version bump, instead of four upserts and a bump per row.
+    """
+    return f"""
+    CREATE TABLE bulk_insert_lock (
+        user_id INTEGER PRIMARY KEY
+    );
+    DROP TRIGGER expenses_aggregate_insert;
+    CREATE TRIGGER expenses_aggregate_insert AFTER INSERT ON expenses
+    WHEN NOT EXISTS (SELECT 1 FROM bulk_insert_lock WHERE user_id = NEW.user_id)
+    BEGIN
+        {_user_aggregate_statements("NEW", 1)}
+        {_bump_version("NEW")}
+    END;
+    """
+
+
+# Current time in Unix epoch seconds, as SQL (for trigger bodies)
+SQL_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _insights_migration():
+    """Precomputed insight texts and the per-user job queue that refreshes them.
+
+    Every data_version bump (any expense or balance change) marks the
+    user's job pending: changed_at is the latest write, which the worker
+    debounces on, and pending_since the first write it hasn't processed
+    yet, which bounds how long a stream of writes can postpone it.
+    forced marks a manual refresh, which bypasses the response cache.
+    """
+    return f"""
+    CREATE TABLE insight_jobs (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        data_version INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        changed_at REAL NOT NULL,
+        pending_since REAL NOT NULL,
+        not_before REAL NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        forced INTEGER NOT NULL DEFAULT 0,
+        started_at REAL,
+        finished_at REAL,
+        error TEXT
+    );
+    CREATE INDEX idx_insight_jobs_status ON insight_jobs (status, pending_since);
+    CREATE TABLE insights (
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        kind TEXT NOT NULL,
+        data_version INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        computed_at REAL NOT NULL,
+        PRIMARY KEY (user_id, kind)
+    ) WITHOUT ROWID;
+    CREATE TRIGGER data_version_insight_job AFTER UPDATE OF version ON data_version
+    BEGIN
+        INSERT INTO insight_jobs (user_id, data_version, status, changed_at, pending_since)
+        VALUES (NEW.user_id, NEW.version, 'pending', {SQL_NOW}, {SQL_NOW})
+        ON CONFLICT(user_id) DO UPDATE SET
+            data_version = excluded.data_version,
+            pending_since = CASE WHEN status = 'pending' THEN pending_since ELSE excluded.pending_since END,
+            status = 'pending',
+            changed_at = excluded.changed_at,
+            attempts = 0;
+    END;
+    INSERT INTO insight_jobs (user_id, data_version, status, changed_at, pending_since)
+    SELECT user_id, version, 'pending', {SQL_NOW}, {SQL_NOW} FROM data_version WHERE version > 0;
+    """
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit an entry once released; append a new one instead.
+MIGRATIONS = [
+    # 1: baseline schema
+    """
+    CREATE TABLE IF NOT EXISTS user_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        total_money REAL
+    );
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT,
+        amount REAL,
+        timestamp TEXT
+    );
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        timestamp TEXT,
+        user_message TEXT,
+        bot_response TEXT,
+        context TEXT
+    );
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    INSERT OR IGNORE INTO user_data (id, total_money) VALUES (1, 0);
+    """,
+    # 2: lookup index for bulk-import dedupe (also serves ORDER BY timestamp)
+    """
+    CREATE INDEX IF NOT EXISTS idx_expenses_dedupe
+    ON expenses (timestamp, amount, description);
+    """,
+    # 3: per-day/month/category spending totals kept current by triggers,
+    # so every insert path (forms, chat, importer) updates them in the same
+    # transaction
+    _v3_aggregates_migration(),
+    # 4: data version counter bumped on every expense or balance change, and
+    # the LLM response cache keyed against it
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+    CREATE TRIGGER IF NOT EXISTS expenses_version_insert AFTER INSERT ON expenses
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_version_update AFTER UPDATE ON expenses
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_version_delete AFTER DELETE ON expenses
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS user_data_version_update
+    AFTER UPDATE OF total_money ON user_data
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        data_version INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used);
+    """,
+    # 5: per-message chat latency (time to first token and total, in ms)
+    """
+    ALTER TABLE conversations ADD COLUMN ttft_ms REAL;
+    ALTER TABLE conversations ADD COLUMN latency_ms REAL;
+    """,
+    # 6: per-user partitioning, integer timestamps, composite indexes
+    _per_user_migration(),
+    # 7: rows still waiting for categorizer.backfill, so checking for them
+    # on startup doesn't scan the whole table
+    """
+    CREATE INDEX IF NOT EXISTS idx_expenses_uncategorized
+    ON expenses (user_id) WHERE category IS NULL;
+    """,
+    # 8: hot/cold tiering: old rows move to columnar files under archive/
+    _archive_migration(),
+    # 9: background precomputation of the Analysis/Savings insights
+    _insights_migration(),
+    # 10: whether an expense was debited from the balance when it was
+    # recorded (add_expense_atomic), so undo only refunds those. Older rows
+    # can't be told apart from imported ones and are never refunded.
+    """
+    ALTER TABLE expenses ADD COLUMN debited INTEGER NOT NULL DEFAULT 0;
+    """,
+    # 11: set-based aggregate updates for bulk imports
+    _bulk_insert_migration(),
+]
+
+
+def _split_statements(script):
+    """Split a SQL script on statement boundaries (trigger bodies included)."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+    if statement.strip():
+        yield statement.strip()
+
+
+def init_schema(pool):
+    """Create or upgrade the database schema to the latest version."""
+    with pool.transaction() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            # executescript() would COMMIT our transaction, so run the
+            # statements one by one instead.
+            for statement in _split_statements(script):
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now_ts():
+    """Current time as stored in the ts columns (Unix epoch seconds)."""
+    return int(time.time())
+
+
+def format_ts(ts):
+    """Render a stored ts as local time for display."""
+    return datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT)
+
+
+SQL_GET_TOTAL_MONEY = "SELECT total_money FROM user_data WHERE user_id = ?"
+SQL_SET_TOTAL_MONEY = "UPDATE user_data SET total_money = ? WHERE user_id = ?"
+SQL_ADD_TO_BALANCE = "UPDATE user_data SET total_money = total_money + ? WHERE user_id = ?"
+SQL_DEBIT_IF_FUNDS = """
+    UPDATE user_data SET total_money = total_money - ?
+    WHERE user_id = ? AND total_money >= ?
+"""
+SQL_INSERT_EXPENSE = """
+    INSERT INTO expenses (user_id, description, amount, ts, category, debited) VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_GET_EXPENSES = "SELECT description, amount, ts FROM expenses WHERE user_id = ? ORDER BY ts"
+SQL_GET_LAST_10_EXPENSES = """
+    SELECT description, amount, ts
+    FROM expenses
+    WHERE user_id = ?
+    ORDER BY ts DESC
+    LIMIT 10
+"""
+SQL_GET_SPEND_TOTALS = "SELECT total_spent, count FROM spend_totals WHERE user_id = ?"
+SQL_GET_DAILY_TOTALS = """
+    SELECT day, total FROM spend_daily WHERE user_id = ? AND day >= ? ORDER BY day
+"""
+SQL_GET_MONTHLY_TOTALS = """
+    SELECT month, total FROM spend_monthly WHERE user_id = ? ORDER BY month DESC LIMIT ?
+"""
+SQL_GET_CATEGORY_TOTALS = """
+    SELECT category, total FROM spend_category WHERE user_id = ? ORDER BY total DESC LIMIT ?
+"""
+SQL_GET_SPENDING_BETWEEN = """
+    SELECT COALESCE(SUM(amount), 0), COUNT(*)
+    FROM expenses
+    WHERE user_id = ? AND ts >= ? AND ts < ?
+"""
+SQL_GET_CATEGORY_SPENDING_BETWEEN = """
+    SELECT COALESCE(SUM(amount), 0), COUNT(*)
+    FROM expenses
+    WHERE user_id = ? AND ts >= ? AND ts < ? AND (description LIKE ? OR category LIKE ?)
+"""
+# The expense entered last, whatever date it was given
+SQL_GET_LAST_EXPENSE = """
+    SELECT id, description, amount, ts, category, debited FROM expenses
+    WHERE id = (SELECT MAX(id) FROM expenses WHERE user_id = ?)
+"""
+SQL_DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ?"
+SQL_GET_DATA_VERSION = "SELECT version FROM data_version WHERE user_id = ?"
+SQL_BUMP_DATA_VERSION = """
+    INSERT INTO data_version (user_id, version) VALUES (?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+"""
+SQL_MAX_EXPENSE_ID = "SELECT COALESCE(MAX(id), 0) FROM expenses"
+SQL_INSERT_CONVERSATION = """
+    INSERT INTO conversations
+    (user_id, session_id, ts, user_message, bot_response, context, ttft_ms, latency_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Keyset pagination newest first; ?2 is the id of the oldest turn already shown
+SQL_GET_CONVERSATION_PAGE = """
+    SELECT id, ts, user_message, bot_response, ttft_ms, latency_ms
+    FROM conversations
+    WHERE user_id = ?1 AND (ts, id) < ((SELECT ts FROM conversations WHERE id = ?2), ?2)
+    ORDER BY ts DESC, id DESC
+    LIMIT ?3
+"""
+SQL_GET_LATEST_CONVERSATIONS = """
+    SELECT id, ts, user_message, bot_response, ttft_ms, latency_ms
+    FROM conversations
+    WHERE user_id = ?1
+    ORDER BY ts DESC, id DESC
+    LIMIT ?3
+"""
+SQL_GET_CONVERSATION_TS = "SELECT ts FROM conversations WHERE id = ?"
+SQL_GET_USER = "SELECT id, password FROM users WHERE username = ?"
+SQL_INSERT_USER = "INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE id = ?"
+SQL_INIT_USER_ROWS = (
+    "INSERT INTO user_data (user_id, total_money) VALUES (?, 0)",
+    "INSERT INTO spend_totals (user_id, total_spent, count) VALUES (?, 0, 0)",
+    "INSERT INTO data_version (user_id, version) VALUES (?, 0)",
+)
+
+# Hot queries and the index each must be answered from without touching the
+# table rows (see benchmarks/check_query_plans.py)
+HOT_QUERIES = {
+    "last_10_expenses": (SQL_GET_LAST_10_EXPENSES, "idx_expenses_user_ts"),
+    "expenses": (SQL_GET_EXPENSES, "idx_expenses_user_ts"),
+    "spending_between": (SQL_GET_SPENDING_BETWEEN, "idx_expenses_user_ts"),
+    "daily_totals": (SQL_GET_DAILY_TOTALS, "PRIMARY KEY"),
+    "monthly_totals": (SQL_GET_MONTHLY_TOTALS, "PRIMARY KEY"),
+    "category_totals": (SQL_GET_CATEGORY_TOTALS, "idx_spend_category_user_total"),
+}
+
+
+def explain_query_plan(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for sql."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+# Columns the expense and conversation reads return, for the archive tier
+EXPENSE_COLUMNS = ("description", "amount", "ts")
+CONVERSATION_PAGE_COLUMNS = ("id", "ts", "user_message", "bot_response", "ttft_ms", "latency_ms")
+
+
+class SpendingRepository:
+    """All reads and writes against spending_tracker.db, scoped per user.
+
+    With a categorizer (see categorizer.Categorizer), new expenses are
+    given a category on insert. With an archive (see archive.Archive),
+    reads of expenses and conversations also return archived rows; writes
+    only ever touch the hot tables, and undo_last_expense can't undo an
+    archived expense.
+    """
+
+    def __init__(self, pool, categorizer=None, archive=None):
+        self.pool = pool
+        self.categorizer = categorizer
+        self.archive = archive
+
+    def _reader(self):
+        # Hot and cold rows must come from the same side of an archiving run
+        return self.pool.connection() if self.archive is None else self.pool.snapshot()
+
+    def _category(self, description, category):
+        if category is None and self.categorizer is not None:
+            return self.categorizer.categorize(description)
+        return category
+
+    def get_total_money(self, user_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET_TOTAL_MONEY, (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def update_total_money(self, user_id, amount):
+        with self.pool.connection() as conn:
+            conn.execute(SQL_SET_TOTAL_MONEY, (amount, user_id))
+
+    def add_to_balance(self, user_id, amount):
+        with self.pool.connection() as conn:
+            conn.execute(SQL_ADD_TO_BALANCE, (amount, user_id))
+
+    def add_expense(self, user_id, description, amount, ts=None, category=None):
+        category = self._category(description, category)
+        with self.pool.connection() as conn:
+            conn.execute(SQL_INSERT_EXPENSE, (user_id, description, amount, ts or now_ts(), category, 0))
+
+    def add_expense_atomic(self, user_id, description, amount, ts=None, category=None):
+        """Debit the balance and record the expense in one transaction.
+
+        The funds check is part of the UPDATE itself, so two sessions can't
+        both spend the same money. Returns the new balance, or None if the
+        balance is too low (nothing is written in that case).
+        """
+        category = self._category(description, category)
+        with self.pool.transaction() as conn:
+            if conn.execute(SQL_DEBIT_IF_FUNDS, (amount, user_id, amount)).rowcount == 0:
+                return None
+            conn.execute(SQL_INSERT_EXPENSE, (user_id, description, amount, ts or now_ts(), category, 1))
+            return conn.execute(SQL_GET_TOTAL_MONEY, (user_id,)).fetchone()[0]
+
+    def get_expenses(self, user_id):
+        with self._reader() as conn:
+            rows = conn.execute(SQL_GET_EXPENSES, (user_id,)).fetchall()
+            if self.archive is None:
+                return rows
+            cold = self.archive.rows(conn, "expenses", user_id, EXPENSE_COLUMNS)
+        if not cold:
+            return rows
+        return list(heapq.merge(cold, rows, key=lambda row: row[2]))
+
+    def get_last_10_expenses(self, user_id):
+        with self._reader() as conn:
+            rows = conn.execute(SQL_GET_LAST_10_EXPENSES, (user_id,)).fetchall()
+            if self.archive is None:
+                return rows
+            # Archived rows can only make the list if the hot ones run out
+            # before reaching the newest archived ts
+            newest = self.archive.newest_ts(conn, "expenses", user_id)
+            if newest is None or (len(rows) == 10 and rows[-1][2] > newest):
+                return rows
+            cold = self.archive.latest(conn, "expenses", user_id, EXPENSE_COLUMNS, 10)
+        return sorted(rows + cold, key=lambda row: row[2], reverse=True)[:10]
+
+    def get_spending_totals(self, user_id):
+        """Return (total_spent, expense_count) from the running totals row."""
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET_SPEND_TOTALS, (user_id,)).fetchone()
+        return row if row else (0, 0)
+
+    def get_daily_totals(self, user_id, since):
+        """Per-day totals as [(YYYY-MM-DD, total)] for days >= since."""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_GET_DAILY_TOTALS, (user_id, since)).fetchall()
+
+    def get_monthly_totals(self, user_id, limit=12):
+        """Most recent months first as [(YYYY-MM, total)]."""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_GET_MONTHLY_TOTALS, (user_id, limit)).fetchall()
+
+    def get_category_totals(self, user_id, limit=20):
+        """Largest categories first as [(category, total)]."""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_GET_CATEGORY_TOTALS, (user_id, limit)).fetchall()
+
+    def get_spending_between(self, user_id, start_ts, end_ts, category=None):
+        """Return (total, count) for expenses with start_ts <= ts < end_ts.
+
+        With category, only expenses whose description or category contains
+        it (case-insensitively) are counted.
+        """
+        with self._reader() as conn:
+            if category is None:
+                total, count = conn.execute(SQL_GET_SPENDING_BETWEEN, (user_id, start_ts, end_ts)).fetchone()
+            else:
+                pattern = f"%{category}%"
+                total, count = conn.execute(
+                    SQL_GET_CATEGORY_SPENDING_BETWEEN, (user_id, start_ts, end_ts, pattern, pattern)
+                ).fetchone()
+            if self.archive is not None:
+                cold_total, cold_count = self.archive.spending_between(
+                    conn, user_id, start_ts, end_ts, category
+                )
+                total, count = total + cold_total, count + cold_count
+        return total, count
+
+    def undo_last_expense(self, user_id):
+        """Delete the expense entered last and refund it if it was debited.
+
+        Imported expenses never came out of the balance, so they are deleted
+        without a refund. Returns (expense, new_balance), where expense is
+        (description, amount, ts, category, debited) and can be passed to
+        restore_expense, or None if there are no expenses.
+        """
+        with self.pool.transaction() as conn:
+            row = conn.execute(SQL_GET_LAST_EXPENSE, (user_id,)).fetchone()
+            if row is None:
+                return None
+            expense_id, description, amount, ts, category, debited = row
+            conn.execute(SQL_DELETE_EXPENSE, (expense_id,))
+            if debited:
+                conn.execute(SQL_ADD_TO_BALANCE, (amount, user_id))
+            new_balance = conn.execute(SQL_GET_TOTAL_MONEY, (user_id,)).fetchone()[0]
+            return (description, amount, ts, category, bool(debited)), new_balance
+
+    def restore_expense(self, user_id, expense):
+        """Put back an expense undo_last_expense deleted, debiting it again if it was refunded.
+
+        Returns the new balance, or None if the balance no longer covers a
+        debited expense (nothing is written in that case).
+        """
+        description, amount, ts, category, debited = expense
+        with self.pool.transaction() as conn:
+            if debited and conn.execute(SQL_DEBIT_IF_FUNDS, (amount, user_id, amount)).rowcount == 0:
+                return None
+            conn.execute(SQL_INSERT_EXPENSE, (user_id, description, amount, ts, category, int(debited)))
+            return conn.execute(SQL_GET_TOTAL_MONEY, (user_id,)).fetchone()[0]
+
+    def get_data_version(self, user_id):
+        """Counter that changes whenever the user's expenses or balance change."""
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET_DATA_VERSION, (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def save_conversation(self, user_id, session_id, user_message, bot_response, context,
+                          ttft_ms=None, latency_ms=None):
+        """Store one chat turn and return its id."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                SQL_INSERT_CONVERSATION,
+                (user_id, session_id, now_ts(), user_message, bot_response, context,
+                 ttft_ms, latency_ms),
+            ).lastrowid
+
+    def get_conversation_page(self, user_id, before_id=None, limit=20):
+        """Up to limit turns older than conversation before_id (or the latest), oldest first.
+
+        Rows are (id, ts, user_message, bot_response, ttft_ms, latency_ms).
+        """
+        sql = SQL_GET_LATEST_CONVERSATIONS if before_id is None else SQL_GET_CONVERSATION_PAGE
+        with self._reader() as conn:
+            rows = conn.execute(sql, (user_id, before_id, limit)).fetchall()
+            if self.archive is not None and len(rows) < limit:
+                # Continue into the archive below the oldest row found so far
+                if rows:
+                    before = (rows[-1][1], rows[-1][0])
+                elif before_id is None:
+                    before = None
+                else:
+                    row = conn.execute(SQL_GET_CONVERSATION_TS, (before_id,)).fetchone()
+                    if row is None:
+                        row = self.archive.lookup(conn, "conversations", user_id, [before_id], ("ts",)).get(before_id)
+                    before = (row[0], before_id) if row else None
+                if before is not None or before_id is None:
+                    rows += self.archive.latest(
+                        conn, "conversations", user_id, CONVERSATION_PAGE_COLUMNS, limit - len(rows), before
+                    )
+        rows.reverse()
+        return rows
+
+    def get_user(self, username):
+        """Return (user_id, password_hash) for username, or None."""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_GET_USER, (username,)).fetchone()
+
+    def update_password(self, user_id, password_hash):
+        """Replace user_id's stored password hash (e.g. after a rehash)."""
+        with self.pool.transaction() as conn:
+            conn.execute(SQL_UPDATE_PASSWORD, (password_hash, user_id))
+
+    def create_user(self, username, password_hash):
+        """Insert a new user. Returns the new user id, or None if the username is taken."""
+        created_at = datetime.now().isoformat()
+        try:
+            with self.pool.transaction() as conn:
+                user_id = conn.execute(
+                    SQL_INSERT_USER, (username, password_hash, created_at)
+                ).lastrowid
+                for sql in SQL_INIT_USER_ROWS:
+                    conn.execute(sql, (user_id,))
+        except sqlite3.IntegrityError:
+            return None
+        return user_id
@@ -0,0 +1,88 @@
+"""Deterministic offline stand-in for the Gemini chat chain.
+
+FakeChatModel takes the same {"context", "question"} input as the chain
+built by chain.build_chat_chain and returns a string, with configurable
+latency and failure injection, so the gateway, benchmarks and load tests
+run without network access or an API key.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+
+
+class FakeQuotaError(Exception):
+    """Raised by FakeChatModel to simulate a 429 / ResourceExhausted reply."""
+
+
+class FakeChatModel:
+    """Fake chain: same output for the same input, after a simulated delay.
+
+    latency is the total time per call in seconds, ttft the delay before the
+    first streamed chunk, jitter a +/- fraction applied to both, and
+    failure_rate the probability of raising FakeQuotaError.
+    """
+
+    def __init__(self, latency=0.5, ttft=0.15, jitter=0.0, failure_rate=0.0,
+                 words=40, seed=0):
+        self.latency = latency
+        self.ttft = min(ttft, latency)
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.words = words
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _plan(self):
+        with self._lock:
+            self.calls += 1
+            scale = 1 + self._rng.uniform(-self.jitter, self.jitter)
+            fail = self._rng.random() < self.failure_rate
+        return self.latency * scale, self.ttft * scale, fail
+
+    def _chunks(self, inputs):
+        question = inputs["question"] if isinstance(inputs, dict) else str(inputs)
+        digest = hashlib.sha256(repr(inputs).encode()).hexdigest()
+        words = [f"Answer to '{question[:40]}':"]
+        words += [digest[i % 60:i % 60 + 4] for i in range(self.words)]
+        return [word + " " for word in words]
+
+    def invoke(self, inputs, config=None):
+        latency, _, fail = self._plan()
+        time.sleep(latency)
+        if fail:
+            raise FakeQuotaError("429 Resource has been exhausted (fake)")
+        return "".join(self._chunks(inputs))
+
+    async def ainvoke(self, inputs, config=None):
+        latency, _, fail = self._plan()
+        await asyncio.sleep(latency)
+        if fail:
+            raise FakeQuotaError("429 Resource has been exhausted (fake)")
+        return "".join(self._chunks(inputs))
+
+    def stream(self, inputs, config=None):
+        latency, ttft, fail = self._plan()
+        time.sleep(ttft)
+        if fail:
+            raise FakeQuotaError("429 Resource has been exhausted (fake)")
+        chunks = self._chunks(inputs)
+        gap = (latency - ttft) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            yield chunk
+
+    async def astream(self, inputs, config=None):
+        latency, ttft, fail = self._plan()
+        await asyncio.sleep(ttft)
+        if fail:
+            raise FakeQuotaError("429 Resource has been exhausted (fake)")
+        chunks = self._chunks(inputs)
+        gap = (latency - ttft) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(gap)
+            yield chunk
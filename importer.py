@@ -0,0 +1,518 @@
+"""Streaming bulk import of expenses from bank-statement CSVs and JSONL.
+
+Rows are parsed lazily and written in chunks: each chunk is staged with
+executemany() into a temp table and copied into `expenses` in a single
+transaction. Duplicates are counted per (timestamp, amount, description):
+the n-th occurrence of a key in the file is inserted only if the user had
+fewer than n such expenses before the import started. Repeated identical
+transactions in a statement are all kept, re-importing the same statement
+is a no-op, and the result doesn't depend on where chunks begin and end.
+The file is never held in memory as a whole. A chunk that shares no
+timestamp range with the user's earlier expenses skips the duplicate
+counting altogether, and its rows bypass the per-row aggregate trigger:
+the spend_* totals get one set-based update and the data version one bump
+per chunk (see benchmarks/bench_import.py).
+
+Imported rows are history: they are recorded as expenses but do not debit
+the current balance.
+
+Usage:
+    python importer.py --user USERNAME statement.csv [more.jsonl ...] [--db spending_tracker.db]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from archive import ARCHIVE_DIR, Archive
+from categorizer import DEFAULT_MODEL_FILE, Categorizer
+from db import (
+    SQL_BUMP_DATA_VERSION, SQL_MAX_EXPENSE_ID, USER_AGGREGATE_BUCKETS, ConnectionPool,
+    SpendingRepository, init_schema,
+)
+
+CHUNK_SIZE = 50000
+
+# Header names used by common Indian bank exports, matched case-insensitively
+DESCRIPTION_COLUMNS = (
+    "description", "narration", "particulars", "details", "remarks",
+    "transaction details", "merchant",
+)
+AMOUNT_COLUMNS = (
+    "amount", "debit", "debit amount", "withdrawal", "withdrawal amt.",
+    "withdrawal amount", "withdrawal amt", "dr",
+)
+DATE_COLUMNS = (
+    "timestamp", "date", "txn date", "transaction date", "value date",
+    "value dt", "posting date",
+)
+TYPE_COLUMNS = ("type", "dr/cr", "cr/dr", "transaction type")
+
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%d/%m/%y",
+    "%d-%m-%Y",
+    "%d-%m-%y",
+    "%d-%b-%Y",
+    "%d %b %Y",
+    "%d-%b-%y",
+    "%m/%d/%Y",
+)
+
+SQL_CREATE_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS import_staging (
+        description TEXT,
+        amount REAL,
+        ts INTEGER,
+        category TEXT,
+        n INTEGER,
+        total INTEGER
+    )
+"""
+# Per key seen in this import: how many expenses the user had before it
+# started (hot rows plus archived ones) and how many the file has had so far,
+# up to and including the current chunk
+SQL_CREATE_COUNTS = """
+    CREATE TEMP TABLE IF NOT EXISTS import_counts (
+        description TEXT,
+        amount REAL,
+        ts INTEGER,
+        existing INTEGER NOT NULL,
+        seen INTEGER NOT NULL,
+        PRIMARY KEY (ts, amount, description)
+    ) WITHOUT ROWID
+"""
+SQL_CREATE_ARCHIVED = """
+    CREATE TEMP TABLE IF NOT EXISTS import_archived (
+        description TEXT,
+        amount REAL,
+        ts INTEGER,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (ts, amount, description)
+    ) WITHOUT ROWID
+"""
+SQL_STAGE_ROW = """
+    INSERT INTO import_staging (description, amount, ts, category, n, total) VALUES (?, ?, ?, ?, ?, ?)
+"""
+# Rows of a chunk that can't contain duplicates need no numbering
+SQL_STAGE_NEW_ROW = "INSERT INTO import_staging (description, amount, ts, category) VALUES (?, ?, ?, ?)"
+SQL_STAGE_ARCHIVED = "INSERT OR IGNORE INTO import_archived (description, amount, ts, n) VALUES (?, ?, ?, ?)"
+# Counts existing rows (ids up to ?2, the last one before the import) for
+# keys new to this import and adds the chunk's occurrences of every key to
+# seen
+SQL_COUNT_KEYS = """
+    INSERT INTO import_counts (description, amount, ts, existing, seen)
+    SELECT k.description, k.amount, k.ts,
+           (SELECT COUNT(*) FROM expenses e
+            WHERE e.user_id = ?1 AND e.ts = k.ts AND e.amount = k.amount
+              AND e.description = k.description AND e.id <= ?2)
+           + COALESCE((SELECT a.n FROM import_archived a
+                       WHERE a.ts = k.ts AND a.amount = k.amount
+                         AND a.description = k.description), 0),
+           k.total
+    FROM import_staging k
+    WHERE k.n = 1
+    ON CONFLICT DO UPDATE SET seen = seen + excluded.seen
+"""
+SQL_COPY_NEW_ROWS = """
+    INSERT INTO expenses (user_id, description, amount, ts, category)
+    SELECT ?1, s.description, s.amount, s.ts, s.category
+    FROM import_staging s
+    JOIN import_counts c ON c.ts = s.ts AND c.amount = s.amount AND c.description = s.description
+    WHERE c.seen - s.total + s.n > c.existing
+"""
+# Whether the user had any expense before the import in a chunk's ts range
+SQL_HAS_EXISTING = """
+    SELECT 1 FROM expenses WHERE user_id = ? AND ts >= ? AND ts <= ? AND id <= ? LIMIT 1
+"""
+SQL_COPY_ALL_ROWS = """
+    INSERT INTO expenses (user_id, description, amount, ts, category)
+    SELECT ?1, description, amount, ts, category FROM import_staging
+"""
+SQL_CLEAR_STAGING = "DELETE FROM import_staging"
+# Held inside each chunk's transaction: the copied rows skip the per-row
+# aggregate trigger and are added to the spend_* tables set-based instead
+SQL_LOCK_USER = "INSERT INTO bulk_insert_lock (user_id) VALUES (?)"
+SQL_UNLOCK_USER = "DELETE FROM bulk_insert_lock WHERE user_id = ?"
+SQL_CREATE_GROUPS = """
+    CREATE TEMP TABLE IF NOT EXISTS import_groups (
+        ts INTEGER,
+        category TEXT,
+        description TEXT,
+        total REAL,
+        count INTEGER
+    )
+"""
+# The rows a chunk inserted (ids after ?2) summed per (ts, category,
+# description): one sort per chunk, after which every aggregate bucket key
+# is computed once per group instead of once per row. NOT INDEXED keeps it
+# on the rowid range of the new rows.
+SQL_GROUP_NEW_ROWS = """
+    INSERT INTO import_groups (ts, category, description, total, count)
+    SELECT ts, category, description, SUM(COALESCE(amount, 0)), COUNT(*)
+    FROM expenses NOT INDEXED WHERE id > ?2 AND user_id = ?1
+    GROUP BY ts, category, description
+"""
+SQL_ADD_GROUPS = tuple(
+    f"""
+    INSERT INTO {table} (user_id, {column}, total, count)
+    SELECT ?, {key.format(row="g")}, SUM(g.total), SUM(g.count) FROM import_groups g GROUP BY 2
+    ON CONFLICT(user_id, {column}) DO UPDATE SET
+        total = total + excluded.total, count = count + excluded.count
+"""
+    for table, (column, key) in USER_AGGREGATE_BUCKETS.items()
+) + ("""
+    INSERT INTO spend_totals (user_id, total_spent, count)
+    SELECT ?, SUM(total), SUM(count) FROM import_groups WHERE true
+    ON CONFLICT(user_id) DO UPDATE SET
+        total_spent = total_spent + excluded.total_spent, count = count + excluded.count
+""",)
+SQL_CLEAR_GROUPS = "DELETE FROM import_groups"
+SQL_CLEAR_COUNTS = ("DELETE FROM import_counts", "DELETE FROM import_archived")
+
+
+# Formats that read 03/04/2024 as March 4th; every other one is day first
+MONTH_FIRST_FORMATS = frozenset({"%m/%d/%Y"})
+
+
+class TimestampParser:
+    """Normalize statement dates to integer Unix timestamps (local time).
+
+    Statements repeat the same date on many rows and use one format
+    throughout, so results are memoized and the format of the first row
+    that parses is kept for the rest of the file. Later rows may fall back
+    to another format with the same day/month order, never the other one:
+    after 12/31/2024, 03/04/2024 is March 4th; after 31/12/2024, April 3rd.
+    """
+
+    def __init__(self, formats=DATE_FORMATS, cache_size=4096):
+        self.formats = list(formats)
+        self.format = None
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def __call__(self, raw):
+        cached = self._cache.get(raw)
+        if cached is not None:
+            return cached
+        if isinstance(raw, (int, float)):
+            return int(raw)
+        parsed = self._parse(raw.strip())
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[raw] = parsed
+        return parsed
+
+    def _parse(self, raw):
+        try:
+            value = datetime.fromisoformat(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            for fmt in self._candidates():
+                try:
+                    value = datetime.strptime(raw, fmt)
+                except ValueError:
+                    continue
+                if self.format is None:
+                    self.format = fmt
+                break
+            else:
+                raise ValueError(f"Unrecognised date: {raw!r}")
+        return int(value.timestamp())
+
+    def _candidates(self):
+        if self.format is None:
+            return self.formats
+        month_first = self.format in MONTH_FIRST_FORMATS
+        return [self.format] + [
+            fmt for fmt in self.formats
+            if fmt != self.format and (fmt in MONTH_FIRST_FORMATS) == month_first
+        ]
+
+
+def parse_amount(raw):
+    """Parse '₹1,234.50', 'Rs. 500', '-250' or 250.0 into a positive float.
+
+    Returns None for blank cells (e.g. the debit column of a credit row).
+    """
+    try:
+        # Numbers, and most statement cells, convert directly
+        return abs(float(raw))
+    except ValueError:
+        raw = raw.strip()
+    if not raw:
+        return None
+    cleaned = raw.replace(",", "").replace("₹", "").replace("INR", "")
+    if cleaned[:3].lower() == "rs.":
+        cleaned = cleaned[3:]
+    elif cleaned[:2].lower() == "rs":
+        cleaned = cleaned[2:]
+    cleaned = cleaned.strip()
+    if cleaned.endswith(("Dr", "DR", "dr")):
+        cleaned = cleaned[:-2].strip()
+    if not cleaned:
+        return None
+    return abs(float(cleaned))
+
+
+def _find_column(header, candidates):
+    lookup = {name.strip().lower(): i for i, name in enumerate(header) if name}
+    for candidate in candidates:
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def iter_csv_rows(fileobj, parse_timestamp=None):
+    """Yield (description, amount, ts) tuples from a statement CSV.
+
+    Credit rows (blank debit cell or a Cr type column) are skipped. A row
+    that can't be read raises ValueError naming its line.
+    """
+    parse_timestamp = parse_timestamp or TimestampParser()
+    # Plain csv.reader with resolved column positions; DictReader builds a
+    # dict per row and roughly halves parse throughput.
+    reader = csv.reader(fileobj)
+    header = next(reader, [])
+    desc_col = _find_column(header, DESCRIPTION_COLUMNS)
+    amount_col = _find_column(header, AMOUNT_COLUMNS)
+    date_col = _find_column(header, DATE_COLUMNS)
+    type_col = _find_column(header, TYPE_COLUMNS)
+    if desc_col is None or amount_col is None or date_col is None:
+        raise ValueError(f"CSV needs description, amount and date columns, got {header}")
+
+    row = []
+    try:
+        for row in reader:
+            if not row:
+                continue
+            if type_col is not None and row[type_col].strip().lower() in ("cr", "credit"):
+                continue
+            amount = parse_amount(row[amount_col])
+            if amount is None:
+                continue
+            yield (row[desc_col].strip(), amount, parse_timestamp(row[date_col]))
+    except IndexError:
+        raise ValueError(f"Line {reader.line_num}: expected {len(header)} columns, got {len(row)}") from None
+    except ValueError as error:
+        raise ValueError(f"Line {reader.line_num}: {error}") from error
+
+
+def iter_jsonl_rows(fileobj, parse_timestamp=None):
+    """Yield (description, amount, ts) tuples from JSON lines.
+
+    Each line is an object with description, amount and timestamp (or date)
+    keys. A line that can't be read raises ValueError naming it.
+    """
+    parse_timestamp = parse_timestamp or TimestampParser()
+    loads = json.loads
+    number = 0
+    try:
+        for number, line in enumerate(fileobj, start=1):
+            if not line.strip():
+                continue
+            record = loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            amount = parse_amount(record["amount"])
+            if amount is None:
+                continue
+            raw_date = record.get("timestamp") or record["date"]
+            yield (str(record["description"]).strip(), amount, parse_timestamp(raw_date))
+    except KeyError as error:
+        raise ValueError(f"Line {number}: missing {error.args[0]!r}") from None
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Line {number}: {error}") from error
+
+
+def iter_file_rows(fileobj, fmt):
+    if fmt == "csv":
+        return iter_csv_rows(fileobj)
+    if fmt == "jsonl":
+        return iter_jsonl_rows(fileobj)
+    raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def _stage_archived(conn, archive, user_id, chunk, newest):
+    """Stage how many archived expenses each of chunk's keys has.
+
+    They count as existing rows, the same as hot ones (see SQL_COUNT_KEYS).
+    """
+    oldest = min(row[2] for row in chunk)
+    if oldest > newest:
+        return
+    keys = {(row[2], row[1], row[0]) for row in chunk}
+    archived = Counter(archive.rows(
+        conn, "expenses", user_id, ("ts", "amount", "description"),
+        oldest, max(row[2] for row in chunk) + 1,
+    ))
+    # The chunk's own values, not the archive's NumPy scalars, get bound
+    conn.executemany(SQL_STAGE_ARCHIVED, [
+        (description, amount, ts, archived[ts, amount, description])
+        for ts, amount, description in keys if archived[ts, amount, description]
+    ])
+
+
+def _number_repeats(chunk):
+    """Add n (occurrence of the row's key within chunk) and total (the key's count in chunk)."""
+    counts = Counter(row[:3] for row in chunk)
+    if len(counts) == len(chunk):
+        return [(*row, 1, 1) for row in chunk]
+    seen = Counter()
+    numbered = []
+    for row in chunk:
+        key = row[:3]
+        seen[key] += 1
+        numbered.append((*row, seen[key], counts[key]))
+    return numbered
+
+
+def _copy_chunk(conn, user_id, chunk, start_id, archive, newest):
+    """Insert chunk's rows that aren't duplicates; returns how many were inserted."""
+    oldest = min(row[2] for row in chunk)
+    latest = max(row[2] for row in chunk)
+    if (newest is None or oldest > newest) and conn.execute(
+        SQL_HAS_EXISTING, (user_id, oldest, latest, start_id)
+    ).fetchone() is None:
+        # No key in the chunk had a row before the import, so none of them
+        # is a duplicate (the usual case for a new statement). Copying from
+        # the staging table is still much faster than inserting row by
+        # row, which sets up the insert trigger once per statement.
+        conn.executemany(SQL_STAGE_NEW_ROW, chunk)
+        copied = conn.execute(SQL_COPY_ALL_ROWS, (user_id,)).rowcount
+    else:
+        if newest is not None:
+            _stage_archived(conn, archive, user_id, chunk, newest)
+        conn.executemany(SQL_STAGE_ROW, _number_repeats(chunk))
+        conn.execute(SQL_COUNT_KEYS, (user_id, start_id))
+        copied = conn.execute(SQL_COPY_NEW_ROWS, (user_id,)).rowcount
+    conn.execute(SQL_CLEAR_STAGING)
+    return copied
+
+
+def import_expenses(pool, user_id, rows, chunk_size=CHUNK_SIZE, categorizer=None, archive=None):
+    """Insert an iterable of (description, amount, ts) rows for user_id.
+
+    With a categorizer, each row is given a category as it is staged. With
+    an archive, archived expenses count as existing rows too.
+    Returns a report dict with rows read/inserted/skipped, elapsed seconds
+    and throughput.
+    """
+    started = time.perf_counter()
+    read = inserted = 0
+    rows = iter(rows)
+    with pool.connection() as conn:
+        conn.execute(SQL_CREATE_STAGING)
+        conn.execute(SQL_CREATE_COUNTS)
+        conn.execute(SQL_CREATE_ARCHIVED)
+        conn.execute(SQL_CREATE_GROUPS)
+        for sql in SQL_CLEAR_COUNTS:
+            conn.execute(sql)
+        newest = archive.newest_ts(conn, "expenses", user_id) if archive is not None else None
+        start_id = conn.execute(SQL_MAX_EXPENSE_ID).fetchone()[0]
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            read += len(chunk)
+            if categorizer is None:
+                chunk = [(*row, None) for row in chunk]
+            else:
+                chunk = [(*row, categorizer.categorize(row[0])) for row in chunk]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                last_id = conn.execute(SQL_MAX_EXPENSE_ID).fetchone()[0]
+                conn.execute(SQL_LOCK_USER, (user_id,))
+                copied = _copy_chunk(conn, user_id, chunk, start_id, archive, newest)
+                conn.execute(SQL_UNLOCK_USER, (user_id,))
+                if copied:
+                    conn.execute(SQL_GROUP_NEW_ROWS, (user_id, last_id))
+                    for sql in SQL_ADD_GROUPS:
+                        conn.execute(sql, (user_id,))
+                    conn.execute(SQL_CLEAR_GROUPS)
+                    conn.execute(SQL_BUMP_DATA_VERSION, (user_id,))
+                inserted += copied
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "read": read,
+        "inserted": inserted,
+        "duplicates": read - inserted,
+        "seconds": elapsed,
+        "rows_per_sec": read / elapsed if elapsed else 0.0,
+    }
+
+
+def import_file(pool, user_id, fileobj, fmt, chunk_size=CHUNK_SIZE, categorizer=None, archive=None):
+    """Import an open text or binary file (e.g. a Streamlit upload).
+
+    A file that can't be read raises ValueError (a bad row stops the import
+    there; the chunks before it stay imported, and importing the fixed file
+    again won't duplicate them).
+    """
+    if not isinstance(fileobj, io.TextIOBase):
+        # utf-8-sig strips the BOM Excel puts in front of CSV exports
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        return import_expenses(pool, user_id, iter_file_rows(fileobj, fmt), chunk_size, categorizer, archive)
+    except csv.Error as error:
+        raise ValueError(f"Malformed CSV: {error}") from error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import expenses into SmartSpend AI.")
+    parser.add_argument("files", nargs="+", help="CSV or JSONL files to import")
+    parser.add_argument("--user", required=True, help="Username to import the expenses for")
+    parser.add_argument("--db", default="spending_tracker.db", help="SQLite database file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Override format detection")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--model", default=DEFAULT_MODEL_FILE, help="Categorizer model file")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="Archive directory (for duplicate checks)")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db)
+    init_schema(pool)
+    try:
+        user = SpendingRepository(pool).get_user(args.user)
+        if user is None:
+            parser.error(f"unknown user: {args.user}")
+        categorizer = Categorizer.load(args.model)
+        archive = Archive(pool, args.archive)
+        for path in args.files:
+            fmt = args.format or detect_format(path)
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                try:
+                    report = import_file(pool, user[0], f, fmt, args.chunk_size, categorizer, archive)
+                except ValueError as error:
+                    parser.exit(1, f"{path}: {error}\n")
+            print(
+                f"{path}: read {report['read']} rows, inserted {report['inserted']}, "
+                f"skipped {report['duplicates']} duplicates in {report['seconds']:.2f}s "
+                f"({report['rows_per_sec']:,.0f} rows/s)"
+            )
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""Background precomputation of the Analysis and Savings tab insights.
+
+Both tabs used to run the analytics and a blocking Gemini call under a
+spinner on every button press. Now a trigger (migration 9) marks the
+user's row in insight_jobs pending whenever their data version changes,
+and InsightWorker works through the queue on a thread pool:
+
+- a job is due once the user's writes have been quiet for DEBOUNCE
+  seconds, or MAX_DELAY seconds after the first unprocessed write, so a
+  burst of expenses (or an import) costs one recomputation;
+- running a job computes the analytics (kept in memory for the tab) and
+  both LLM texts through the response cache, and stores the texts in the
+  insights table with the data version they describe;
+- failed jobs are retried with backoff up to MAX_ATTEMPTS, then marked
+  failed until the next write or a manual refresh.
+
+The tabs render the stored text at once with its age, and request() queues
+an immediate refresh. The job table lives in SQLite, so pending work
+survives a restart. run_pending() runs due jobs inline, which with
+fake_llm.FakeChatModel is how the worker is exercised offline (see
+benchmarks/bench_insights.py).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics import analyze, summary_lines
+from context_builder import DEFAULT_TOKEN_BUDGET, budget_section, build_context
+from llm_cache import make_key
+
+DEBOUNCE = 5.0
+MAX_DELAY = 60.0
+POLL_INTERVAL = 1.0
+MAX_WORKERS = 2
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0
+ANALYTICS_CACHE_ENTRIES = 32
+
+ANALYSIS = "analysis"
+SAVINGS = "savings"
+QUESTIONS = {
+    ANALYSIS: "Please analyze my spending patterns and provide insights.",
+    SAVINGS: "Please suggest ways to save better based on my spending patterns.",
+}
+
+SQL_RESET_RUNNING = "UPDATE insight_jobs SET status = 'pending' WHERE status = 'running'"
+SQL_DUE_JOBS = """
+    SELECT user_id, data_version, forced FROM insight_jobs
+    WHERE status = 'pending' AND not_before <= ? AND (changed_at <= ? OR pending_since <= ?)
+    ORDER BY pending_since
+"""
+SQL_CLAIM = """
+    UPDATE insight_jobs SET status = 'running', started_at = ?, attempts = attempts + 1
+    WHERE user_id = ? AND status = 'pending'
+"""
+# The status/version checks leave a job alone that a new write (or request())
+# made pending again while it was running
+SQL_FINISH = """
+    UPDATE insight_jobs SET status = 'done', finished_at = ?, forced = 0, error = NULL
+    WHERE user_id = ? AND status = 'running' AND data_version = ?
+"""
+SQL_RETRY = """
+    UPDATE insight_jobs SET status = 'pending', not_before = ?, error = ?
+    WHERE user_id = ? AND status = 'running' AND data_version = ?
+"""
+SQL_FAIL = """
+    UPDATE insight_jobs SET status = 'failed', finished_at = ?, error = ?
+    WHERE user_id = ? AND status = 'running' AND data_version = ?
+"""
+SQL_REQUEST = """
+    INSERT INTO insight_jobs (user_id, data_version, status, changed_at, pending_since, forced)
+    VALUES (?, ?, 'pending', ?, ?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET
+        data_version = excluded.data_version, status = 'pending', changed_at = excluded.changed_at,
+        pending_since = excluded.pending_since, not_before = 0, attempts = 0, forced = 1
+"""
+SQL_GET_JOB = """
+    SELECT data_version, status, changed_at, started_at, finished_at, attempts, error
+    FROM insight_jobs WHERE user_id = ?
+"""
+SQL_PUT_INSIGHT = """
+    INSERT INTO insights (user_id, kind, data_version, content, computed_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, kind) DO UPDATE SET
+        data_version = excluded.data_version, content = excluded.content,
+        computed_at = excluded.computed_at
+    WHERE excluded.data_version >= insights.data_version
+"""
+SQL_GET_INSIGHTS = "SELECT kind, data_version, content, computed_at FROM insights WHERE user_id = ?"
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_context(repo, user_id, analytics):
+    """Computed numbers for the LLM to narrate on the Analysis tab."""
+    parts = ["Computed spending analytics (use these numbers as given):", *summary_lines(analytics)]
+    title, lines = budget_section(repo, user_id)
+    if lines:
+        parts += ["", f"{title}:", *lines]
+    return "\n".join(parts)
+
+
+class InsightWorker:
+    """Debounced per-user job queue that keeps the tab insights precomputed.
+
+    invoke(inputs, kind) makes the LLM call ({"context", "question"} in, text
+    out); cache, a llm_cache.ResponseCache, reuses answers for a data version
+    already seen. context_budget is the token budget of the savings context.
+    """
+
+    def __init__(self, repo, invoke, cache=None, prompt_version="",
+                 context_budget=DEFAULT_TOKEN_BUDGET, debounce=DEBOUNCE, max_delay=MAX_DELAY, poll_interval=POLL_INTERVAL,
+                 max_workers=MAX_WORKERS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.repo = repo
+        self.pool = repo.pool
+        self.invoke = invoke
+        self.cache = cache
+        self.prompt_version = prompt_version
+        self.context_budget = context_budget
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stats = {"jobs": 0, "failures": 0, "llm_calls": 0}
+        self._analytics = OrderedDict()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # Analytics
+
+    def analytics(self, user_id, data_version):
+        """analyze() result for user_id, recomputed only when data_version changes."""
+        with self._lock:
+            cached = self._analytics.get(user_id)
+            if cached is not None and cached[0] == data_version:
+                self._analytics.move_to_end(user_id)
+                return cached[1]
+        result = analyze(
+            self.pool, user_id, self.repo.get_total_money(user_id), archive=self.repo.archive
+        )
+        with self._lock:
+            cached = self._analytics.get(user_id)
+            # A job may have stored a newer version meanwhile
+            if cached is None or cached[0] <= data_version:
+                self._analytics[user_id] = (data_version, result)
+                self._analytics.move_to_end(user_id)
+                while len(self._analytics) > ANALYTICS_CACHE_ENTRIES:
+                    self._analytics.popitem(last=False)
+        return result
+
+    # Jobs
+
+    def _compute(self, user_id, kind, inputs, data_version, forced):
+        def call():
+            self._count("llm_calls")
+            return self.invoke(inputs, kind)
+
+        if self.cache is None:
+            return call()
+        question = inputs["question"]
+        if forced:
+            response = call()
+            self.cache.put(
+                make_key(self.prompt_version, question, user_id, data_version),
+                response, user_id, data_version,
+            )
+            return response
+        response, _ = self.cache.get_or_compute(
+            self.prompt_version, question, user_id, data_version, call
+        )
+        return response
+
+    def _run_job(self, user_id, data_version, forced):
+        """Recompute user_id's analytics and insight texts; False if it failed."""
+        try:
+            analytics = self.analytics(user_id, data_version)
+            contents = {}
+            if analytics["count"]:
+                contents[ANALYSIS] = self._compute(user_id, ANALYSIS, {
+                    "context": analysis_context(self.repo, user_id, analytics),
+                    "question": QUESTIONS[ANALYSIS],
+                }, data_version, forced)
+            # No retrieved history: the answer must only depend on the data version
+            contents[SAVINGS] = self._compute(user_id, SAVINGS, {
+                "context": build_context(self.repo, user_id, token_budget=self.context_budget),
+                "question": QUESTIONS[SAVINGS],
+            }, data_version, forced)
+        except Exception as error:
+            self._failed(user_id, data_version, error)
+            return False
+        now = time.time()
+        with self.pool.transaction() as conn:
+            conn.executemany(SQL_PUT_INSIGHT, [
+                (user_id, kind, data_version, content, now) for kind, content in contents.items()
+            ])
+            conn.execute(SQL_FINISH, (now, user_id, data_version))
+        self._count("jobs")
+        return True
+
+    def _failed(self, user_id, data_version, error):
+        logger.warning("Insight job for user %s failed: %s", user_id, error)
+        self._count("failures")
+        now = time.time()
+        with self.pool.transaction() as conn:
+            attempts = conn.execute(SQL_GET_JOB, (user_id,)).fetchone()[5]
+            if attempts >= self.max_attempts:
+                conn.execute(SQL_FAIL, (now, str(error), user_id, data_version))
+            else:
+                not_before = now + self.retry_delay * 2 ** (attempts - 1)
+                conn.execute(SQL_RETRY, (not_before, str(error), user_id, data_version))
+
+    def _claim(self, limit, now=None):
+        """Mark up to limit due jobs running; returns [(user_id, data_version, forced)]."""
+        now = time.time() if now is None else now
+        claimed = []
+        with self.pool.transaction() as conn:
+            due = conn.execute(SQL_DUE_JOBS, (now, now - self.debounce, now - self.max_delay))
+            for user_id, data_version, forced in due.fetchall():
+                if len(claimed) >= limit:
+                    break
+                with self._lock:
+                    if user_id in self._running:
+                        continue
+                    self._running.add(user_id)
+                conn.execute(SQL_CLAIM, (now, user_id))
+                claimed.append((user_id, data_version, bool(forced)))
+        return claimed
+
+    def _run_claimed(self, user_id, data_version, forced):
+        try:
+            return self._run_job(user_id, data_version, forced)
+        finally:
+            with self._lock:
+                self._running.discard(user_id)
+            self._wake.set()
+
+    def run_pending(self, now=None):
+        """Run every due job inline (no threads); returns how many ran."""
+        ran = 0
+        while True:
+            claimed = self._claim(self.max_workers, now)
+            if not claimed:
+                return ran
+            for job in claimed:
+                self._run_claimed(*job)
+            ran += len(claimed)
+
+    def request(self, user_id):
+        """Queue an immediate refresh of user_id's insights, bypassing the response cache."""
+        now = time.time()
+        data_version = self.repo.get_data_version(user_id)
+        with self.pool.transaction() as conn:
+            conn.execute(SQL_REQUEST, (user_id, data_version, now - self.debounce, now))
+        self._wake.set()
+
+    # Reads
+
+    def latest(self, user_id):
+        """{kind: {"data_version", "content", "computed_at"}} of the stored insights."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_GET_INSIGHTS, (user_id,)).fetchall()
+        return {
+            kind: {"data_version": data_version, "content": content, "computed_at": computed_at}
+            for kind, data_version, content, computed_at in rows
+        }
+
+    def status(self, user_id):
+        """user_id's job: {"data_version", "status", "changed_at", ...}, or None."""
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET_JOB, (user_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("data_version", "status", "changed_at", "started_at", "finished_at", "attempts", "error")
+        return dict(zip(keys, row))
+
+    # Worker threads
+
+    def start(self):
+        """Start the dispatcher thread and the job pool (jobs left running are requeued)."""
+        if self._thread is not None:
+            return
+        with self.pool.connection() as conn:
+            conn.execute(SQL_RESET_RUNNING)
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="insights")
+        self._thread = threading.Thread(target=self._dispatch, name="insight-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                with self._lock:
+                    free = self.max_workers - len(self._running)
+                for job in self._claim(free) if free > 0 else ():
+                    self._executor.submit(self._run_claimed, *job)
+            except Exception:
+                logger.exception("Claiming insight jobs failed")
+            self._wake.wait(self.poll_interval)
+
+    def close(self):
+        """Stop taking jobs and wait for the running ones."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,110 @@
+"""Persistent cache for LLM responses.
+
+The Analysis and Savings tabs send fixed questions, so as long as the
+spending data hasn't changed the answer can be reused instead of paying for
+another Gemini round-trip. Entries are keyed on the system prompt version,
+the normalized question, the user and their data version counter, which
+triggers bump on every expense or balance change; entries for older data
+versions are dropped as soon as a newer one is written. Expired (TTL)
+entries are dropped on read, and the least recently used entries are
+evicted once the cache is full.
+"""
+import hashlib
+import re
+import threading
+import time
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+
+SQL_GET = "SELECT response, created_at FROM llm_cache WHERE key = ?"
+SQL_TOUCH = "UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?"
+SQL_DELETE = "DELETE FROM llm_cache WHERE key = ?"
+SQL_PUT = """
+    INSERT OR REPLACE INTO llm_cache (key, user_id, response, data_version, created_at, last_used, hits)
+    VALUES (?, ?, ?, ?, ?, ?, 0)
+"""
+SQL_DELETE_STALE = "DELETE FROM llm_cache WHERE user_id = ? AND data_version < ?"
+SQL_EVICT_LRU = """
+    DELETE FROM llm_cache WHERE key IN (
+        SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+    )
+"""
+SQL_COUNT = "SELECT COUNT(*) FROM llm_cache"
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+def make_key(prompt_version, question, user_id, data_version):
+    raw = "\x1f".join(
+        (prompt_version, normalize_question(question), str(user_id), str(data_version))
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL, LRU eviction and hit stats."""
+
+    def __init__(self, pool, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, key):
+        """Return the cached response for key, or None."""
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_GET, (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute(SQL_DELETE, (key,))
+                self._count("evictions")
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            conn.execute(SQL_TOUCH, (now, key))
+        self._count("hits")
+        return row[0]
+
+    def put(self, key, response, user_id, data_version):
+        """Store a response and drop the user's entries for older data versions."""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            evicted = conn.execute(SQL_DELETE_STALE, (user_id, data_version)).rowcount
+            conn.execute(SQL_PUT, (key, user_id, response, data_version, now, now))
+            evicted += conn.execute(SQL_EVICT_LRU, (self.max_entries,)).rowcount
+        if evicted:
+            self._count("evictions", evicted)
+
+    def get_or_compute(self, prompt_version, question, user_id, data_version, compute):
+        """Return (response, hit) for question, calling compute() on a miss."""
+        key = make_key(prompt_version, question, user_id, data_version)
+        response = self.get(key)
+        if response is not None:
+            return response, True
+        response = compute()
+        self.put(key, response, user_id, data_version)
+        return response, False
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            entries = conn.execute(SQL_COUNT).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
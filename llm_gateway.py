@@ -0,0 +1,221 @@
+"""Asyncio gateway in front of the Gemini chat chain.
+
+All LLM calls (chat, analysis, savings advice) go through one LLMGateway per
+process. The gateway runs its own event loop on a background thread and
+applies, in order:
+
+- request coalescing: identical in-flight inputs share one model call,
+- token-bucket rate limiting to stay under the API quota,
+- a concurrency semaphore bounding simultaneous model calls,
+- a per-attempt timeout,
+- retries with exponential backoff and full jitter on quota/transient errors.
+
+Streamlit's worker threads call the blocking invoke()/stream() wrappers and
+wait on the loop, so a slow call no longer ties up anything but its own
+session. The wrapped runnable only needs ainvoke() and astream(), which the
+LangChain chain and fake_llm.FakeChatModel both provide.
+"""
+import asyncio
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+
+MAX_CONCURRENCY = 4
+RATE_PER_SECOND = 2.0    # sustained requests/s (Gemini flash free tier: 15/min)
+BURST = 5
+MAX_RETRIES = 3
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+TIMEOUT = 30.0
+
+# Substrings of error messages/types that are worth retrying
+RETRYABLE_MARKERS = (
+    "429", "resourceexhausted", "resource has been exhausted", "quota",
+    "rate limit", "503", "unavailable", "deadline", "timeout",
+)
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RETRYABLE_MARKERS)
+
+
+def request_key(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMGateway:
+    """Rate-limited, retrying, coalescing front for an async runnable."""
+
+    def __init__(self, runnable, max_concurrency=MAX_CONCURRENCY, rate=RATE_PER_SECOND,
+                 burst=BURST, max_retries=MAX_RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, timeout=TIMEOUT, retryable=is_retryable):
+        self.runnable = runnable
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retryable = retryable
+        self.stats = {"requests": 0, "calls": 0, "coalesced": 0, "retries": 0,
+                      "timeouts": 0, "failures": 0}
+        self._in_flight = {}
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Created on the gateway loop by _setup()
+        self._semaphore = None
+        self._bucket = None
+
+    # Event loop management
+
+    def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(self.rate, self.burst)
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-gateway", daemon=True
+                )
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._async_setup(), self._loop).result()
+        return self._loop
+
+    async def _async_setup(self):
+        self._setup()
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+    # Async API (must run on the gateway loop; see invoke/stream for threads)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _call(self, inputs):
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    self.stats["calls"] += 1
+                    return await asyncio.wait_for(self.runnable.ainvoke(inputs), self.timeout)
+            except Exception as error:
+                if isinstance(error, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if attempt >= self.max_retries or not self.retryable(error):
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+    async def ainvoke(self, inputs):
+        """Return the model's answer for inputs, sharing identical in-flight calls."""
+        if self._semaphore is None:
+            self._setup()
+        self.stats["requests"] += 1
+        key = request_key(inputs)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._call(inputs))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def astream(self, inputs):
+        """Yield chunks; retries apply only until the first chunk arrives."""
+        if self._semaphore is None:
+            self._setup()
+        self.stats["requests"] += 1
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            started = False
+            try:
+                async with self._semaphore:
+                    self.stats["calls"] += 1
+                    stream = self.runnable.astream(inputs).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            return
+                        started = True
+                        yield chunk
+            except Exception as error:
+                if isinstance(error, asyncio.TimeoutError):
+                    self.stats["timeouts"] += 1
+                if started or attempt >= self.max_retries or not self.retryable(error):
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+    # Blocking wrappers for Streamlit threads
+
+    def invoke(self, inputs):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.ainvoke(inputs), loop).result()
+
+    def stream(self, inputs):
+        loop = self._ensure_loop()
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(inputs):
+                    chunks.put(chunk)
+            except BaseException as error:
+                chunks.put(error)
+            finally:
+                chunks.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), loop)
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
@@ -0,0 +1,392 @@
+"""In-process metrics for the chat hot path.
+
+A Registry holds counters and latency histograms keyed by name and labels.
+Timings are taken with the timer() context manager or the timed()
+decorator (milliseconds, like the ttft_ms/latency_ms columns), and
+instrument() wraps every public method of an object (e.g. the repository)
+so each call is timed under an "op" label.
+
+Each histogram keeps cumulative buckets for Prometheus plus a window of the
+last WINDOW observations, from which p50/p95/p99 are computed; the window
+makes a regression visible within a few hundred calls instead of being
+averaged away by everything since startup.
+
+Readouts:
+- summary(): rows for display (count, p50, p95, p99 per series),
+- render_prometheus() / write_prometheus(path) / serve_prometheus(port):
+  Prometheus text exposition as a string, a file for the node_exporter
+  textfile collector, or an HTTP /metrics endpoint on a daemon thread,
+- sinks: callables receiving one dict per timed event; JsonLogSink appends
+  them as JSON lines, which `python metrics.py metrics.jsonl` summarizes
+  (count and p50/p95/p99 per series) after a load test or a day of use.
+"""
+import argparse
+import atexit
+import bisect
+import functools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+# The JSON log is written through a buffer flushed at most this often
+LOG_FLUSH_INTERVAL = 1.0
+# JsonLogSink rotates to path.1 ... path.LOG_BACKUPS past this size
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUPS = 2
+
+logger = logging.getLogger(__name__)
+_json = json.JSONEncoder(default=str, separators=(",", ":"))
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Cumulative buckets plus a window of recent observations."""
+
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS, window=WINDOW):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        """{q: value} over the recent window (None when nothing was observed)."""
+        with self._lock:
+            ordered = sorted(self.recent)
+        return {q: _percentile(ordered, q) for q in quantiles}
+
+
+class Registry:
+    def __init__(self):
+        self._series = {}
+        self._help = {}
+        self._kinds = {}
+        self._sinks = []
+        self._lock = threading.Lock()
+
+    # Series
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    if self._kinds.setdefault(name, cls.kind) != cls.kind:
+                        raise ValueError(f"{name} is already registered as a {self._kinds[name]}")
+                    if help_text:
+                        self._help.setdefault(name, help_text)
+                    series = self._series[key] = cls(**kwargs)
+        return series
+
+    def counter(self, name, help_text="", **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS_MS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    # Timing
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+
+    def emit(self, event):
+        for sink in self._sinks:
+            try:
+                sink(event)
+            except Exception:
+                logger.exception("Metrics sink failed")
+
+    @contextmanager
+    def timer(self, name, help_text="", **labels):
+        """Time the block into histogram name (ms).
+
+        Yields a dict; anything the block puts in it (e.g. token counts) is
+        added to the event sent to the sinks.
+        """
+        extra = {}
+        error = None
+        started = time.perf_counter()
+        try:
+            yield extra
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            self._record(self.histogram(name, help_text, **labels), name, labels, started, error, extra)
+
+    def _record(self, histogram, name, labels, started, error, extra):
+        elapsed = (time.perf_counter() - started) * 1000
+        histogram.observe(elapsed)
+        if self._sinks:
+            event = {"ts": time.time(), "metric": name, "ms": round(elapsed, 3), **labels, **extra}
+            if error:
+                event["error"] = error
+            self.emit(event)
+
+    def timed(self, name, help_text="", **labels):
+        """Decorator form of timer(), with the histogram looked up once."""
+        def decorator(func):
+            histogram = self.histogram(name, help_text, **labels)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                error = None
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except BaseException as exc:
+                    error = type(exc).__name__
+                    raise
+                finally:
+                    self._record(histogram, name, labels, started, error, {})
+            return wrapper
+        return decorator
+
+    def instrument(self, obj, name, help_text="", label="op"):
+        """Time every public method of obj under name, labelled by method name.
+
+        Wraps the bound methods on the instance, so other instances of the
+        class are left alone. Returns obj.
+        """
+        for attr in dir(obj):
+            if attr.startswith("_"):
+                continue
+            method = getattr(obj, attr)
+            if callable(method) and hasattr(method, "__self__"):
+                setattr(obj, attr, self.timed(name, help_text, **{label: attr})(method))
+        return obj
+
+    # Readouts
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._series.items(), key=lambda item: item[0])
+
+    def summary(self):
+        """[{name, labels, count, sum_ms, p50, p95, p99}] for histograms, sorted by name."""
+        rows = []
+        for (name, labels), series in self._items():
+            if series.kind != "histogram" or not series.count:
+                continue
+            quantiles = series.quantiles()
+            rows.append({
+                "name": name, "labels": dict(labels), "count": series.count, "sum_ms": series.sum,
+                "p50": quantiles[0.5], "p95": quantiles[0.95], "p99": quantiles[0.99],
+            })
+        return rows
+
+    def counters(self):
+        return {
+            (name, labels): series.value
+            for (name, labels), series in self._items() if series.kind == "counter"
+        }
+
+    def render_prometheus(self):
+        lines = []
+        by_name = {}
+        for (name, labels), series in self._items():
+            by_name.setdefault(name, []).append((labels, series))
+        for name, entries in by_name.items():
+            kind = self._kinds[name]
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, series in entries:
+                if kind == "counter":
+                    lines.append(f"{name}{_label_text(labels)} {series.value}")
+                    continue
+                with series._lock:
+                    counts = list(series.bucket_counts)
+                    total, count = series.sum, series.count
+                cumulative = 0
+                for bound, bucket_count in zip(series.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    lines.append(f"{name}_bucket{_label_text(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labels)} {total}")
+                lines.append(f"{name}_count{_label_text(labels)} {count}")
+            if kind == "histogram":
+                # Percentiles over the recent window, as a separate summary
+                lines.append(f"# HELP {name}_recent Quantiles over the last {WINDOW} observations")
+                lines.append(f"# TYPE {name}_recent summary")
+                for labels, series in entries:
+                    for q, value in series.quantiles().items():
+                        if value is not None:
+                            lines.append(f"{name}_recent{_label_text(labels, [('quantile', q)])} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the exposition to path atomically (textfile collector format)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """Serve /metrics on a daemon thread; returns the HTTP server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+class JsonLogSink:
+    """Append each timed event to path as one JSON line.
+
+    Lines are buffered and flushed every LOG_FLUSH_INTERVAL seconds (and
+    at exit), so logging doesn't cost a write() per event. Once the file
+    reaches max_bytes it is rotated like logging's RotatingFileHandler
+    (path.1 is the newest of the backups kept), so at most
+    (backups + 1) * max_bytes is ever on disk.
+    """
+
+    def __init__(self, path, flush_interval=LOG_FLUSH_INTERVAL, max_bytes=LOG_MAX_BYTES,
+                 backups=LOG_BACKUPS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+        atexit.register(self.close)
+
+    def __call__(self, event):
+        line = _json.encode(event) + "\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._size + len(line) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(line)
+            # The encoder escapes non-ASCII, so characters are bytes
+            self._size += len(line)
+            now = time.monotonic()
+            if now - self._flushed >= self.flush_interval:
+                self._file.flush()
+                self._flushed = now
+
+    def _rotate(self):
+        self._file.close()
+        for number in range(self.backups, 0, -1):
+            source = f"{self.path}.{number - 1}" if number > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{number}")
+        if not self.backups:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def summarize_log(path):
+    """Replay a JsonLogSink file into a fresh Registry and return its summary()."""
+    registry = Registry()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            name, ms = event.pop("metric"), event.pop("ms")
+            labels = {
+                key: value for key, value in event.items()
+                if key not in ("ts", "error") and not key.endswith("_tokens")
+            }
+            registry.histogram(name, **labels).observe(ms)
+    return registry.summary()
+
+
+# Process-wide registry used by the app
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+instrument = REGISTRY.instrument
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency percentiles from a metrics JSON log")
+    parser.add_argument("log", help="file written by JsonLogSink (e.g. metrics.jsonl)")
+    args = parser.parse_args(argv)
+
+    print(f"{'series':<48} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in summarize_log(args.log):
+        series = row["name"] + _label_text(row["labels"].items())
+        print(f"{series:<48} {row['count']:>8} {row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
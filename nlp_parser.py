@@ -0,0 +1,338 @@
+"""Local parser for chat commands that don't need the LLM.
+
+Recognizes expense and income entries, spending queries over date ranges
+and categories, balance checks and "undo last" / "restore", using patterns compiled
+once at import. Anything that doesn't match returns action None and goes to
+Gemini as before.
+
+parse_command() returns the same dict shape parse_nlp_input always has
+(action, description, amount, start_date, end_date) plus category. Actions:
+
+- add_expense:    "spent ₹1,250.50 on groceries yesterday", "paid 200 for bus on 03/02/2025",
+                  "spent 500 on food last week" (the period is dated, not kept in the description)
+- add_income:     "received 5000 salary", "add rs 2000 to balance"
+- query_spending: "show my food spending last week", "how much did I spend this month",
+                  "spending between 2025-01-01 and 2025-01-31"
+- show_balance:   "what's my balance"
+- undo_last:      "undo last", "delete last expense"
+- restore_last:   "restore", "redo", "undo undo" (puts back what undo_last removed)
+
+Writes are only recognized as commands at the start of the message, never
+in a question ("should I add 5000 to my emergency fund?"), never for a
+zero amount, and never with a second amount in the description ("spent
+500 on food and 200 on travel"); income also needs a currency marker or
+an income-like phrase after the amount ("from dad", "salary", "to my
+balance"). Spending queries need an explicit form ("how much did I
+spend", "show my ... spending", "total spent"), and a period that is
+mentioned but not understood ("in 2024") sends the message to the LLM
+rather than answering for the current month.
+"""
+import re
+from datetime import datetime, timedelta
+
+MONTHS = {
+    name: i
+    for i, names in enumerate(
+        [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+         ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+         ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"),
+         ("dec", "december")],
+        start=1,
+    )
+    for name in names
+}
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+WEEKDAYS = {
+    name: i
+    for i, name in enumerate(["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"])
+}
+_WEEKDAY = "|".join(WEEKDAYS)
+
+AMOUNT = (
+    r"(?P<prefix>₹|rs\.?|inr|rupees)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)"
+    r"\s*(?P<suffix>₹|rs\.?|rupees|inr|/-)?"
+)
+DATE = (
+    rf"(?:\d{{4}}-\d{{1,2}}-\d{{1,2}}"
+    rf"|\d{{1,2}}[/-]\d{{1,2}}[/-]\d{{2,4}}"
+    rf"|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:{_MONTH})(?:\s+\d{{4}})?"
+    rf"|(?:{_MONTH})\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?)"
+)
+# When an expense happened; matched at the end of the message and dated by _when()
+WHEN = (
+    rf"(?P<when>today|tonight|this\s+(?:morning|afternoon|evening)|yesterday|last\s+night"
+    rf"|(?:the\s+)?day\s+before\s+yesterday|(?P<days_ago>\d+)\s+days?\s+ago"
+    rf"|(?P<week>last\s+week|a\s+week\s+ago)|(?P<month>last\s+month|a\s+month\s+ago)"
+    rf"|(?P<last>last\s+|on\s+)?(?P<weekday>{_WEEKDAY})|(?:on\s+)?(?P<date>{DATE}))"
+)
+
+# Cheap gate: if none of these words appear it's ordinary chat
+COMMAND_WORDS = re.compile(
+    r"\b(?:spent|spend|spending|paid|pay|bought|received|receive|earned|got|add|added|"
+    r"credit|credited|income|salary|undo|delete|remove|restore|redo|balance|how much|total|show)\b"
+)
+
+# Questions never run a write; they go to the LLM
+QUESTION_RE = re.compile(
+    r"^(?:how|what|why|when|where|which|who|should|shall|can|could|would|will|is|are|am|"
+    r"do|does|did|may|might)\b"
+)
+SUBJECT = r"(?:i\s+(?:have\s+|just\s+)?|i've\s+)?"
+EXPENSE_RE = re.compile(
+    rf"^{SUBJECT}(?:spent|paid|bought)\s+{AMOUNT}\s+(?:on|for)\s+(?P<description>.+?)"
+    rf"(?:\s+{WHEN})?\s*[.!]?$"
+)
+EXPENSE_FOR_RE = re.compile(
+    rf"^{SUBJECT}(?:spent|paid)\s+(?:on|for)\s+(?P<description>.+?)\s+{AMOUNT}(?:\s+{WHEN})?\s*[.!]?$"
+)
+INCOME_RE = re.compile(
+    rf"^{SUBJECT}(?:received|earned|got|add|added|credit|credited|deposit|deposited)\s+{AMOUNT}"
+    rf"(?:\s+(?:(?P<preposition>as|of|from|to|for|in)\s+)?(?P<description>.+?))?\s*[.!]?$"
+)
+INCOME_SOURCE_RE = re.compile(
+    r"^(?:my\s+)?(?:salary|stipend|allowance|pocket\s+money|income|bonus|refund|cashback|"
+    r"scholarship|wages?|interest)\b"
+)
+BALANCE_TARGET_RE = re.compile(r"^(?:my\s+)?(?:balance|account|wallet|bank)\b")
+DIGIT_RE = re.compile(r"\d")
+UNDO_RE = re.compile(r"^\s*(?:undo|delete|remove)\s+(?:the\s+)?last(?:\s+(?:expense|entry|one))?\s*[.!]?$")
+RESTORE_RE = re.compile(
+    r"^\s*(?:restore|redo|undo\s+(?:the\s+)?undo)(?:\s+(?:it|that|(?:the\s+)?last(?:\s+(?:expense|entry|one))?))?"
+    r"\s*[.!]?$"
+)
+BALANCE_RE = re.compile(
+    r"^(?:what(?:'s| is)\s+my\s+|show\s+(?:me\s+)?my\s+|my\s+|current\s+|check\s+(?:my\s+)?)?"
+    r"(?:current\s+)?balance$"
+)
+QUERY_RE = re.compile(
+    r"^(?:(?:can|could)\s+you\s+|please\s+)?(?:"
+    r"how\s+much\s+(?:did|have)\s+i\s+(?:spen[dt]|paid)"
+    r"|what\s+did\s+i\s+spend"
+    r"|(?:what(?:'s|\s+is|\s+was)\s+)?(?:my\s+|the\s+)?total\s+(?:spen[dt]|spending|expenses?)"
+    r"|show(?:\s+me)?\s+my\s+(?:[a-z]+\s+)?(?:spending|expenses?)"
+    r"|(?:my\s+)?(?:[a-z]+\s+)?spending\s+(?=today|yesterday|this|last|past|between|from|since|in)"
+    r")\b"
+)
+QUERY_CATEGORY_RES = (
+    re.compile(r"\bon\s+(?P<category>[a-z][\w ]*?)(?=\s+(?:today|yesterday|this|last|in|since|between|from|during)\b|\s*\??$)"),
+    re.compile(r"\bmy\s+(?P<category>[a-z][\w]*?)\s+(?:spending|expenses|expense)\b"),
+)
+RANGE_RES = (
+    ("today", re.compile(r"\btoday\b")),
+    ("yesterday", re.compile(r"\byesterday\b")),
+    ("this_week", re.compile(r"\bthis\s+week\b")),
+    ("last_week", re.compile(r"\blast\s+week\b")),
+    ("this_month", re.compile(r"\bthis\s+month\b")),
+    ("last_month", re.compile(r"\blast\s+month\b")),
+    ("this_year", re.compile(r"\bthis\s+year\b")),
+    ("last_n_days", re.compile(r"\b(?:last|past)\s+(?P<n>\d+)\s+days?\b")),
+    ("between", re.compile(rf"\b(?:between|from)\s+(?P<start>{DATE})\s+(?:and|to|-)\s+(?P<end>{DATE})")),
+    ("since", re.compile(rf"\bsince\s+(?P<start>{DATE})")),
+    ("in_month", re.compile(rf"\bin\s+(?P<month>{_MONTH})(?:\s+(?P<year>\d{{4}}))?\b")),
+)
+# Mentions of a period; if parse_range() understands none of it, the LLM answers
+TIME_HINT_RE = re.compile(
+    rf"\b(?:\d{{4}}|{_MONTH}|today|yesterday|tomorrow|weeks?|months?|years?|days?|ago|since|"
+    rf"between|before|after|during|until|till|last|past|previous|next|quarter|semester|"
+    rf"weekend|q[1-4])\b|\d[/-]\d"
+)
+DATE_NUMERIC_RE = re.compile(r"(\d{1,4})[/-](\d{1,2})[/-](\d{1,4})")
+DATE_DAY_MONTH_RE = re.compile(rf"(\d{{1,2}})(?:st|nd|rd|th)?\s+({_MONTH})(?:\s+(\d{{4}}))?")
+DATE_MONTH_DAY_RE = re.compile(rf"({_MONTH})\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s+(\d{{4}}))?")
+STOPWORD_CATEGORIES = {"my", "it", "that", "this", "everything", "all", "things", "stuff", "total"}
+
+
+def _empty():
+    return {"action": None, "description": None, "amount": None,
+            "start_date": None, "end_date": None, "category": None}
+
+
+def parse_amount(text):
+    return float(text.replace(",", ""))
+
+
+def parse_date(text, today):
+    """Parse an absolute date (dd/mm/yyyy, yyyy-mm-dd, '3 March', 'March 3 2025')."""
+    text = text.strip()
+    match = DATE_NUMERIC_RE.fullmatch(text)
+    if match:
+        a, b, c = match.groups()
+        if len(a) == 4:
+            year, month, day = int(a), int(b), int(c)
+        else:
+            # Indian convention: day first
+            day, month, year = int(a), int(b), int(c)
+            if year < 100:
+                year += 2000
+        return datetime(year, month, day)
+    match = DATE_DAY_MONTH_RE.fullmatch(text)
+    if match:
+        day, month, year = match.groups()
+    else:
+        match = DATE_MONTH_DAY_RE.fullmatch(text)
+        if not match:
+            raise ValueError(f"Unrecognised date: {text!r}")
+        month, day, year = match.groups()
+    return datetime(int(year) if year else today.year, MONTHS[month], int(day))
+
+
+def _start_of_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _when(match, today):
+    when = match.group("when")
+    if not when:
+        return today
+    if when in ("yesterday", "last night"):
+        return today - timedelta(days=1)
+    if when.endswith("day before yesterday"):
+        return today - timedelta(days=2)
+    if match.group("days_ago"):
+        return today - timedelta(days=int(match.group("days_ago")))
+    if match.group("week"):
+        return today - timedelta(days=7)
+    if match.group("month"):
+        # Same day last month, or its last day if that month is shorter
+        end_of_last_month = today.replace(day=1) - timedelta(days=1)
+        return end_of_last_month.replace(day=min(today.day, end_of_last_month.day))
+    if match.group("weekday"):
+        days_back = (today.weekday() - WEEKDAYS[match.group("weekday")]) % 7
+        if days_back == 0 and (match.group("last") or "").startswith("last"):
+            days_back = 7
+        return today - timedelta(days=days_back)
+    if not match.group("date"):
+        # today, tonight, this morning/afternoon/evening
+        return today
+    return parse_date(match.group("date"), today).replace(
+        hour=today.hour, minute=today.minute, second=today.second
+    )
+
+
+def parse_range(text, today):
+    """Return (start, end) datetimes for the period mentioned in text, or None.
+
+    end is exclusive.
+    """
+    midnight = _start_of_day(today)
+    for name, pattern in RANGE_RES:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if name == "today":
+            return midnight, midnight + timedelta(days=1)
+        if name == "yesterday":
+            return midnight - timedelta(days=1), midnight
+        if name == "this_week":
+            start = midnight - timedelta(days=midnight.weekday())
+            return start, midnight + timedelta(days=1)
+        if name == "last_week":
+            start = midnight - timedelta(days=midnight.weekday() + 7)
+            return start, start + timedelta(days=7)
+        if name == "this_month":
+            return midnight.replace(day=1), midnight + timedelta(days=1)
+        if name == "last_month":
+            end = midnight.replace(day=1)
+            return (end - timedelta(days=1)).replace(day=1), end
+        if name == "this_year":
+            return midnight.replace(month=1, day=1), midnight + timedelta(days=1)
+        if name == "last_n_days":
+            return midnight - timedelta(days=int(match.group("n")) - 1), midnight + timedelta(days=1)
+        if name == "between":
+            start = parse_date(match.group("start"), today)
+            end = parse_date(match.group("end"), today)
+            return start, end + timedelta(days=1)
+        if name == "since":
+            return parse_date(match.group("start"), today), midnight + timedelta(days=1)
+        if name == "in_month":
+            year = int(match.group("year") or today.year)
+            start = datetime(year, MONTHS[match.group("month")], 1)
+            end = (start + timedelta(days=32)).replace(day=1)
+            return start, end
+    return None
+
+
+def _query_category(text):
+    for pattern in QUERY_CATEGORY_RES:
+        match = pattern.search(text)
+        if match:
+            category = match.group("category").strip()
+            if category and category not in STOPWORD_CATEGORIES:
+                return category
+    return None
+
+
+def _is_income(match):
+    """Whether an INCOME_RE match reads as money coming in rather than a figure of speech."""
+    marked = match.group("prefix") or match.group("suffix")
+    preposition, description = match.group("preposition"), match.group("description")
+    if preposition == "to":
+        return bool(BALANCE_TARGET_RE.match(description))
+    if marked or preposition in ("from", "as"):
+        return True
+    return bool(description and INCOME_SOURCE_RE.match(description))
+
+
+def parse_command(user_input, today=None):
+    """Parse a chat message into a local command dict (action None if not a command)."""
+    text = user_input.strip().lower()
+    parsed = _empty()
+    if not COMMAND_WORDS.search(text):
+        return parsed
+    today = today or datetime.now()
+
+    try:
+        if UNDO_RE.match(text):
+            parsed["action"] = "undo_last"
+            return parsed
+
+        if RESTORE_RE.match(text):
+            parsed["action"] = "restore_last"
+            return parsed
+
+        if BALANCE_RE.match(text.rstrip("?!. ")):
+            parsed["action"] = "show_balance"
+            return parsed
+
+        question = text.endswith("?") or QUESTION_RE.match(text)
+
+        match = None if question else EXPENSE_RE.match(text) or EXPENSE_FOR_RE.match(text)
+        if match:
+            amount = parse_amount(match.group("amount"))
+            description = match.group("description").strip()
+            # "spent 500 on food and 200 on travel": more than one expense
+            if amount <= 0 or DIGIT_RE.search(description):
+                return parsed
+            parsed["action"] = "add_expense"
+            parsed["amount"] = amount
+            parsed["description"] = description
+            parsed["start_date"] = parsed["end_date"] = _when(match, today)
+            return parsed
+
+        match = None if question else INCOME_RE.match(text)
+        if match and _is_income(match):
+            amount = parse_amount(match.group("amount"))
+            if amount <= 0:
+                return parsed
+            parsed["action"] = "add_income"
+            parsed["amount"] = amount
+            description = match.group("description")
+            parsed["description"] = description.strip() if description else None
+            return parsed
+
+        if QUERY_RE.match(text):
+            period = parse_range(text, today)
+            if period is None:
+                if TIME_HINT_RE.search(text):
+                    return parsed
+                midnight = _start_of_day(today)
+                period = midnight.replace(day=1), midnight + timedelta(days=1)
+            parsed["action"] = "query_spending"
+            parsed["category"] = _query_category(text)
+            parsed["start_date"], parsed["end_date"] = period
+            return parsed
+    except ValueError:
+        # e.g. "spent 1.2.3 on x" or an impossible date: let the LLM handle it
+        return _empty()
+
+    return parsed
@@ -0,0 +1,68 @@
+"""Per-section timing of Streamlit reruns.
+
+Every widget interaction reruns main() top to bottom, so the time a user
+waits is the sum of its sections (sidebar, the active tab, ...). A
+RerunProfiler is created once per session; main() wraps each section in
+profiler.section(name) and calls finish() at the end of the run. The last
+rerun's timings and a rolling average over the last `history` reruns
+(counting only the reruns that ran each section) are available from
+report() for display in the sidebar.
+
+Sections that end the script early (st.rerun() and st.stop() raise) are
+still timed; such a run is closed at the top of the next one, with its
+total taken up to the end of its last section.
+"""
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+HISTORY_RERUNS = 20
+
+
+class RerunProfiler:
+    """Wall-clock time per named section, for the current and recent reruns."""
+
+    def __init__(self, history=HISTORY_RERUNS):
+        self.runs = deque(maxlen=history)
+        self.reruns = 0
+        self._current = {}
+        self._started = None
+        self._last_end = None
+
+    def start(self):
+        """Begin a rerun, closing one that ended without finish()."""
+        if self._started is not None:
+            self.finish(self._last_end)
+        self._current = {}
+        self._started = self._last_end = time.perf_counter()
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last_end = time.perf_counter()
+            elapsed = (self._last_end - started) * 1000
+            self._current[name] = self._current.get(name, 0.0) + elapsed
+
+    def finish(self, ended=None):
+        if self._started is None:
+            return
+        ended = ended or time.perf_counter()
+        self._current["total"] = (ended - self._started) * 1000
+        self.runs.append(self._current)
+        self.reruns += 1
+        self._started = None
+
+    def report(self):
+        """[(section, last ms, average ms)] ordered as the last rerun ran them."""
+        if not self.runs:
+            return []
+        totals, counts = defaultdict(float), defaultdict(int)
+        for run in self.runs:
+            for name, ms in run.items():
+                totals[name] += ms
+                counts[name] += 1
+        last = self.runs[-1]
+        return [(name, last[name], totals[name] / counts[name]) for name in last]
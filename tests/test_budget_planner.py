@@ -0,0 +1,36 @@
+"""Which chat messages the local budget planner answers."""
+import pytest
+
+from budget_planner import parse_budget_request
+
+
+@pytest.mark.parametrize("text, city, income", [
+    ("Make me a budget for Pune", "Pune", None),
+    ("create a monthly budget for bombay with stipend of 25000", "Mumbai", 25000),
+    ("can you make a budget for Mumbia", "Mumbai", None),
+    ("give me a budget for gurgaon, I earn 1.2 lakh", "Gurugram", 120000),
+    ("budget planner for Bhopal", "Bhopal", None),
+    ("create a budget for me", None, None),
+    ("monthly budget for Delhi", "Delhi", None),
+    ("spending plan, I get 15k", None, 15000),
+])
+def test_plan_request(text, city, income):
+    request = parse_budget_request(text)
+    assert request is not None
+    assert (request["city"][0] if request["city"] else None, request["income"]) == (city, income)
+
+
+@pytest.mark.parametrize("text", [
+    "I need help sticking to my budget",
+    "I want to stay within budget this month, any tips?",
+    "I want to cut my budget on eating out",
+    "plan a budget for my trip to goa",
+    "make a budget for my trip to goa",
+    "make my budget tighter",
+    "what budget do I need for pune",
+    "budget?",
+    "budget, how do I stick to it",
+    "budget for pune",
+])
+def test_goes_to_llm(text):
+    assert parse_budget_request(text) is None
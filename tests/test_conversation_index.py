@@ -0,0 +1,23 @@
+"""ConversationIndex keeps ids and vectors paired across an interrupted append."""
+import numpy as np
+
+from conversation_index import ConversationIndex
+
+TURNS = [
+    (1, "how much did I spend on rent", "Rent was ₹8000 last month."),
+    (2, "tips to save on food", "Cook at the hostel mess more often."),
+    (3, "is my metro card worth it", "Yes, it saves about ₹300 a month."),
+]
+
+
+def test_crash_between_vector_and_id_append_keeps_pairing(tmp_path):
+    index = ConversationIndex(str(tmp_path))
+    index.add_many(7, TURNS[:1])
+    # The vectors of a batch were written but the process died before its ids
+    with open(index._path(7, "f32"), "ab") as f:
+        f.write(np.ones((2, index.embedder.dim), dtype=np.float32).tobytes())
+    index.add_many(7, TURNS[1:])
+
+    assert list(index._ids(7)) == [1, 2, 3]
+    for conversation_id, message, _ in TURNS:
+        assert index.search(7, message, k=1)[0][0] == conversation_id
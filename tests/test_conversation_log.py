@@ -0,0 +1,32 @@
+"""ConversationWriter: diff-encoded contexts must survive dropped records."""
+import pytest
+
+from conversation_log import ConversationWriter, load_session_contexts
+from db import ConnectionPool, SpendingRepository, init_schema
+
+BASE = "".join(f"expense line {i}: chai ₹{i}\n" for i in range(200))
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "spending.db"))
+    init_schema(pool)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize("flush_each", [False, True], ids=["one batch", "batch per record"])
+def test_dropped_record_is_never_a_diff_base(pool, flush_each):
+    user_id = SpendingRepository(pool).create_user("asha", "!")
+    writer = ConversationWriter(pool, flush_interval=0.05)
+    contexts = [BASE, "dropped\n" + BASE, "dropped\n" + BASE + "kept\n"]
+    # The middle record names a user that doesn't exist and is dropped
+    ids = []
+    for owner, context in zip((user_id, user_id + 1, user_id), contexts):
+        ids.append(writer.submit(owner, "s1", "hi", "hello", context))
+        if flush_each:
+            writer.flush()
+    writer.close()
+
+    assert writer.stats["errors"] == 1
+    assert load_session_contexts(pool, "s1") == [(ids[0], contexts[0]), (ids[2], contexts[2])]
@@ -0,0 +1,65 @@
+"""SpendingRepository writes that move money: undo_last_expense and restore_expense."""
+import pytest
+
+from db import ConnectionPool, SpendingRepository, init_schema, now_ts
+from importer import import_expenses
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def repo(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "spending.db"))
+    init_schema(pool)
+    yield SpendingRepository(pool)
+    pool.close()
+
+
+def test_undo_removes_the_expense_entered_last(repo):
+    user_id = repo.create_user("asha", "!")
+    repo.update_total_money(user_id, 1000)
+    now = now_ts()
+    repo.add_expense_atomic(user_id, "dinner", 100, ts=now)
+    repo.add_expense_atomic(user_id, "books", 50, ts=now - 5 * DAY)
+
+    (description, amount, ts, _, debited), balance = repo.undo_last_expense(user_id)
+    assert (description, amount, ts, debited, balance) == ("books", 50, now - 5 * DAY, True, 900)
+    assert [row[0] for row in repo.get_expenses(user_id)] == ["dinner"]
+
+
+def test_undo_does_not_refund_imported_expenses(repo):
+    user_id = repo.create_user("asha", "!")
+    repo.update_total_money(user_id, 1000)
+    repo.add_expense_atomic(user_id, "dinner", 200)
+    import_expenses(repo.pool, user_id, [("rent", 5000.0, now_ts() + 10 * DAY)])
+
+    (description, amount, _, _, debited), balance = repo.undo_last_expense(user_id)
+    assert (description, amount, debited, balance) == ("rent", 5000.0, False, 800)
+    (description, amount, _, _, debited), balance = repo.undo_last_expense(user_id)
+    assert (description, amount, debited, balance) == ("dinner", 200, True, 1000)
+    assert repo.undo_last_expense(user_id) is None
+
+
+def test_restore_puts_the_undone_expense_back(repo):
+    user_id = repo.create_user("asha", "!")
+    repo.update_total_money(user_id, 1000)
+    now = now_ts()
+    repo.add_expense_atomic(user_id, "books", 50, ts=now - 5 * DAY, category="Education")
+    expense, _ = repo.undo_last_expense(user_id)
+
+    assert repo.restore_expense(user_id, expense) == 950
+    assert repo.get_expenses(user_id) == [("books", 50, now - 5 * DAY)]
+    # Restored as entered: undoing again refunds it again
+    assert repo.undo_last_expense(user_id) == (expense, 1000)
+
+
+def test_restore_refuses_a_debit_the_balance_no_longer_covers(repo):
+    user_id = repo.create_user("asha", "!")
+    repo.update_total_money(user_id, 100)
+    repo.add_expense_atomic(user_id, "books", 100)
+    expense, _ = repo.undo_last_expense(user_id)
+    repo.add_expense_atomic(user_id, "dinner", 60)
+
+    assert repo.restore_expense(user_id, expense) is None
+    assert [row[0] for row in repo.get_expenses(user_id)] == ["dinner"]
+    assert repo.get_total_money(user_id) == 40
@@ -0,0 +1,69 @@
+"""importer: duplicate counting and the errors a bad statement raises."""
+import io
+
+import pytest
+
+from db import ConnectionPool, SpendingRepository, init_schema
+from importer import import_expenses, import_file
+
+STATEMENT = """Date,Narration,Withdrawal Amt.
+01/03/2024,chai,20
+01/03/2024,chai,20
+02/03/2024,auto,"1,250.00"
+"""
+
+
+@pytest.fixture
+def repo(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "spending.db"))
+    init_schema(pool)
+    yield SpendingRepository(pool)
+    pool.close()
+
+
+def import_text(repo, user_id, text, fmt="csv", chunk_size=2):
+    return import_file(repo.pool, user_id, io.StringIO(text, newline=""), fmt, chunk_size)
+
+
+def test_repeats_are_kept_and_reimport_is_a_no_op(repo):
+    user_id = repo.create_user("asha", "!")
+    assert import_text(repo, user_id, STATEMENT)["inserted"] == 3
+    assert import_text(repo, user_id, STATEMENT)["inserted"] == 0
+    assert repo.get_spending_totals(user_id) == (1290, 3)
+    assert repo.get_total_money(user_id) == 0
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 50000])
+def test_only_missing_repeats_are_added(repo, chunk_size):
+    user_id = repo.create_user("asha", "!")
+    import_expenses(repo.pool, user_id, [("chai", 20.0, 100)])
+    report = import_expenses(repo.pool, user_id, [("chai", 20.0, 100)] * 3, chunk_size=chunk_size)
+    assert report["inserted"] == 2
+    assert repo.get_spending_totals(user_id) == (60, 3)
+
+
+@pytest.mark.parametrize("text, fmt, message", [
+    ("Date,Narration\n01/03/2024,chai\n", "csv", "needs description, amount and date columns"),
+    ("Date,Narration,Amount\n01/03/2024,chai\n", "csv", "Line 2: expected 3 columns, got 2"),
+    ("Date,Narration,Amount\n31/31/2024,chai,20\n", "csv", "Line 2: Unrecognised date"),
+    ("Date,Narration,Amount\n01/03/2024,chai,twenty\n", "csv", "Line 2: could not convert"),
+    ('{"description": "chai", "date": "2024-03-01"}\n', "jsonl", "Line 1: missing 'amount'"),
+    ('{"description": "chai", "amount": 20}\n', "jsonl", "Line 1: missing 'date'"),
+    ('{"description": "chai", "amount": null, "date": "2024-03-01"}\n', "jsonl", "Line 1: "),
+    ('{"description": "chai",\n', "jsonl", "Line 1: "),
+    ("[1, 2]\n", "jsonl", "Line 1: expected a JSON object"),
+    ("Date,Narration,Amount\n01/03/2024,%s,20\n" % ("x" * 200000), "csv", "Malformed CSV: field larger"),
+])
+def test_bad_statements_raise_value_error(repo, text, fmt, message):
+    user_id = repo.create_user("asha", "!")
+    with pytest.raises(ValueError, match=message):
+        import_text(repo, user_id, text, fmt)
+
+
+def test_rows_before_a_bad_chunk_stay_imported(repo):
+    user_id = repo.create_user("asha", "!")
+    broken = STATEMENT + "03/03/2024,books\n"
+    with pytest.raises(ValueError):
+        import_text(repo, user_id, broken)
+    assert repo.get_spending_totals(user_id)[1] == 2
+    assert import_text(repo, user_id, STATEMENT)["inserted"] == 1
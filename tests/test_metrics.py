@@ -0,0 +1,34 @@
+"""JsonLogSink: size-capped rotation of the event log."""
+import json
+
+from metrics import JsonLogSink
+
+
+def test_log_rotates_and_keeps_only_the_backups(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    sink = JsonLogSink(path, max_bytes=200, backups=2)
+    for i in range(100):
+        sink({"name": "db.query", "seconds": 0.001, "i": i})
+    sink.close()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["metrics.jsonl", "metrics.jsonl.1", "metrics.jsonl.2"]
+    for name in files:
+        assert (tmp_path / name).stat().st_size <= 200
+    # Newest events in path, then path.1, then path.2
+    numbers = [
+        json.loads(line)["i"]
+        for name in reversed(files) for line in (tmp_path / name).read_text().splitlines()
+    ]
+    assert numbers == list(range(numbers[0], 100))
+
+
+def test_log_appends_to_an_existing_file_until_the_cap(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    path.write_text("x" * 180 + "\n")
+    sink = JsonLogSink(str(path), max_bytes=200, backups=1)
+    sink({"name": "parse", "seconds": 0.5})
+    sink.close()
+
+    assert (tmp_path / "metrics.jsonl.1").read_text() == "x" * 180 + "\n"
+    assert json.loads(path.read_text())["name"] == "parse"
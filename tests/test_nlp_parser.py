@@ -0,0 +1,103 @@
+"""Chat command parsing: what is answered locally and what goes to the LLM."""
+from datetime import datetime
+
+import pytest
+
+from nlp_parser import parse_command
+
+TODAY = datetime(2025, 3, 15, 12, 0)
+
+
+@pytest.mark.parametrize("text, amount, description", [
+    ("spent 500 on food today", 500, "food"),
+    ("I spent ₹1,250.50 on groceries yesterday", 1250.5, "groceries"),
+    ("paid 300 for books on 12/03/2025", 300, "books"),
+    ("bought 2,000 rs for shoes", 2000, "shoes"),
+    ("spent on snacks 120 today", 120, "snacks"),
+])
+def test_expense(text, amount, description):
+    parsed = parse_command(text, TODAY)
+    assert (parsed["action"], parsed["amount"], parsed["description"]) == ("add_expense", amount, description)
+
+
+# TODAY is a Saturday
+@pytest.mark.parametrize("text, description, day", [
+    ("spent 500 on food last week", "food", datetime(2025, 3, 8, 12, 0)),
+    ("spent 500 on food", "food", TODAY),
+    ("spent 80 on chai this morning", "chai", TODAY),
+    ("paid 200 for dinner last night", "dinner", datetime(2025, 3, 14, 12, 0)),
+    ("spent 150 on auto the day before yesterday", "auto", datetime(2025, 3, 13, 12, 0)),
+    ("spent 900 on rent last month", "rent", datetime(2025, 2, 15, 12, 0)),
+    ("spent 300 on movie on wednesday", "movie", datetime(2025, 3, 12, 12, 0)),
+    ("spent 300 on movie last saturday", "movie", datetime(2025, 3, 8, 12, 0)),
+    ("spent 40 on tea 3 days ago", "tea", datetime(2025, 3, 12, 12, 0)),
+])
+def test_expense_period_is_dated_not_described(text, description, day):
+    parsed = parse_command(text, TODAY)
+    assert (parsed["description"], parsed["start_date"]) == (description, day)
+
+
+def test_last_month_clamps_to_a_shorter_month():
+    parsed = parse_command("spent 900 on rent last month", datetime(2025, 3, 31, 9, 30))
+    assert parsed["start_date"] == datetime(2025, 2, 28, 9, 30)
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("received 5000 salary", 5000),
+    ("add rs 2000 to balance", 2000),
+    ("got 1,00,000 from dad", 100000),
+    ("credited ₹15000 stipend", 15000),
+    ("got ₹500", 500),
+])
+def test_income(text, amount):
+    parsed = parse_command(text, TODAY)
+    assert (parsed["action"], parsed["amount"]) == ("add_income", amount)
+
+
+@pytest.mark.parametrize("text, start, end, category", [
+    ("show my food spending last week", datetime(2025, 3, 3), datetime(2025, 3, 10), "food"),
+    ("how much did I spend on travel this month?", datetime(2025, 3, 1), datetime(2025, 3, 16), "travel"),
+    ("spending between 2025-01-01 and 2025-01-31", datetime(2025, 1, 1), datetime(2025, 2, 1), None),
+    ("total spent yesterday", datetime(2025, 3, 14), datetime(2025, 3, 15), None),
+    ("what is my total spending", datetime(2025, 3, 1), datetime(2025, 3, 16), None),
+])
+def test_query(text, start, end, category):
+    parsed = parse_command(text, TODAY)
+    assert parsed["action"] == "query_spending"
+    assert (parsed["start_date"], parsed["end_date"], parsed["category"]) == (start, end, category)
+
+
+@pytest.mark.parametrize("text, action", [
+    ("undo last", "undo_last"),
+    ("delete the last expense", "undo_last"),
+    ("restore", "restore_last"),
+    ("redo that", "restore_last"),
+    ("undo undo", "restore_last"),
+    ("restore last expense!", "restore_last"),
+])
+def test_undo_and_restore(text, action):
+    assert parse_command(text, TODAY)["action"] == action
+
+
+@pytest.mark.parametrize("text", [
+    # questions and figures of speech are not income
+    "I got 2 questions about saving money",
+    "should I add 5000 to my emergency fund",
+    "got 3 months of rent left, how to plan?",
+    "add ₹5000 to my emergency fund",
+    "earned 3 points in the quiz",
+    # advice, not a total
+    "spending tips for students",
+    "how can I reduce my spending on food?",
+    "can you show my budget for pune",
+    # a period the parser doesn't understand
+    "what is the total spending in 2024",
+    # two expenses in one message, or nothing spent
+    "I spent 500 on food and 200 on travel today",
+    "spent on food 500 and travel 200",
+    "spent 0 on nothing",
+    "should I spend 500 on a course?",
+    "how do I restore my old phone",
+])
+def test_goes_to_llm(text):
+    assert parse_command(text, TODAY)["action"] is None
@@ -0,0 +1,22 @@
+"""The hot per-user queries must stay index-only range scans (db.HOT_QUERIES)."""
+import pytest
+
+from benchmarks.check_query_plans import plan_ok, query_params, seeded_database
+from db import HOT_QUERIES, explain_query_plan
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    pool, user_id = seeded_database(str(tmp_path_factory.mktemp("plans") / "plans.db"))
+    yield pool, user_id
+    pool.close()
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(database, name):
+    pool, user_id = database
+    sql, index = HOT_QUERIES[name]
+    with pool.connection() as conn:
+        plan = explain_query_plan(conn, sql, query_params(sql, user_id))
+    assert any(index in line for line in plan), plan
+    assert plan_ok(plan, index), plan
@@ -1,223 +1,171 @@
 import streamlit as st
-import sqlite3
-import hashlib
 from datetime import datetime, timedelta
-import re
-from langchain.schema import SystemMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
-import json
-from langchain.prompts import (
-    PromptTemplate,
-    SystemMessagePromptTemplate,
-    HumanMessagePromptTemplate,
-    ChatPromptTemplate,
-)
-
-from langchain_core.output_parsers import StrOutputParser
-from langchain.schema.runnable import RunnablePassthrough
-
-from rich.console import Console
-from rich.markdown import Markdown
+import logging
+import os
+import time
+import uuid
+
+import metrics
+from archive import Archive
+from budget_planner import answer_budget_request
+from categorizer import Categorizer, backfill, budget_breakdown
+from chain import PROMPT_VERSION, SYSTEM_MESSAGE, build_chat_chain
+from db import ConnectionPool, SpendingRepository, format_ts, init_schema
+from importer import detect_format, import_file
+from insights import ANALYSIS, SAVINGS, InsightWorker
+from credentials import Credentials, SessionTokens, load_session_secret
+from context_builder import build_context, estimate_tokens
+from chat_memory import ChatMemory
+from conversation_index import ConversationIndex, retrieve_turns
+from conversation_log import ConversationWriter
+from llm_cache import ResponseCache
+from llm_gateway import LLMGateway
+from nlp_parser import parse_command
+from rerun_profiler import RerunProfiler
 
 # Constants
 API_KEY = "Your Gemini flash API  Key "
 DB_FILE = "spending_tracker.db"
+CONTEXT_TOKEN_BUDGET = 600
+CATEGORIZER_MODEL = "categorizer_model.json"
+CONVERSATION_INDEX_DIR = "conversation_index"
+ARCHIVE_DIR = "archive"
+ARCHIVE_HORIZON_DAYS = 180
+ARCHIVE_INTERVAL = 6 * 60 * 60
+HISTORY_TOKEN_BUDGET = 300
+MEMORY_TOKEN_BUDGET = 400
+CHAT_PAGE_SIZE = 20
+STREAM_RESPONSES = True
+SNAPSHOT_CACHE_ENTRIES = 256
+# JSON event log, off unless SMARTSPEND_METRICS_LOG names a file (rotated by size)
+METRICS_LOG = os.environ.get("SMARTSPEND_METRICS_LOG") or None
+METRICS_PORT = 9464
+# Budget plans are computed locally; set to have Gemini reword the finished table
+PHRASE_BUDGET_WITH_LLM = False
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_MESSAGE)
+
+CHAT_CSS = """
+    <style>
+    .chat-message {
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin-bottom: 1rem;
+        position: relative;
+    }
+    .user-message {
+        background-color: #292323;
+    }
+    .bot-message {
+        background-color: #292323;
+    }
+    .stButton>button {
+        background-color: #2a9d8f;
+        color: white;
+        border: none;
+        border-radius: 5px;
+        padding: 8px 16px;
+    }
+    .stButton>button:hover {
+        background-color: #21867a;
+    }
+    </style>
+"""
+
+@st.cache_resource
+def get_metrics():
+    """Start the metrics sinks once per process: /metrics endpoint and, if enabled, the JSON event log."""
+    if METRICS_LOG:
+        metrics.REGISTRY.add_sink(metrics.JsonLogSink(METRICS_LOG))
+    try:
+        metrics.REGISTRY.serve_prometheus(METRICS_PORT)
+    except OSError:
+        logging.getLogger(__name__).warning("Metrics port %s is in use; endpoint disabled", METRICS_PORT)
+    return metrics.REGISTRY
 
-# Initialize chat model
-chat_model = ChatGoogleGenerativeAI(
-    api_key=API_KEY, model="gemini-1.5-flash", temperature=0.6
-)
-console = Console()
-
-conversation = []
+@st.cache_resource
+def get_chat_chain():
+    """Build the Gemini chain once per process instead of on every rerun."""
+    return build_chat_chain(API_KEY)
 
-# Updated System Message
-SYSTEM_MESSAGE = """You are SmartSpend AI, a friendly and helpful chatbot designed to assist users with a variety of queries, 
-    while specializing in financial analysis for students. You are conversational, approachable, 
-    and can respond to both general and finance-related topics.
+@st.cache_resource
+def get_llm_gateway():
+    """Process-wide gateway: rate limiting, retries and coalescing for every LLM call."""
+    return LLMGateway(get_chat_chain())
 
-    When engaging with users, keep the following in mind:
-    
-    Do not provide any information other than financial analysis and general finance realted questions of students.
-    
-    You can also do general chatting related to finance
-    
-    If you are asked any questions other than your field just say - "I don't Know" politely.
-    
-    Do not give any placeholders for links and other thing
-    
-    Do not give a budget in the chat answer until it is not asked specifically. 
-
-    1. **General Queries:**
-       - Respond warmly to greetings like "Hey" or "Hello"
-       - Provide thoughtful, positive, and conversational responses
-       - If unsure about intent, politely ask for clarification
-
-    2. **Financial Analysis:**
-       - Categorize spending into:
-         - Essential Expenses (rent, utilities, groceries)
-         - Educational Expenses (tuition, books, supplies)
-         - Discretionary Expenses (dining, entertainment)
-         - Savings
-       - Provide actionable insights and budgeting advice
-       - Use the 50/30/20 Rule framework
-
-    3. **Response Format:**
-       - Use friendly, conversational tone
-       - Structure with markdown headings
-       - Include bullet points for clarity
-       - Add tables for data analysis when relevant
-
-    4. **Conversation Flow:**
-       - Maintain context from previous messages
-       - Reference past information when relevant
-       - Ask follow-up questions when needed
-       **context**:{context}
-       **question**:{question}
-       
-       tier1_cities = [
-    "Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata",
-    "Hyderabad", "Pune", "Ahmedabad", "Gurugram", "Noida"
-]
-
-tier2_cities = [
-    "Jaipur", "Lucknow", "Chandigarh", "Indore", "Kochi",
-    "Nagpur", "Coimbatore", "Bhubaneswar", "Vadodara", "Visakhapatnam"
-]
-
-If the user asks the expenses planner specifying the city:
-- If it exists in tier1_cities, give the budget plan according to a tier 1 city in India
-- If it exists in tier2_cities, give the budget plan according to a tier 2 city in India
-- Else give the expenses according to a tier3 city in India
-
-If the user does not specify the city give the a planner according to the tier2 city and ask - "If you need a planner according to your location, please specify the city"
-
-       
-       Provide the proper fromatted and user friendly answers
-       """
-
-
-system_prompt = SystemMessagePromptTemplate(
-    prompt=PromptTemplate(
-        input_variables=["context"],
-        template=SYSTEM_MESSAGE,
+# Database Functions
+@st.cache_resource
+def get_repository():
+    """One pooled repository per process, shared by every Streamlit session."""
+    pool = ConnectionPool(DB_FILE)
+    init_schema(pool)
+    categorizer = Categorizer.load(CATEGORIZER_MODEL)
+    # Categorize anything recorded before categories existed (no-op afterwards)
+    backfill(pool, categorizer)
+    # Months older than the horizon move to columnar files on a background
+    # thread (now and every ARCHIVE_INTERVAL); reads still see them
+    archive = Archive(pool, ARCHIVE_DIR)
+    archive.start(ARCHIVE_HORIZON_DAYS, ARCHIVE_INTERVAL)
+    # Every repository call is timed under db_call_ms{op="<method>"}
+    return metrics.instrument(
+        SpendingRepository(pool, categorizer, archive), "db_call_ms", "SQLite repository calls"
     )
-)
 
-human_prompt = HumanMessagePromptTemplate(
-    prompt=PromptTemplate(
-        input_variables=["question"],
-        template="{question}",
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(get_repository().pool)
+
+@st.cache_resource
+def get_insight_worker():
+    """Background jobs keeping every user's Analysis/Savings insights precomputed."""
+    gateway = get_llm_gateway()
+    worker = metrics.instrument(
+        InsightWorker(
+            get_repository(), lambda inputs, kind: invoke_llm(inputs, kind, gateway),
+            cache=get_response_cache(), prompt_version=PROMPT_VERSION,
+            context_budget=CONTEXT_TOKEN_BUDGET,
+        ),
+        "insight_call_ms", "Insight worker calls",
     )
-)
+    worker.start()
+    return worker
 
-messages = [system_prompt, human_prompt]
+@st.cache_resource
+def get_conversation_index():
+    """On-disk vector index of past chat turns, shared by every session."""
+    return ConversationIndex(CONVERSATION_INDEX_DIR, archive=get_repository().archive)
 
-prompt_template = ChatPromptTemplate(
-    input_variables=["context", "question"],
-    messages=messages,
-)
+@st.cache_resource
+def get_conversation_writer():
+    """Background writer for chat turns; new turns are indexed once written."""
+    pool = get_repository().pool
+    index = get_conversation_index()
+    return ConversationWriter(pool, on_flush=lambda records: index.add_saved(pool, records))
 
-basic_info_model = (
-    {"context": RunnablePassthrough(), "question": RunnablePassthrough()}
-    | prompt_template
-    | chat_model
-    | StrOutputParser()
-)
+@st.cache_resource
+def get_credentials():
+    """Password hashing (scrypt; legacy SHA-256 rows are rehashed on login)."""
+    return Credentials()
 
-# Database Functions
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Create existing tables
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            total_money REAL
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            description TEXT,
-            amount REAL,
-            timestamp TEXT
-        )
-    """)
-    
-    # Add new conversations table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            timestamp TEXT,
-            user_message TEXT,
-            bot_response TEXT,
-            context TEXT
-        )
-    """)
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        )
-    ''')
-    
-    # cursor.execute("DROP TABLE IF EXISTS users;")
-
-    
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", ("users",))
-    table = cursor.fetchone()
-    print(table)
-
-    
-    # Ensure one user record exists
-    cursor.execute("INSERT OR IGNORE INTO user_data (id, total_money) VALUES (1, 0)")
-    conn.commit()
-    conn.close()
-    
-# Initialize database and session state
-init_db()
-    
-def hash_password(password: str) -> str:
-    """Hash password using SHA-256."""
-    return hashlib.sha256(password.encode()).hexdigest()
+@st.cache_resource
+def get_session_tokens():
+    return SessionTokens(load_session_secret())
 
 
 def register_user():
     """Handle user registration using SQLite."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     username = st.session_state.register_username_tab
     password = st.session_state.register_password_tab
     if not username or not password:
         st.error("Username and password cannot be empty!")
         return
     try:
-        cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
+        if get_repository().create_user(username, get_credentials().hash(password)) is None:
             st.error("Username already exists!")
-            conn.close()
             return
-    
-        hashed_password = hash_password(password)
-        created_at = datetime.now().isoformat()
-    
-        cursor.execute(
-        "INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
-            (username, hashed_password, created_at)
-        )
-        conn.commit()
-        conn.close()
 
         st.success("Registration successful! Please login.")
-    except Exception as E:
-        print(Exception),
+    except Exception:
+        logging.getLogger(__name__).exception("Registration failed for %s", username)
         st.error("Error Occurred")
 
 def login_user():
@@ -228,108 +176,101 @@ def login_user():
     if not username or not password:
         st.error("Username and password cannot be empty!")
         return
-    
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
 
-    # Fetch user details from the database
-    cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
-    conn.close()
-
-    st.success(user)
-
-    if not user:
+    user_id = get_credentials().authenticate(get_repository(), username, password)
+    if user_id is None:
         st.error("Invalid username or password!")
         return
 
-    # Check the hashed password
-    hashed_password = user[0]
-    password = hash_password(password)
-    if hashed_password == password:
-        st.success("Login successful!")
-        st.session_state.is_logged_in = True
-        st.session_state.current_user = username
-    else:
-        st.error("Invalid username or password!")
+    st.success("Login successful!")
+    st.session_state.is_logged_in = True
+    st.session_state.current_user = username
+    st.session_state.user_id = user_id
+    # Later reruns check this token instead of the users table
+    st.session_state.auth_token = get_session_tokens().issue(user_id, username)
+    # Groups this login's chat turns in the conversations table
+    st.session_state.session_id = uuid.uuid4().hex
+
+def check_session():
+    """Log the session out if its token is missing, forged or expired."""
+    if not st.session_state.get("is_logged_in", False):
+        return
+    claims = get_session_tokens().verify(st.session_state.auth_token)
+    if claims is None or claims["uid"] != st.session_state.user_id:
+        log_out()
+        st.warning("Your session has expired. Please log in again.")
+
+def log_out():
+    if st.session_state.session_id:
+        get_conversation_writer().end_session(st.session_state.session_id)
+    st.session_state.is_logged_in = False
+    st.session_state.current_user = None
+    st.session_state.user_id = None
+    st.session_state.auth_token = None
+    st.session_state.session_id = None
+    st.session_state.undone_expense = None
+    st.session_state.chat_memory.clear()
+    st.session_state.older_turns = []
+    st.session_state.older_exhausted = False
+
+def current_user_id():
+    """Id of the logged-in user; every data helper below is scoped to it."""
+    return st.session_state.user_id
 
 def get_total_money():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT total_money FROM user_data WHERE id = 1")
-    total_money = cursor.fetchone()[0]
-    conn.close()
-    return total_money
+    return get_repository().get_total_money(current_user_id())
 
 def update_total_money(amount):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE user_data SET total_money = ? WHERE id = 1", (amount,))
-    conn.commit()
-    conn.close()
+    get_repository().update_total_money(current_user_id(), amount)
 
 def add_to_balance(amount):
-    current_balance = get_total_money()
-    new_balance = current_balance + amount
-    update_total_money(new_balance)
+    get_repository().add_to_balance(current_user_id(), amount)
 
 def add_expense(description, amount):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("INSERT INTO expenses (description, amount, timestamp) VALUES (?, ?, ?)", 
-                  (description, amount, timestamp))
-    conn.commit()
-    conn.close()
+    get_repository().add_expense(current_user_id(), description, amount)
+
+def add_expense_atomic(description, amount, ts=None):
+    """Check funds, debit and insert in one transaction. Returns the new balance or None."""
+    return get_repository().add_expense_atomic(current_user_id(), description, amount, ts)
 
 def get_expenses():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT description, amount, timestamp FROM expenses")
-    expenses = cursor.fetchall()
-    conn.close()
-    return expenses
+    return get_repository().get_expenses(current_user_id())
 
 def get_last_10_expenses():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT description, amount, timestamp
-        FROM expenses
-        ORDER BY timestamp DESC
-        LIMIT 10
-    """)
-    expenses = cursor.fetchall()
-    conn.close()
-    return expenses
-
+    return get_repository().get_last_10_expenses(current_user_id())
+
+def current_data_version():
+    """The user's data version: one primary-key read, bumped by triggers on every write."""
+    return get_repository().get_data_version(current_user_id())
+
+@st.cache_data(max_entries=SNAPSHOT_CACHE_ENTRIES, show_spinner=False)
+def get_user_snapshot(user_id, data_version):
+    """Sidebar and tab reads for user_id, re-queried only when data_version changes."""
+    repo = get_repository()
+    _, expense_count = repo.get_spending_totals(user_id)
+    return {
+        "last_10_expenses": repo.get_last_10_expenses(user_id),
+        "total_money": repo.get_total_money(user_id),
+        "expense_count": expense_count,
+    }
+
+def current_snapshot():
+    return get_user_snapshot(current_user_id(), current_data_version())
+
+@metrics.timed("parse_ms", "Local chat command parsing")
 def parse_nlp_input(user_input):
-    user_input = user_input.lower()
-    today = datetime.now()
-    parsed_data = {"action": None, "description": None, "amount": None, "start_date": None, "end_date": None}
-
-    expense_match = re.search(r"spent\s+(\d+)\s+on\s+(.*?)\s+(today|yesterday|(\d+)\s+days ago)", user_input)
-    if expense_match:
-        parsed_data["action"] = "add_expense"
-        parsed_data["amount"] = float(expense_match.group(1))
-        parsed_data["description"] = expense_match.group(2)
-        if expense_match.group(3) == "today":
-            parsed_data["start_date"] = parsed_data["end_date"] = today
-        elif expense_match.group(3) == "yesterday":
-            yesterday = today - timedelta(days=1)
-            parsed_data["start_date"] = parsed_data["end_date"] = yesterday
-        elif expense_match.group(4):
-            days_ago = int(expense_match.group(4))
-            parsed_data["start_date"] = parsed_data["end_date"] = today - timedelta(days=days_ago)
-    
-    return parsed_data
+    return parse_command(user_input)
 
 # Chat Functions
 def init_session_state():
-    if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
-    if 'context' not in st.session_state:
-        st.session_state.context = {}
+    if 'profiler' not in st.session_state:
+        st.session_state.profiler = RerunProfiler()
+    if 'chat_memory' not in st.session_state:
+        st.session_state.chat_memory = ChatMemory()
+    if 'older_turns' not in st.session_state:
+        # Turns paged back in from the conversations table, oldest first
+        st.session_state.older_turns = []
+        st.session_state.older_exhausted = False
     if 'message_sent' not in st.session_state:
         st.session_state.message_sent = False
     if 'login_username' not in st.session_state:
@@ -338,43 +279,173 @@ def init_session_state():
         st.session_state.is_logged_in = False
     if 'current_user' not in st.session_state:
         st.session_state.current_user = None
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = None
+    if 'auth_token' not in st.session_state:
+        st.session_state.auth_token = None
+    if 'undone_expense' not in st.session_state:
+        # Last expense removed by "undo last", until "restore" puts it back
+        st.session_state.undone_expense = None
+
+def save_conversation(user_message, bot_response, context, ttft_ms=None, latency_ms=None):
+    """Queue the turn for the background writer and return its conversation id."""
+    return get_conversation_writer().submit(
+        current_user_id(), st.session_state.session_id, user_message, bot_response, context,
+        ttft_ms=ttft_ms, latency_ms=latency_ms
+    )
 
-def save_conversation(session_id, user_message, bot_response):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    context = json.dumps(st.session_state.context)
+def build_chat_inputs(user_input, with_history=True):
+    repo = get_repository()
+    with metrics.timer("context_build_ms", "Chat prompt context building", step="spending"):
+        context = build_context(repo, current_user_id(), token_budget=CONTEXT_TOKEN_BUDGET)
     
-    cursor.execute("""
-        INSERT INTO conversations 
-        (session_id, timestamp, user_message, bot_response, context)
-        VALUES (?, ?, ?, ?, ?)
-    """, (session_id, timestamp, user_message, bot_response, context))
+    if with_history:
+        memory = st.session_state.chat_memory
+        # Earlier turns relevant to this question, within their own budget
+        with metrics.timer("context_build_ms", step="retrieval"):
+            index = get_conversation_index()
+            index.sync(repo.pool, current_user_id())
+            history = retrieve_turns(
+                repo.pool, index, current_user_id(), user_input,
+                token_budget=HISTORY_TOKEN_BUDGET, exclude=memory.ids(),
+            )
+        if history:
+            context += "\n\nRelevant earlier conversation:\n" + "\n".join(history)
+        # This session's summary and recent turns
+        with metrics.timer("context_build_ms", step="memory"):
+            recent = memory.prompt_lines(MEMORY_TOKEN_BUDGET)
+        if recent:
+            context += "\n\nThis conversation:\n" + "\n".join(recent)
     
-    conn.commit()
-    conn.close()
+    return {"context": context, "question": user_input}
+
+def record_llm_tokens(event, kind, inputs, response):
+    """Estimated prompt/response tokens onto the timer event and the token counters."""
+    event["prompt_tokens"] = SYSTEM_PROMPT_TOKENS + sum(estimate_tokens(str(value)) for value in inputs.values())
+    event["response_tokens"] = estimate_tokens(response or "")
+    for direction in ("prompt", "response"):
+        metrics.counter(
+            "llm_tokens_total", "Estimated LLM tokens", kind=kind, direction=direction
+        ).inc(event[f"{direction}_tokens"])
+
+def invoke_llm(inputs, kind, gateway=None):
+    """Blocking gateway call, timed along with its token counts.
+
+    Background threads pass the gateway, since they can't use Streamlit's
+    resource cache.
+    """
+    gateway = gateway or get_llm_gateway()
+    with metrics.timer("llm_call_ms", "LLM gateway calls", kind=kind, mode="invoke") as event:
+        response = gateway.invoke(inputs)
+        record_llm_tokens(event, kind, inputs, response)
+    return response
 
-def get_chat_response(user_input):
-    expenses = get_expenses()
-    total_spent = sum(expense[1] for expense in expenses)
-    initial_money = get_total_money() + total_spent
-    
-    context = f"""
-    Initial money: ₹{initial_money}
-    Total spent: ₹{total_spent}
-    Current balance: ₹{get_total_money()}
+def get_chat_response(user_input, with_history=True):
+    response = invoke_llm(build_chat_inputs(user_input, with_history), "chat")
     
-    Expense breakdown:
-    {chr(10).join(f'- {desc}: ₹{amt}' for desc, amt, _ in expenses)}
+    return response
+
+def stream_chat_response(inputs, timings):
+    """Yield response text chunks as Gemini generates them.
+
+    Fills timings with ttft_ms (time to first token) and latency_ms once the
+    stream is exhausted.
+    """
+    started = time.perf_counter()
+    chunks = []
+    with metrics.timer("llm_call_ms", "LLM gateway calls", kind="chat", mode="stream") as event:
+        for chunk in get_llm_gateway().stream(inputs):
+            if "ttft_ms" not in timings:
+                timings["ttft_ms"] = (time.perf_counter() - started) * 1000
+                metrics.histogram("llm_ttft_ms", "Time to first streamed chunk").observe(timings["ttft_ms"])
+            chunks.append(chunk)
+            yield chunk
+        record_llm_tokens(event, "chat", inputs, "".join(map(str, chunks)))
+    timings.setdefault("ttft_ms", None)
+    timings["latency_ms"] = (time.perf_counter() - started) * 1000
+
+def get_analytics(user_id, data_version):
+    """Vectorized analytics for user_id, recomputed only when data_version changes.
+
+    Usually already computed by the insight worker after the last write.
     """
+    return get_insight_worker().analytics(user_id, data_version)
+
+def format_age(seconds):
+    if seconds < 60:
+        return "just now"
+    if seconds < 60 * 60:
+        return f"{seconds // 60:.0f} min ago"
+    if seconds < 24 * 60 * 60:
+        return f"{seconds // (60 * 60):.0f} h ago"
+    return f"{seconds // (24 * 60 * 60):.0f} days ago"
+
+def run_local_command(parsed_input):
+    """Answer income, balance, spending-query, undo and restore commands locally (None if not one)."""
+    action = parsed_input["action"]
+    repo = get_repository()
+    user_id = current_user_id()
     
-    final_prompt = prompt_template.format(
-        context=context, question=user_input
-    )
+    if action == "add_income":
+        add_to_balance(parsed_input["amount"])
+        return f"✅ Added ₹{parsed_input['amount']:.2f} to your balance (balance: ₹{get_total_money():.2f})"
     
-    response = basic_info_model.invoke(final_prompt)
+    if action == "show_balance":
+        return f"💰 Current balance: ₹{get_total_money():.2f}"
     
-    return response
+    if action == "undo_last":
+        undone = repo.undo_last_expense(user_id)
+        if undone is None:
+            return "There are no expenses to undo."
+        expense, new_balance = undone
+        st.session_state.undone_expense = expense
+        description, amount, ts, _, refunded = expense
+        refund = "refunded, " if refunded else ""
+        return (
+            f"↩️ Removed expense: {description} - ₹{amount:.2f} on {format_ts(ts)} "
+            f"({refund}balance: ₹{new_balance:.2f}). Say \"restore\" to put it back."
+        )
+
+    if action == "restore_last":
+        expense = st.session_state.undone_expense
+        if expense is None:
+            return "There is no undone expense to restore."
+        description, amount = expense[:2]
+        new_balance = repo.restore_expense(user_id, expense)
+        if new_balance is None:
+            return f"❌ Can't restore {description} - ₹{amount:.2f}: your balance no longer covers it."
+        st.session_state.undone_expense = None
+        return f"✅ Restored expense: {description} - ₹{amount:.2f} (balance: ₹{new_balance:.2f})"
+    
+    if action == "query_spending":
+        start, end = parsed_input["start_date"], parsed_input["end_date"]
+        category = parsed_input["category"]
+        total, count = repo.get_spending_between(
+            user_id, int(start.timestamp()), int(end.timestamp()), category
+        )
+        period = f"{start:%d %b %Y} - {end - timedelta(days=1):%d %b %Y}"
+        what = f"on {category} " if category else ""
+        return f"📊 You spent ₹{total:.2f} {what}across {count} expenses ({period})."
+    
+    return None
+
+def answer_budget(user_input):
+    """Budget plan for a planner request, computed locally (None if not one).
+
+    With PHRASE_BUDGET_WITH_LLM the table is sent to the LLM to be reworded,
+    never recomputed. Returns (context, response).
+    """
+    with metrics.timer("budget_plan_ms", "Local budget planner"):
+        plan = answer_budget_request(user_input, get_total_money())
+    if plan is None or not PHRASE_BUDGET_WITH_LLM:
+        return None if plan is None else ("", plan)
+    context = (
+        "Budget plan computed by the app. Present it in a friendly way, keeping "
+        "every amount, category and the table exactly as given:\n" + plan
+    )
+    return context, invoke_llm({"context": context, "question": user_input}, "budget")
 
 def process_chat_message(user_input):
     if user_input:
@@ -384,71 +455,316 @@ def process_chat_message(user_input):
         if parsed_input["action"] == "add_expense":
             amount = parsed_input["amount"]
             description = parsed_input["description"]
+            ts = int(parsed_input["start_date"].timestamp())
             
-            if amount > get_total_money():
+            new_balance = add_expense_atomic(description, amount, ts)
+            if new_balance is None:
                 return "❌ Insufficient funds! Please check your balance."
             
-            update_total_money(get_total_money() - amount)
-            add_expense(description, amount)
-            return f"✅ Added expense: {description} - ₹{amount:.2f}"
+            return f"✅ Added expense: {description} - ₹{amount:.2f} (balance: ₹{new_balance:.2f})"
+        
+        # Other commands answered straight from SQLite, no LLM call
+        local_response = run_local_command(parsed_input)
+        if local_response is not None:
+            return local_response
         
+        # Budget plans come from the local planner; kept in the chat like LLM turns
+        started = time.perf_counter()
+        budget = answer_budget(user_input)
+        if budget is not None:
+            context, response = budget
+            timings = {"ttft_ms": None, "latency_ms": (time.perf_counter() - started) * 1000}
         # Regular chat processing
-        st.session_state.conversation_history.append({"user": user_input})
-        response = get_chat_response(user_input)
-        st.session_state.conversation_history.append({"assistant": response})
+        elif STREAM_RESPONSES:
+            inputs = build_chat_inputs(user_input)
+            context = inputs["context"]
+            timings = {}
+            render_message({"user": user_input})
+            response = render_streamed_message(stream_chat_response(inputs, timings))
+        else:
+            inputs = build_chat_inputs(user_input)
+            context = inputs["context"]
+            started = time.perf_counter()
+            response = invoke_llm(inputs, "chat")
+            timings = {"ttft_ms": None, "latency_ms": (time.perf_counter() - started) * 1000}
         
-        save_conversation(
-            session_id=str(hash(datetime.now())),
+        conversation_id = save_conversation(
             user_message=user_input,
-            bot_response=response
+            bot_response=response,
+            context=context,
+            **timings
+        )
+        evicted = st.session_state.chat_memory.add_turn(
+            {"id": conversation_id, "user": user_input, "assistant": response, **timings}
         )
+        # Once older pages are loaded the paging cursor no longer follows the
+        # window, so the turn leaving it goes on the end of those pages
+        if evicted is not None and (st.session_state.older_turns or st.session_state.older_exhausted):
+            st.session_state.older_turns.append(evicted)
         
         return response
     return None
 
 # UI Components
+@metrics.timed("render_ms", "Streamlit rendering", section="chat_interface")
 def render_chat_interface():
-    st.markdown("""
-        <style>
-        .chat-message {
-            padding: 1rem;
-            border-radius: 0.5rem;
-            margin-bottom: 1rem;
-            position: relative;
-        }
-        .user-message {
-            background-color: #292323;
-        }
-        .bot-message {
-            background-color: #292323;
-        }
-        .stButton>button {
-            background-color: #2a9d8f;
-            color: white;
-            border: none;
-            border-radius: 5px;
-            padding: 8px 16px;
-        }
-        .stButton>button:hover {
-            background-color: #21867a;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-    
     chat_container = st.container()
     
     with chat_container:
-        for message in st.session_state.conversation_history:
-            with st.container():
-                col1, col2 = st.columns([1, 9])
-                with col1:
-                    st.markdown("👤" if "user" in message else "🤖")
-                with col2:
-                    st.markdown(
-                        f"<div class='chat-message {'user-message' if 'user' in message else 'bot-message'}'>"
-                        f"{message['user'] if 'user' in message else message['assistant']}</div>",
-                        unsafe_allow_html=True
+        # Only the memory window plus pages the user asked for are rendered
+        if not st.session_state.older_exhausted:
+            st.button("⬆️ Load older messages", on_click=load_older_turns)
+        for turn in st.session_state.older_turns:
+            render_turn(turn)
+        for turn in st.session_state.chat_memory.turns:
+            render_turn(turn)
+
+def load_older_turns():
+    """Page the previous CHAT_PAGE_SIZE turns in from the conversations table."""
+    # Turns still queued in the writer must be on disk before paging past them
+    get_conversation_writer().flush()
+    older = st.session_state.older_turns
+    oldest = older[0] if older else st.session_state.chat_memory.oldest()
+    rows = get_repository().get_conversation_page(
+        current_user_id(), oldest["id"] if oldest else None, CHAT_PAGE_SIZE
+    )
+    st.session_state.older_turns = [
+        {"id": conversation_id, "user": user_message, "assistant": bot_response,
+         "ttft_ms": ttft_ms, "latency_ms": latency_ms}
+        for conversation_id, _, user_message, bot_response, ttft_ms, latency_ms in rows
+    ] + older
+    if len(rows) < CHAT_PAGE_SIZE:
+        st.session_state.older_exhausted = True
+
+def render_turn(turn):
+    render_message({"user": turn["user"]})
+    render_message({"assistant": turn["assistant"], "ttft_ms": turn.get("ttft_ms"),
+                    "latency_ms": turn.get("latency_ms")})
+
+def render_message(message):
+    with st.container():
+        col1, col2 = st.columns([1, 9])
+        with col1:
+            st.markdown("👤" if "user" in message else "🤖")
+        with col2:
+            st.markdown(
+                f"<div class='chat-message {'user-message' if 'user' in message else 'bot-message'}'>"
+                f"{message['user'] if 'user' in message else message['assistant']}</div>",
+                unsafe_allow_html=True
+            )
+            if message.get("latency_ms") is not None:
+                ttft = message.get("ttft_ms")
+                st.caption(
+                    (f"first token {ttft:.0f} ms · " if ttft is not None else "")
+                    + f"total {message['latency_ms']:.0f} ms"
+                )
+
+def render_analytics(analytics):
+    """Metrics and native charts for the precomputed analytics."""
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Burn rate", f"₹{analytics['burn_rate']:,.0f}/day")
+    days_left = analytics["days_until_zero"]
+    col2.metric("Balance lasts", "-" if days_left is None else f"{days_left:,.0f} days")
+    monthly = analytics["monthly"]
+    col3.metric("This month", f"₹{monthly.iloc[-1]:,.0f}" if len(monthly) else "-")
+    
+    st.markdown("#### Daily spending")
+    st.line_chart(analytics["daily"].tail(365))
+    st.markdown("#### Monthly spending")
+    st.bar_chart(monthly.set_axis(monthly.index.strftime("%Y-%m")).tail(24))
+    st.markdown("#### Categories")
+    st.bar_chart(analytics["categories"].set_index("category")["total"].head(15))
+    
+    if len(analytics["spike_days"]) or len(analytics["outliers"]):
+        st.markdown("#### Unusual spending")
+        if len(analytics["spike_days"]):
+            st.dataframe(analytics["spike_days"], hide_index=True)
+        if len(analytics["outliers"]):
+            st.dataframe(analytics["outliers"].drop(columns="id"), hide_index=True)
+    st.caption(f"Computed in {analytics['total_ms']:.0f} ms from {analytics['count']:,} expenses")
+
+def render_budget_breakdown():
+    """Show the 50/30/20 split straight from the category totals, no LLM call."""
+    repo = get_repository()
+    user_id = current_user_id()
+    breakdown = budget_breakdown(
+        repo.get_category_totals(user_id, -1), repo.get_total_money(user_id), repo.categorizer
+    )
+    st.markdown("#### 50/30/20 breakdown")
+    st.table([
+        {
+            "Part": name.capitalize(),
+            "Amount (₹)": f"{part['amount']:,.2f}",
+            "Share": f"{part['share']:.0%}",
+            "Target": f"{part['target']:.0%}",
+        }
+        for name, part in breakdown["rule"].items()
+    ])
+
+def render_streamed_message(chunks):
+    """Render assistant chunks as they arrive and return the full text."""
+    with st.container():
+        col1, col2 = st.columns([1, 9])
+        with col1:
+            st.markdown("🤖")
+        with col2:
+            return st.write_stream(chunks)
+
+def render_sidebar(snapshot):
+    st.sidebar.title("💳 Expense Drawer")
+    st.sidebar.write(f"Welcome, {st.session_state.get('current_user', 'User')}!")
+    
+    st.sidebar.write("Here are your last 10 expenses:")
+    last_10_expenses = snapshot["last_10_expenses"]
+    if not last_10_expenses:
+        st.sidebar.write("No expenses recorded yet.")
+    else:
+        for desc, amt, ts in last_10_expenses:
+            st.sidebar.write(f"- {desc}: ₹{amt} (on {format_ts(ts)})")
+    
+    # Initialize money if not set
+    total_money = snapshot["total_money"]
+    if total_money == 0:
+        st.sidebar.write("Set your initial balance:")
+        user_money = st.sidebar.number_input("Enter amount:", min_value=0.0, step=100.0)
+        if st.sidebar.button("Save Balance"):
+            update_total_money(user_money)
+            st.sidebar.success(f"Initial balance set to ₹{user_money:.2f}")
+            st.rerun()
+    else:
+        st.sidebar.write(f"Current Balance: ₹{total_money:.2f}")
+
+def render_chat_tab():
+    render_chat_interface()
+    
+    with st.form(key='chat_form', clear_on_submit=True):
+        user_input = st.text_input("Type your message here...", key="chat_input")
+        submit_button = st.form_submit_button("Send")
+        
+        if submit_button and user_input:
+            response = process_chat_message(user_input)
+            if response:
+                st.rerun()
+
+def render_expense_tab():
+    with st.form(key='expense_form', clear_on_submit=True):
+        expense_description = st.text_input("Description:")
+        expense_amount = st.number_input("Amount (₹):", min_value=0.0, step=100.0)
+        submit_expense = st.form_submit_button("Add Expense")
+        
+        if submit_expense:
+            new_balance = add_expense_atomic(expense_description, expense_amount)
+            if new_balance is None:
+                st.error("❌ Insufficient funds! Please check your balance.")
+            else:
+                st.success(f"✅ Added: {expense_description} - ₹{expense_amount:.2f} (balance: ₹{new_balance:.2f})")
+                st.rerun()
+
+    with st.form(key='import_form', clear_on_submit=True):
+        statement = st.file_uploader("Import bank statement (CSV or JSONL):", type=["csv", "jsonl", "json"])
+        submit_import = st.form_submit_button("Import")
+        
+        if submit_import and statement is not None:
+            try:
+                with st.spinner("Importing expenses..."):
+                    repo = get_repository()
+                    report = import_file(
+                        repo.pool, current_user_id(), statement, detect_format(statement.name),
+                        categorizer=repo.categorizer, archive=repo.archive,
                     )
+            except ValueError as error:
+                st.error(
+                    f"❌ Couldn't import {statement.name}: {error}. Fix the file and import it "
+                    f"again; expenses already imported from it won't be duplicated."
+                )
+            else:
+                st.success(
+                    f"✅ Imported {report['inserted']} expenses "
+                    f"({report['duplicates']} duplicates skipped, {report['rows_per_sec']:,.0f} rows/s)"
+                )
+
+def render_balance_tab():
+    with st.form(key='balance_form', clear_on_submit=True):
+        add_amount = st.number_input("Amount to Add (₹):", min_value=0.0, step=100.0)
+        submit_balance = st.form_submit_button("Add to Balance")
+        
+        if submit_balance and add_amount > 0:
+            add_to_balance(add_amount)
+            st.success(f"✅ Added ₹{add_amount:.2f} to your balance")
+            st.rerun()
+
+def render_insight(kind, label):
+    """The precomputed insight text with its freshness, and a manual refresh button."""
+    worker = get_insight_worker()
+    user_id = current_user_id()
+    insight = worker.latest(user_id).get(kind)
+    job = worker.status(user_id)
+    if job is None:
+        # No write has queued a job yet (new user): queue the first one
+        worker.request(user_id)
+        job = worker.status(user_id)
+    if insight is not None:
+        st.markdown(insight["content"])
+        caption = f"Updated {format_age(time.time() - insight['computed_at'])}"
+        if insight["data_version"] < current_data_version():
+            if job["status"] == "failed":
+                caption += f"; refreshing with your latest changes failed ({job['error']})"
+            else:
+                caption += "; your latest changes are being included in the background"
+        st.caption(caption)
+    elif job["status"] == "failed":
+        st.warning(f"Couldn't prepare your {label}: {job['error']}")
+    else:
+        st.info(f"Your {label} is being prepared in the background; check back in a few seconds.")
+    if st.button("🔄 Refresh now", key=f"refresh_{kind}"):
+        worker.request(user_id)
+        st.rerun()
+
+def render_analysis_tab():
+    data_version = current_data_version()
+    if not get_user_snapshot(current_user_id(), data_version)["expense_count"]:
+        st.info("No expenses recorded yet.")
+        return
+    analytics = get_analytics(current_user_id(), data_version)
+    render_analytics(analytics)
+    render_budget_breakdown()
+    st.markdown("#### AI insights")
+    render_insight(ANALYSIS, "spending analysis")
+
+def render_savings_tab():
+    render_insight(SAVINGS, "savings advice")
+
+def render_metrics():
+    """p50/p95/p99 of the instrumented hot-path steps in this process."""
+    with st.sidebar.expander("📈 Hot-path metrics"):
+        st.table([
+            {
+                "Step": row["name"] + "".join(f" {value}" for value in row["labels"].values()),
+                "Calls": row["count"],
+                "p50 (ms)": f"{row['p50']:.1f}",
+                "p95 (ms)": f"{row['p95']:.1f}",
+                "p99 (ms)": f"{row['p99']:.1f}",
+            }
+            for row in metrics.REGISTRY.summary()
+        ])
+
+def render_profile(profiler):
+    """Per-section timings of the last rerun and the recent average."""
+    with st.sidebar.expander("⏱️ Rerun profile"):
+        st.caption(f"{profiler.reruns} reruns this session")
+        st.table([
+            {"Section": name, "Last (ms)": f"{last:.1f}", "Average (ms)": f"{average:.1f}"}
+            for name, last, average in profiler.report()
+        ])
+
+# Sections of the main page; only the selected one is rendered on a rerun
+TABS = {
+    "💬 Chat": render_chat_tab,
+    "💸 Add Expense": render_expense_tab,
+    "💰 Add Balance": render_balance_tab,
+    "📊 Analysis": render_analysis_tab,
+    "💡 Savings Advice": render_savings_tab,
+}
 
 def main():
     st.set_page_config(
@@ -457,7 +773,12 @@ def main():
         layout="wide"
     )
     
+    get_metrics()
+    get_insight_worker()
     init_session_state()
+    profiler = st.session_state.profiler
+    profiler.start()
+    check_session()
     
     # Check login state
     if not st.session_state.get("is_logged_in", False):
@@ -498,9 +819,10 @@ def main():
                         st.success("✅ Registration successful! You can now log in.")
     
     else:
-        # Main application content after login
+        # Main application content after login. Streamlit drops elements a
+        # rerun doesn't emit, so the stylesheet goes out once per run, here.
         st.markdown(
-            """
+            CHAT_CSS + """
             <h1>💰 SmartSpend AI</h1>
             <p class="byline">Your 24/7 bot for all financial records and advice.</p>
             <hr style="border: 1px solid #2a9d8f;">
@@ -509,85 +831,27 @@ def main():
         )
         
         # Sidebar
-        st.sidebar.title("💳 Expense Drawer")
-        st.sidebar.write(f"Welcome, {st.session_state.get('current_user', 'User')}!")
-        
-        st.sidebar.write("Here are your last 10 expenses:")
-        last_10_expenses = get_last_10_expenses()
-        if not last_10_expenses:
-            st.sidebar.write("No expenses recorded yet.")
-        else:
-            for desc, amt, ts in last_10_expenses:
-                st.sidebar.write(f"- {desc}: ₹{amt} (on {ts})")
-        
-        # Initialize money if not set
-        total_money = get_total_money()
-        if total_money == 0:
-            st.sidebar.write("Set your initial balance:")
-            user_money = st.sidebar.number_input("Enter amount:", min_value=0.0, step=100.0)
-            if st.sidebar.button("Save Balance"):
-                update_total_money(user_money)
-                st.sidebar.success(f"Initial balance set to ₹{user_money:.2f}")
-                st.rerun()
-        else:
-            st.sidebar.write(f"Current Balance: ₹{total_money:.2f}")
+        with profiler.section("sidebar"):
+            render_sidebar(current_snapshot())
         
-        # Main content tabs
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(["💬 Chat", "💸 Add Expense", "💰 Add Balance", "📊 Analysis", "💡 Savings Advice"])
-        
-        with tab1:
-            render_chat_interface()
-            
-            with st.form(key='chat_form', clear_on_submit=True):
-                user_input = st.text_input("Type your message here...", key="chat_input")
-                submit_button = st.form_submit_button("Send")
-                
-                if submit_button and user_input:
-                    response = process_chat_message(user_input)
-                    if response:
-                        st.rerun()
-        
-        with tab2:
-            with st.form(key='expense_form', clear_on_submit=True):
-                expense_description = st.text_input("Description:")
-                expense_amount = st.number_input("Amount (₹):", min_value=0.0, step=100.0)
-                submit_expense = st.form_submit_button("Add Expense")
-                
-                if submit_expense:
-                    if expense_amount > get_total_money():
-                        st.error("❌ Insufficient funds! Please check your balance.")
-                    else:
-                        update_total_money(get_total_money() - expense_amount)
-                        add_expense(expense_description, expense_amount)
-                        st.success(f"✅ Added: {expense_description} - ₹{expense_amount:.2f}")
-                        st.rerun()
-
-        with tab3:
-            with st.form(key='balance_form', clear_on_submit=True):
-                add_amount = st.number_input("Amount to Add (₹):", min_value=0.0, step=100.0)
-                submit_balance = st.form_submit_button("Add to Balance")
-                
-                if submit_balance and add_amount > 0:
-                    add_to_balance(add_amount)
-                    st.success(f"✅ Added ₹{add_amount:.2f} to your balance")
-                    st.rerun()
-        
-        with tab4:
-            if st.button("Analyze Spending"):
-                expenses = get_expenses()
-                if not expenses:
-                    st.info("No expenses recorded yet.")
-                else:
-                    with st.spinner("Analyzing your spending..."):
-                        ai_response = get_chat_response("Please analyze my spending patterns and provide insights.")
-                        st.markdown(ai_response)
+        # Main content: only the selected section is rendered on a rerun
+        active_tab = st.radio(
+            "Section", list(TABS), horizontal=True, key="active_tab", label_visibility="collapsed"
+        )
+        with profiler.section(active_tab):
+            TABS[active_tab]()
         
-        with tab5:
-            if st.button("Get Savings Advice"):
-                with st.spinner("Generating savings advice..."):
-                    ai_response = get_chat_response("Please suggest ways to save better based on my spending patterns.")
-                    st.markdown(ai_response)
-
+        with profiler.section("ai cache stats"):
+            cache_stats = get_response_cache().stats()
+            st.sidebar.caption(
+                f"AI cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries"
+            )
+    
+    profiler.finish()
+    render_profile(profiler)
+    if st.session_state.get("is_logged_in", False):
+        render_metrics()
 
 
 if __name__ == "__main__":